@@ -2,22 +2,59 @@
 AI 服務層 - Oreoooooo 終極穩定整合版
 處理所有與 Gemini API 相關的業務邏輯，包含重試機制、高品質 Prompt 與階梯式辨識
 """
+import asyncio
 import json
+import math
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from typing import List, Dict, Optional, Tuple, Tuple
+from config import AppConfig, GEMINI_RATE_LIMITS, GEMINI_CIRCUIT_BREAKER
 from database.models import ClothingItem, WeatherData
+from database.embedding_store import EmbeddingStore
 
 from google.api_core.exceptions import ResourceExhausted, InternalServerError
-from api.model_a_adapter import ModelAAdapter
 from api.recommendation_engine import RecommendationEngine
+from api.wardrobe_index import WardrobeIndex
+from api.rate_limiter import TokenBucketRateLimiter
+from api.circuit_breaker import CircuitBreaker
+from api.tag_cache import TagCache
+from api.wardrobe_service import WardrobeService
 
 class AIService:
-    def __init__(self, api_key: str, rate_limit_seconds: int = 15):
+    # 階梯模型名稱 (同時作為速率限制的 bucket 名稱)
+    MODEL_T1_NAME = 'gemini-2.5-flash'
+    MODEL_T2_NAME = 'gemini-3-flash-preview'
+
+    def __init__(self, api_key: str, rate_limiter: Optional[TokenBucketRateLimiter] = None,
+                 tag_cache: Optional[TagCache] = None, tag_batch_size: int = AppConfig.tag_batch_size,
+                 tag_max_concurrency: int = AppConfig.tag_max_concurrency,
+                 embedding_store: Optional[EmbeddingStore] = None,
+                 embedding_weight: int = AppConfig.embedding_weight):
         self.api_key = api_key
-        self.rate_limit_seconds = rate_limit_seconds
-        self.last_request_time = 0
+        # 辨識時每個子批次的張數
+        self.tag_batch_size = max(1, tag_batch_size)
+        # 以圖片 hash 為 key 的標籤快取 (None 則不使用快取)
+        self.tag_cache = tag_cache
+        # Model A embedding 儲存 (相似單品查詢與推薦的相容度加分，None 則不使用)
+        self.embedding_store = embedding_store
+        self.embedding_weight = embedding_weight
+        # 跨請求、跨 worker 共用的 token bucket 限流器
+        self.rate_limiter = rate_limiter or TokenBucketRateLimiter(
+            AppConfig.rate_limit_db_path, GEMINI_RATE_LIMITS
+        )
+        # 同時進行的子批次上限: 超過 Tier 1 的突發量 (burst) 時多出的子批次只會在限流器前排隊，因此以 burst 為上限
+        t1_burst = self.rate_limiter.buckets.get(self.MODEL_T1_NAME, {}).get("capacity", 1)
+        self.tag_max_concurrency = max(1, min(tag_max_concurrency, int(t1_burst)))
+        if self.tag_max_concurrency < tag_max_concurrency:
+            print(f"[AI] 子批次並行數 {tag_max_concurrency} 超過 {self.MODEL_T1_NAME} 突發量 {t1_burst:g}，改為 {self.tag_max_concurrency}")
+        self._tag_executor = ThreadPoolExecutor(max_workers=self.tag_max_concurrency, thread_name_prefix="tag-chunk")
+        # 每個模型階層各自的熔斷器 (記住最近的配額耗盡/錯誤，避免每次請求重新等待重試)
+        self.breakers = {
+            name: CircuitBreaker(name, **GEMINI_CIRCUIT_BREAKER)
+            for name in (self.MODEL_T1_NAME, self.MODEL_T2_NAME)
+        }
         genai.configure(api_key=api_key)
         
         # 設定安全過濾 (關閉以避免誤判衣物圖片)
@@ -30,61 +67,165 @@ class AIService:
         
         # 依照 Oreoooooo 要求，定義階梯模型 (Tier 1 & Tier 2)
         # 注意: 確保系統環境支援此模型名稱
-        self.model_t1 = genai.GenerativeModel('gemini-2.5-flash', safety_settings=self.safety_settings)
-        self.model_t2 = genai.GenerativeModel('gemini-3-flash-preview', safety_settings=self.safety_settings)
+        self.model_t1 = genai.GenerativeModel(self.MODEL_T1_NAME, safety_settings=self.safety_settings)
+        self.model_t2 = genai.GenerativeModel(self.MODEL_T2_NAME, safety_settings=self.safety_settings)
     
-    def _rate_limit_wait(self):
-        """API 速率限制保護 - 嚴格版"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_seconds:
-            wait_time = self.rate_limit_seconds - time_since_last
-            print(f"[AI] ⏳ 速率限制保護中，等待 {wait_time:.1f} 秒...")
-            time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
+    def _rate_limit_wait(self, model_name: str = MODEL_T1_NAME):
+        """API 速率限制保護 - 依模型取得共用 token bucket 的配額"""
+        self.rate_limiter.acquire(model_name)
+
+    def get_breaker_states(self) -> Dict[str, Dict]:
+        """各模型階層的熔斷狀態"""
+        return {name: breaker.get_state() for name, breaker in self.breakers.items()}
+
+    def batch_auto_tag(self, img_bytes_list: List[bytes], mime_type: str = "image/jpeg",
+                       image_hashes: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """
+        自動標籤辨識 (先查快取):
+        以圖片 SHA256 查詢標籤快取，只有未命中的圖片才送進階梯式辨識，
+        結果依原順序合併並寫回快取 (只快取 Gemini 的結果；Model A 備援與預設值不快取)
+
+        Args:
+            img_bytes_list: 圖片 bytes 列表
+            mime_type: 圖片格式 (送給 Gemini 的 MIME type)
+            image_hashes: 各圖片的 image_hash (原始上傳檔的 SHA256)；None 則以 img_bytes_list 計算
+        """
+        hashes = list(image_hashes) if image_hashes else [WardrobeService.get_image_hash(img) for img in img_bytes_list]
+        cached = self.tag_cache.get_many(hashes) if self.tag_cache else {}
+
+        # 未命中的圖片 (同批次重複的圖片只辨識一次)
+        miss_bytes = {}
+        for img_hash, img in zip(hashes, img_bytes_list):
+            if img_hash not in cached and img_hash not in miss_bytes:
+                miss_bytes[img_hash] = img
+
+        print(f"[AI] 標籤快取: 命中 {len(img_bytes_list) - len(miss_bytes)} 件, 需辨識 {len(miss_bytes)} 件")
+
+        if miss_bytes:
+            miss_hashes = list(miss_bytes.keys())
+            tagged = self._tag_in_chunks([miss_bytes[h] for h in miss_hashes], mime_type, miss_hashes)
+
+            new_entries = {}
+            for img_hash, tags in zip(miss_hashes, tagged):
+                cached[img_hash] = tags
+                # 預設值與 Model A 備援結果不寫入快取，之後同一張圖片仍會再交給 Gemini 辨識
+                if not tags.get("_placeholder") and tags.get("_source") != "model_a":
+                    new_entries[img_hash] = tags
+            if self.tag_cache:
+                self.tag_cache.put_many(new_entries)
+
+        results = []
+        for img_hash in hashes:
+            tags = cached.get(img_hash)
+            if tags is None:
+                return None
+            # 每張圖片各自一份 dict，避免重複圖片共用同一物件
+            results.append({k: v for k, v in tags.items() if not k.startswith("_")})
+        return results
+
+    def _tag_in_chunks(self, img_bytes_list: List[bytes], mime_type: str = "image/jpeg",
+                       image_hashes: Optional[List[str]] = None) -> List[Dict]:
+        """
+        將圖片平均分給 tag_max_concurrency 個子批次 (每批至少 tag_batch_size 張) 同時跑階梯式辨識，
+        結果依原順序合併。單一子批次失敗只影響該批次 (以預設值代替)，不會拖垮整批
+        並行數為 1 時整批一次送出，不切子批次 (逐批排隊只會多打幾次 Gemini)
+        """
+        image_hashes = image_hashes or [WardrobeService.get_image_hash(img) for img in img_bytes_list]
+        chunk_size = max(self.tag_batch_size, math.ceil(len(img_bytes_list) / self.tag_max_concurrency))
+        chunks = [
+            (start, img_bytes_list[start:start + chunk_size], image_hashes[start:start + chunk_size])
+            for start in range(0, len(img_bytes_list), chunk_size)
+        ]
+        if len(chunks) <= 1:
+            return self._tag_chunk(0, img_bytes_list, mime_type, image_hashes)
+
+        print(f"[AI] {len(img_bytes_list)} 件衣物分成 {len(chunks)} 個子批次 (每批 {chunk_size} 件, 並行 {self.tag_max_concurrency})")
+        futures = [
+            self._tag_executor.submit(self._tag_chunk, start, chunk, mime_type, chunk_hashes)
+            for start, chunk, chunk_hashes in chunks
+        ]
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def _tag_chunk(self, start: int, img_bytes_list: List[bytes], mime_type: str = "image/jpeg",
+                   image_hashes: Optional[List[str]] = None) -> List[Dict]:
+        """辨識單一子批次，任何例外都轉成預設值 (不寫入快取)"""
+        try:
+            tagged = self._tag_images(img_bytes_list, index_offset=start, mime_type=mime_type, image_hashes=image_hashes)
+            if tagged and len(tagged) == len(img_bytes_list):
+                return tagged
+            print(f"[AI] ⚠️ 子批次 {start + 1}-{start + len(img_bytes_list)} 結果數量不符")
+        except Exception as e:
+            print(f"[AI] ❌ 子批次 {start + 1}-{start + len(img_bytes_list)} 辨識失敗: {e}")
+        return [self._placeholder_tags(start + idx) for idx in range(len(img_bytes_list))]
+
+    @staticmethod
+    def _placeholder_tags(idx: int) -> Dict:
+        """辨識失敗的預設值，標記後不寫入快取"""
+        return {"name": f"未知衣物 {idx+1}", "category": "上衣", "color": "未知", "style": "休閒", "_placeholder": True}
 
-    def batch_auto_tag(self, img_bytes_list: List[bytes]) -> Optional[List[Dict]]:
+    def _tag_images(self, img_bytes_list: List[bytes], index_offset: int = 0,
+                    mime_type: str = "image/jpeg", image_hashes: Optional[List[str]] = None) -> Optional[List[Dict]]:
         """
         Oreoooooo 階梯式自動標籤辨識:
         1. 先嘗試 Gemini 2.5-flash (具備重試)
         2. 若爆流量則試 Gemini 3-flash-preview (具備重試)
         3. 均失敗則 Fallback 到本地 Model A
+        熔斷中的階層會直接略過，不再重新等待重試
         """
         print(f"[AI] 開始對 {len(img_bytes_list)} 件衣物進行階梯式辨識分析...")
         
         # A. 嘗試模型 1 (2.5-flash)
-        results = self._call_gemini_with_robust_logic(self.model_t1, img_bytes_list, "Tier 1 (2.5-flash)")
+        results = self._call_gemini_with_robust_logic(self.model_t1, self.MODEL_T1_NAME, img_bytes_list, "Tier 1 (2.5-flash)", mime_type)
         if results: return results
         
         # B. 嘗試模型 2 (3-preview)
-        results = self._call_gemini_with_robust_logic(self.model_t2, img_bytes_list, "Tier 2 (3-preview)")
+        results = self._call_gemini_with_robust_logic(self.model_t2, self.MODEL_T2_NAME, img_bytes_list, "Tier 2 (3-preview)", mime_type)
         if results: return results
 
         # C. 最終 Fallback - 本地 Model A (當 API 均不可用時)
         print("[AI] ⚠️ 所有 Gemini 模型均已達流量上限或失敗，啟動本地 Model A 辨識...")
+        from api.model_a_adapter import ModelAAdapter  # 延遲載入 (torch 只在 fallback 時才需要)
         adapter = ModelAAdapter()
         final_results = []
-        for idx, img_bytes in enumerate(img_bytes_list):
-            local_result = adapter.analyze_image(img_bytes)
+        local_results = adapter.analyze_images(img_bytes_list)  # 一次 forward 批次辨識
+        # 順便保存 embedding (已經算好，不必再跑一次 forward)
+        if self.embedding_store:
+            try:
+                hashes = image_hashes or [WardrobeService.get_image_hash(img) for img in img_bytes_list]
+                self.embedding_store.put_many({
+                    img_hash: local_result.get("embedding")
+                    for img_hash, local_result in zip(hashes, local_results) if local_result
+                })
+            except Exception as e:
+                print(f"[AI] ⚠️ 儲存 embedding 失敗: {e}")
+        for idx, local_result in enumerate(local_results):
             if local_result:
                 final_results.append({
                     "name": f"{local_result['colors'][0]} {local_result['category_zh']}" if local_result['colors'] else local_result['category_zh'],
                     "category": self._map_category_to_frontend(local_result['category']),
                     "color": local_result['colors'][0] if local_result['colors'] else "未知",
-                    "style": local_result['style'][0] if local_result['style'] else "休閒"
+                    "style": local_result['style'][0] if local_result['style'] else "休閒",
+                    "_source": local_result.get("source", "model_a")
                 })
             else:
-                final_results.append({"name": f"未知衣物 {idx+1}", "category": "上衣", "color": "未知", "style": "休閒"})
+                final_results.append(self._placeholder_tags(index_offset + idx))
         
         print(f"[AI] ✅ 回歸本地 Model A辨識完成 ({len(final_results)} 件)")
         return final_results
 
-    def _call_gemini_with_robust_logic(self, model, img_bytes_list, label) -> Optional[List[Dict]]:
+    def _call_gemini_with_robust_logic(self, model, model_name, img_bytes_list, label,
+                                       mime_type: str = "image/jpeg") -> Optional[List[Dict]]:
         """原本最穩健的呼叫邏輯 (包含 Retry, JSON 清洗, Candidates 檢查)"""
+        breaker = self.breakers[model_name]
+        if not breaker.allow_request():
+            print(f"[AI] ⏭️ {label} 熔斷中，略過此階")
+            return None
+
         try:
-            self._rate_limit_wait()
             print(f"[AI] 🚀 正在嘗試 {label}...")
 
             prompt = f"""
@@ -146,25 +287,39 @@ class AIService:
 - 不可捏造品牌或看不到的細節；不清楚一律填 unknown
 請僅輸出上述格式的純 JSON 陣列，不要包含 Markdown、說明或額外文字。
 """
-            content_parts = [{"mime_type": "image/jpeg", "data": img} for img in img_bytes_list]
+            content_parts = [{"mime_type": mime_type, "data": img} for img in img_bytes_list]
             content_parts.insert(0, prompt)
 
             max_retries = 3
             retry_count = 0
             while retry_count < max_retries:
                 try:
+                    self._rate_limit_wait(model_name)  # 每次嘗試 (含重試) 都需取得配額
                     response = model.generate_content(content_parts)
-                    return self._parse_and_validate_response(response, len(img_bytes_list))
-                except ResourceExhausted:
+                    # 解析成功才算成功；格式錯誤或數量不符的回應也計入失敗，避免半開的熔斷器被無效回應關閉
+                    results = self._parse_and_validate_response(response, len(img_bytes_list))
+                    if results:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure("回應無法解析或數量不符")
+                        print(f"[AI] ⚠️ {label} 回應無法解析或數量不符")
+                    return results
+                except ResourceExhausted as e:
+                    breaker.record_failure(f"ResourceExhausted: {e}")
+                    if breaker.is_open:
+                        print(f"[AI] ⛔ {label} 已熔斷，不再重試，直接改用下一階")
+                        break
                     retry_count += 1
                     wait_time = 30 * retry_count
                     print(f"[AI] ⚠️ {label} 速率限制，等待 {wait_time} 秒後重試 ({retry_count}/{max_retries})...")
                     time.sleep(wait_time)
                 except Exception as e:
+                    breaker.record_failure(str(e))
                     print(f"[AI] {label} 呼叫異常: {e}")
                     break
             return None
         except Exception as e:
+            breaker.record_failure(str(e))
             print(f"[AI] {label} 區塊執行失敗: {e}")
             return None
 
@@ -235,55 +390,104 @@ class AIService:
 
         return None
 
-    def generate_outfit_recommendation(
+    def store_embeddings(self, img_bytes_list: List[bytes], image_hashes: Optional[List[str]] = None) -> int:
+        """
+        以 Model A 計算並儲存尚未有 embedding 的圖片向量
+
+        Args:
+            image_hashes: 各圖片的 image_hash (原始上傳檔的 SHA256)；None 則以 img_bytes_list 計算
+
+        Returns:
+            新寫入的筆數
+        """
+        if not self.embedding_store or not img_bytes_list:
+            return 0
+        hashes = image_hashes or [WardrobeService.get_image_hash(img) for img in img_bytes_list]
+        by_hash = dict(zip(hashes, img_bytes_list))
+        missing = self.embedding_store.missing(by_hash.keys())
+        if not missing:
+            return 0
+
+        from api.model_a_adapter import ModelAAdapter  # 延遲載入 (torch 只在需要時才載入)
+        embeddings = ModelAAdapter().embed_images([by_hash[h] for h in missing])
+        return self.embedding_store.put_many(dict(zip(missing, embeddings)))
+
+    async def generate_outfit_recommendation_async(
         self, wardrobe: List[ClothingItem], weather: WeatherData, style: str, occasion: str,
         user_profile: Optional[Dict] = None,
-        locked_items: Optional[List[str]] = None  # ✅ 優先級 3：指定單品鎖定
+        locked_items: Optional[List[str]] = None,  # ✅ 優先級 3：指定單品鎖定
+        wardrobe_index: Optional[WardrobeIndex] = None  # 預先建好的衣櫥索引 (None 則由 wardrobe 建立)
     ) -> Optional[Dict]:
-        """產出智能穿搭組合 - 含完整解析與 Gemini 結語、支援個人偏好 & 指定單品"""
+        """
+        產出智能穿搭組合 - 含完整解析與 Gemini 結語、支援個人偏好 & 指定單品 (在 event loop 中使用)
+        等待 Gemini 配額時只 await，不佔用執行緒；Gemini 呼叫與推薦計算才放到 thread 執行
+        """
         try:
-            self._rate_limit_wait()
+            await self.rate_limiter.acquire_async(self.MODEL_T1_NAME)
+            plan = await asyncio.to_thread(
+                self._plan_outfits, wardrobe, weather, style, occasion, user_profile, locked_items, wardrobe_index
+            )
+            if not plan:
+                return None
 
-            locked_item_ids = list(locked_items) if locked_items else []
-            locked_item_ids_set = set(locked_item_ids)
-            locked_item_ids_str = set(str(x) for x in locked_item_ids)
+            await self.rate_limiter.acquire_async(self.MODEL_T1_NAME)
+            reason_res = await asyncio.to_thread(self.model_t1.generate_content, plan["detail_prompt"])
+            return self._build_recommendation(plan, reason_res)
+        except Exception as e:
+            print(f"[AI Recommendation Error] {e}")
+            return None
 
-            def is_locked(item_id) -> bool:
-                return item_id in locked_item_ids_set or str(item_id) in locked_item_ids_str
-            
-            # ✅ 解析個人資料
-            dislikes = ""
-            thermal_preference = "normal"
-            custom_desc = ""
-            
-            if user_profile:
-                dislikes = user_profile.get("dislikes", "") or ""
-                thermal_preference = user_profile.get("thermal_preference", "normal") or "normal"
-                custom_desc = user_profile.get("custom_style_desc", "") or ""
-            
-            # 1. 意圖解析 - 增強提示詞融入個人資料
-            user_height = user_profile.get("height") if user_profile else None
-            user_weight = user_profile.get("weight") if user_profile else None
-            user_gender = user_profile.get("gender") if user_profile else "中性"
-            favorite_styles = user_profile.get("favorite_styles", []) if user_profile else []
-            
-            # ✅ 處理 None 值
-            user_height_str = f"{user_height} cm" if user_height else "未設定"
-            user_weight_str = f"{user_weight} kg" if user_weight else "未設定"
-            favorite_styles_str = "、".join(favorite_styles) if favorite_styles else "無特殊偏好"
-            
-            # ✅ 優先級 3：處理指定單品
-            locked_item_details = ""
-            if locked_items:
-                locked_wardrobe = [item for item in wardrobe if is_locked(item.id)]
-                if locked_wardrobe:
-                    locked_desc = "、".join([f"{item.name}({item.color})" for item in locked_wardrobe])
-                    locked_item_details = f"\n【指定今日單品】必須包含: {locked_desc}"
-            
-            # 使用體感溫度優先判斷
-            temp_for_logic = getattr(weather, "feels_like", weather.temp)
+    def _plan_outfits(
+        self, wardrobe: List[ClothingItem], weather: WeatherData, style: str, occasion: str,
+        user_profile: Optional[Dict], locked_items: Optional[List[str]],
+        wardrobe_index: Optional[WardrobeIndex]
+    ) -> Optional[Dict]:
+        """
+        意圖解析 (Gemini，呼叫前需已取得配額) + 推薦引擎挑選 + 組出結語提示詞
+
+        Returns:
+            {analysis, outfits, detail_prompt}；推薦引擎沒有結果時為 None
+        """
+        locked_item_ids = list(locked_items) if locked_items else []
+        locked_item_ids_set = set(locked_item_ids)
+        locked_item_ids_str = set(str(x) for x in locked_item_ids)
+
+        def is_locked(item_id) -> bool:
+            return item_id in locked_item_ids_set or str(item_id) in locked_item_ids_str
+        
+        # ✅ 解析個人資料
+        dislikes = ""
+        thermal_preference = "normal"
+        custom_desc = ""
+        
+        if user_profile:
+            dislikes = user_profile.get("dislikes", "") or ""
+            thermal_preference = user_profile.get("thermal_preference", "normal") or "normal"
+            custom_desc = user_profile.get("custom_style_desc", "") or ""
+        
+        # 1. 意圖解析 - 增強提示詞融入個人資料
+        user_height = user_profile.get("height") if user_profile else None
+        user_weight = user_profile.get("weight") if user_profile else None
+        user_gender = user_profile.get("gender") if user_profile else "中性"
+        favorite_styles = user_profile.get("favorite_styles", []) if user_profile else []
+        
+        # ✅ 處理 None 值
+        user_height_str = f"{user_height} cm" if user_height else "未設定"
+        user_weight_str = f"{user_weight} kg" if user_weight else "未設定"
+        favorite_styles_str = "、".join(favorite_styles) if favorite_styles else "無特殊偏好"
+        
+        # ✅ 優先級 3：處理指定單品
+        locked_item_details = ""
+        if locked_items:
+            locked_wardrobe = [item for item in wardrobe if is_locked(item.id)]
+            if locked_wardrobe:
+                locked_desc = "、".join([f"{item.name}({item.color})" for item in locked_wardrobe])
+                locked_item_details = f"\n【指定今日單品】必須包含: {locked_desc}"
+        
+        # 使用體感溫度優先判斷
+        temp_for_logic = getattr(weather, "feels_like", weather.temp)
 
-            analysis_prompt = f"""
+        analysis_prompt = f"""
 【使用者資料】
 性別/身形: {user_gender} / {user_height_str} / {user_weight_str}
 習慣風格: {favorite_styles_str}
@@ -357,95 +561,81 @@ class AIService:
 
 只輸出 JSON，不要任何說明。
 """
-            res = self.model_t1.generate_content(analysis_prompt)
-            analysis_text = self._extract_response_text(res)
-            analysis = self._safe_json_loads(analysis_text)
-
-            if not isinstance(analysis, dict):
-                print("[AI] ⚠️ 場景解析回傳非 JSON，改用預設解析值")
-                analysis = {
-                    "normalized_occasion": "日常",
-                    "needs_outer": temp_for_logic < 22,
-                    "vibe_description": "今天就走舒適俐落的日常穿搭風格。",
-                    "parsed_style": style or "日常"
-                }
-
-            # ✅ 根據體感偏好調整保暖需求
-            needs_outer = bool(analysis.get("needs_outer", temp_for_logic < 22))
-            if thermal_preference == "cold_sensitive" and temp_for_logic < 24:
-                needs_outer = True  # 強制加外套
-            elif thermal_preference == "heat_sensitive" and temp_for_logic > 25:
-                needs_outer = False  # 儘量不穿外套
-
-            normalized_occasion = analysis.get("normalized_occasion") or "日常"
-            parsed_style = analysis.get("parsed_style") or style or "日常"
-            
-            # 2. 引擎從真實衣櫥挑選 - 實現軟扣分機制（推薦 3 套時追蹤已使用單品）
-            engine = RecommendationEngine()
-            outfits = []
-            # ✅ 優先級 3 修復：初始化 used_items 為空，但稍後會加入 locked_items
-            used_items = list(locked_item_ids)  # 初始化為指定單品（必須包含）
-            
-            for set_idx in range(3):
-                try:
-                    # 在每一套時傳入已使用單品，實現軟扣分
-                    single_outfit = engine.recommend(
-                        wardrobe, weather, normalized_occasion, "中性", 
-                        parsed_style, needs_outer, used_items=used_items
-                    )
-                    
-                    if single_outfit:
-                        outfits.append(single_outfit[0])  # 取第 1 套即可
-                        
-                        # ✅ 提取該套中的單品 ID 加入 used_items（不包括指定單品，防止後續套裝排除它們）
-                        if single_outfit[0].get('items'):
-                            for item in single_outfit[0]['items']:
-                                if item.get('id') and not is_locked(item['id']):
-                                    # 只追蹤非指定的單品，指定單品應在每套中重複出現
-                                    used_items.append(item['id'])
-                except Exception as e:
-                    print(f"[AI] 第 {set_idx+1} 套推薦出錯: {e}")
-                    continue
-            
-            if not outfits:
-                return None
+        res = self.model_t1.generate_content(analysis_prompt)
+        analysis_text = self._extract_response_text(res)
+        analysis = self._safe_json_loads(analysis_text)
+
+        if not isinstance(analysis, dict):
+            print("[AI] ⚠️ 場景解析回傳非 JSON，改用預設解析值")
+            analysis = {
+                "normalized_occasion": "日常",
+                "needs_outer": temp_for_logic < 22,
+                "vibe_description": "今天就走舒適俐落的日常穿搭風格。",
+                "parsed_style": style or "日常"
+            }
+
+        # ✅ 根據體感偏好調整保暖需求
+        needs_outer = bool(analysis.get("needs_outer", temp_for_logic < 22))
+        if thermal_preference == "cold_sensitive" and temp_for_logic < 24:
+            needs_outer = True  # 強制加外套
+        elif thermal_preference == "heat_sensitive" and temp_for_logic > 25:
+            needs_outer = False  # 儘量不穿外套
+
+        normalized_occasion = analysis.get("normalized_occasion") or "日常"
+        parsed_style = analysis.get("parsed_style") or style or "日常"
+        
+        # 2. 引擎從真實衣櫥挑選 - 一次產生 3 套，選套時以軟扣分機制避免重複單品
+        engine = RecommendationEngine(embedding_store=self.embedding_store, embedding_weight=self.embedding_weight)
+        outfits = []
+        try:
+            # ✅ 優先級 3：指定單品一開始就列入已使用，但選中後不再扣分，讓每套都能包含
+            outfits = engine.recommend_k(
+                wardrobe_index if wardrobe_index is not None else wardrobe, weather, normalized_occasion, "中性",
+                parsed_style, needs_outer,
+                used_items=locked_item_ids, locked_items=locked_item_ids, k=3
+            )
+        except Exception as e:
+            print(f"[AI] 推薦引擎出錯: {e}")
+        
+        if not outfits:
+            return None
+        
+        # ✅ 過濾避雷清單
+        if dislikes:
+            dislike_keywords = [kw.strip().lower() for kw in dislikes.split(',')]
+            filtered_outfits = []
             
-            # ✅ 過濾避雷清單
-            if dislikes:
-                dislike_keywords = [kw.strip().lower() for kw in dislikes.split(',')]
-                filtered_outfits = []
-                
-                for outfit in outfits:
-                    should_include = True
-                    for item in outfit['items']:
-                        item_name = (item.get('name', '') + item.get('color', '')).lower()
-                        if any(kw in item_name for kw in dislike_keywords):
-                            should_include = False
-                            break
-                    
-                    if should_include:
-                        filtered_outfits.append(outfit)
+            for outfit in outfits:
+                should_include = True
+                for item in outfit['items']:
+                    item_name = (item.get('name', '') + item.get('color', '')).lower()
+                    if any(kw in item_name for kw in dislike_keywords):
+                        should_include = False
+                        break
                 
-                outfits = filtered_outfits[:3] if filtered_outfits else outfits[:3]
-
-            # 3. 針對具體衣服產出 100 字溫馨總結 (Gemini 結語) - 融入身形修飾建議
-            body_shape_tip = ""
-            if user_height and user_weight:
-                try:
-                    height_cm = float(user_height)
-                    weight_kg = float(user_weight)
-                    # 簡單 BMI 計算幫助判斷修飾建議
-                    bmi = weight_kg / ((height_cm / 100) ** 2)
-                    if bmi < 18.5:
-                        body_shape_tip = "此使用者偏瘦，應選擇有蓬度/紋理的衣服來增加視覺豐盈感，避免過度貼身。"
-                    elif bmi > 25:
-                        body_shape_tip = "此使用者偏重，應選擇直線條/深色/豎紋路的衣服來顯瘦，避免過度鬆散或橫紋。"
-                    else:
-                        body_shape_tip = f"此使用者身材勻稱({height_cm}cm/{weight_kg}kg)，可選擇符合氣質的任何剪裁。"
-                except (ValueError, TypeError):
-                    body_shape_tip = "無法解析身形數據，建議無身形限制。"
+                if should_include:
+                    filtered_outfits.append(outfit)
             
-            detail_prompt = f"""
+            outfits = filtered_outfits[:3] if filtered_outfits else outfits[:3]
+
+        # 3. 針對具體衣服產出 100 字溫馨總結 (Gemini 結語) - 融入身形修飾建議
+        body_shape_tip = ""
+        if user_height and user_weight:
+            try:
+                height_cm = float(user_height)
+                weight_kg = float(user_weight)
+                # 簡單 BMI 計算幫助判斷修飾建議
+                bmi = weight_kg / ((height_cm / 100) ** 2)
+                if bmi < 18.5:
+                    body_shape_tip = "此使用者偏瘦，應選擇有蓬度/紋理的衣服來增加視覺豐盈感，避免過度貼身。"
+                elif bmi > 25:
+                    body_shape_tip = "此使用者偏重，應選擇直線條/深色/豎紋路的衣服來顯瘦，避免過度鬆散或橫紋。"
+                else:
+                    body_shape_tip = f"此使用者身材勻稱({height_cm}cm/{weight_kg}kg)，可選擇符合氣質的任何剪裁。"
+            except (ValueError, TypeError):
+                body_shape_tip = "無法解析身形數據，建議無身形限制。"
+        
+        detail_prompt = f"""
 ## 3) 穿搭推薦細節（detail_prompt｜單一長段文字）
 
 【指令】
@@ -501,21 +691,19 @@ class AIService:
 
 方案詳情：
 """
-            for i, o in enumerate(outfits):
-                names = [f"{it['color']}{it['name']}" for it in o['items']]
-                detail_prompt += f"方案{i+1}: {', '.join(names)}\n"
-            
-            self._rate_limit_wait()
-            reason_res = self.model_t1.generate_content(detail_prompt)
-            
-            return {
-                "vibe": analysis.get("vibe_description") or "今天就走舒適俐落的日常穿搭風格。",
-                "detailed_reasons": reason_res.text,
-                "recommendations": outfits
-            }
-        except Exception as e:
-            print(f"[AI Recommendation Error] {e}")
-            return None
+        for i, o in enumerate(outfits):
+            names = [f"{it['color']}{it['name']}" for it in o['items']]
+            detail_prompt += f"方案{i+1}: {', '.join(names)}\n"
+
+        return {"analysis": analysis, "outfits": outfits, "detail_prompt": detail_prompt}
+
+    @staticmethod
+    def _build_recommendation(plan: Dict, reason_res) -> Dict:
+        return {
+            "vibe": plan["analysis"].get("vibe_description") or "今天就走舒適俐落的日常穿搭風格。",
+            "detailed_reasons": reason_res.text,
+            "recommendations": plan["outfits"]
+        }
 
     def _map_category_to_frontend(self, model_cat: str) -> str:
         """將 Model A 的類別對應到前端 (Oreoooooo 指定完整版)"""
@@ -0,0 +1,100 @@
+"""
+熔斷器模組
+記錄每個 Gemini 模型階層最近的失敗狀況，配額耗盡期間直接跳過該階層，冷卻後再以半開狀態試探
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    單一階層的熔斷器
+
+    - closed: 正常放行，連續失敗達門檻後轉為 open
+    - open: 冷卻期間一律拒絕
+    - half_open: 冷卻結束後只放行一個試探請求，成功則 closed，失敗則重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 2, cooldown_seconds: float = 120):
+        """
+        Args:
+            name: 名稱 (用於日誌)
+            failure_threshold: 連續失敗幾次後熔斷
+            cooldown_seconds: 熔斷後多久進入半開試探
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._last_error: Optional[str] = None
+        self._trip_count = 0
+        self._rejected_count = 0
+
+    def allow_request(self) -> bool:
+        """是否允許呼叫此階層"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN:
+                if time.time() - self._opened_at < self.cooldown_seconds:
+                    self._rejected_count += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            # half_open: 同時間只放行一個試探請求
+            if self._probe_in_flight:
+                self._rejected_count += 1
+                return False
+            self._probe_in_flight = True
+            print(f"[Breaker] 🔍 {self.name} 冷卻結束，進行試探呼叫")
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"[Breaker] ✅ {self.name} 已恢復")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str = ""):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._last_error = error
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._trip_count += 1
+                    print(f"[Breaker] ⛔ {self.name} 熔斷 {self.cooldown_seconds:.0f} 秒 (原因: {error})")
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._state == self.OPEN
+
+    def get_state(self) -> Dict:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.cooldown_seconds - (time.time() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_in_seconds": round(retry_in, 1),
+                "trip_count": self._trip_count,
+                "rejected_count": self._rejected_count,
+                "last_error": self._last_error
+            }
@@ -0,0 +1,97 @@
+"""
+圖片正規化模組
+在 AI 辨識與儲存之前統一處理上傳圖片: 修正 EXIF 方向、縮小到最長邊上限、移除中繼資料並重新編碼
+"""
+import io
+import threading
+from typing import Dict, Tuple
+from PIL import Image, ImageOps
+
+
+class ImageNormalizer:
+    """上傳圖片正規化 (JPEG / WebP)"""
+
+    MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+    def __init__(self, max_edge: int = 1280, image_format: str = "JPEG", quality: int = 85):
+        """
+        Args:
+            max_edge: 最長邊上限 (像素)，超過才縮小
+            image_format: 輸出格式 JPEG / WEBP
+            quality: 編碼品質 (1-95)
+        """
+        image_format = image_format.upper()
+        if image_format not in self.MIME_TYPES:
+            print(f"[Image] ⚠️ 不支援的輸出格式 {image_format}，改用 JPEG")
+            image_format = "JPEG"
+
+        self.max_edge = max_edge
+        self.image_format = image_format
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "resized": 0, "failures": 0, "input_bytes": 0, "output_bytes": 0}
+
+    @property
+    def mime_type(self) -> str:
+        """正規化後圖片的 MIME type (送給 Gemini 使用)"""
+        return self.MIME_TYPES[self.image_format]
+
+    def normalize(self, img_bytes: bytes) -> bytes:
+        """
+        正規化單張圖片，無法解碼時原樣回傳
+
+        Returns:
+            重新編碼後的圖片 bytes (不含 EXIF 等中繼資料)
+        """
+        try:
+            output, resized = self._normalize(img_bytes)
+        except Exception as e:
+            print(f"[Image] ⚠️ 圖片正規化失敗，使用原始檔案: {e}")
+            with self._lock:
+                self._stats["failures"] += 1
+            return img_bytes
+
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["resized"] += int(resized)
+            self._stats["input_bytes"] += len(img_bytes)
+            self._stats["output_bytes"] += len(output)
+        return output
+
+    def _normalize(self, img_bytes: bytes) -> Tuple[bytes, bool]:
+        image = Image.open(io.BytesIO(img_bytes))
+        # JPEG 可在解碼時直接以 1/2、1/4、1/8 縮小，大幅減少解碼成本
+        image.draft("RGB", (self.max_edge, self.max_edge))
+        image = ImageOps.exif_transpose(image)
+
+        # 透明背景以白色填滿 (JPEG 不支援 alpha)
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        resized = max(image.size) > self.max_edge
+        if resized:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        # 重新建立影像物件，確保不帶任何 EXIF / ICC / XMP 資訊
+        clean = Image.frombytes("RGB", image.size, image.tobytes())
+        buffer = io.BytesIO()
+        if self.image_format == "JPEG":
+            clean.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+        else:
+            clean.save(buffer, format="WEBP", quality=self.quality, method=4)
+        return buffer.getvalue(), resized
+
+    def get_stats(self) -> Dict:
+        """正規化統計 (節省的位元組數)"""
+        with self._lock:
+            stats = dict(self._stats)
+        saved = stats["input_bytes"] - stats["output_bytes"]
+        stats["bytes_saved"] = saved
+        stats["saved_ratio"] = round(saved / stats["input_bytes"], 4) if stats["input_bytes"] else 0.0
+        stats.update({"max_edge": self.max_edge, "format": self.image_format, "quality": self.quality})
+        return stats
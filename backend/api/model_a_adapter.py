@@ -2,34 +2,61 @@ import sys
 from pathlib import Path
 from PIL import Image
 import io
-import torch
 import logging
+import threading
+import numpy as np
+from typing import List, Optional
 
 # 加入專案根目錄到 sys.path，確保能 import model_a
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR))
 
-try:
-    from model_a.inference import FashionPredictor
-    MODEL_A_AVAILABLE = True
-except ImportError as e:
-    print(f"⚠️ Model A import failed: {e}")
-    MODEL_A_AVAILABLE = False
-
 logger = logging.getLogger(__name__)
 
+
+def _import_predictor():
+    """
+    延遲載入 FashionPredictor
+    torch / torchvision 只在第一次真正需要 Model A 時才載入，一般 web 行程不必負擔
+    """
+    try:
+        from model_a.inference import FashionPredictor
+        return FashionPredictor
+    except ImportError as e:
+        print(f"⚠️ Model A import failed: {e}")
+        return None
+
 class ModelAAdapter:
     _instance = None
+    _lock = threading.Lock()
     
     def __new__(cls):
+        # Double-checked locking: 同時多個請求第一次呼叫時只會載入一次模型，
+        # 且初始化完成後才對外公開實例
         if cls._instance is None:
-            cls._instance = super(ModelAAdapter, cls).__new__(cls)
-            cls._instance._initialize()
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(ModelAAdapter, cls).__new__(cls)
+                    instance._initialize()
+                    cls._instance = instance
         return cls._instance
     
+    def warmup(self) -> bool:
+        """以假資料跑一次推論，讓第一次真正的 fallback 不必負擔載入與初始化成本"""
+        if not self.predictor:
+            return False
+        try:
+            self.predictor.warmup()
+            logger.info("✅ Model A warmup completed")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Model A warmup failed: {e}")
+            return False
+    
     def _initialize(self):
         self.predictor = None
-        if not MODEL_A_AVAILABLE:
+        FashionPredictor = _import_predictor()
+        if FashionPredictor is None:
             logger.warning("Model A module not found.")
             return
 
@@ -62,40 +89,81 @@ class ModelAAdapter:
                 "confidence": float
             }
         """
-        if not self.predictor:
-            return None
+        return self.analyze_images([image_bytes])[0]
+
+    def analyze_images(self, image_bytes_list: List[bytes], max_batch_size: Optional[int] = None) -> List[Optional[dict]]:
+        """
+        批次分析多張圖片 (一次 forward 處理多張)
+        
+        Args:
+            image_bytes_list: 圖片 bytes 列表
+            max_batch_size: 單次 forward 最多幾張 (None 則使用 Model A 設定)
+        
+        Returns:
+            list: 與輸入順序相同，無法辨識的圖片為 None
+        """
+        results: List[Optional[dict]] = [None] * len(image_bytes_list)
+        if not self.predictor or not image_bytes_list:
+            return results
             
+        # 在記憶體中解碼一次 (不落地暫存檔)，解碼後的像素直接交給 predictor
+        decoded = {}
+        for idx, image_bytes in enumerate(image_bytes_list):
+            try:
+                decoded[idx] = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            except Exception as e:
+                logger.error(f"❌ Model A image decode error: {e}")
+        
+        if not decoded:
+            return results
+        
         try:
-            # 將 bytes 轉換為 PIL Image
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            # 儲存為暫存檔供推論使用 (inference.py 設計是用路徑讀取)
-            # 為了效能，我們稍後應該修改 inference.py 支援直接傳入 PIL Image
-            # 但現在先用最簡單的方法: 改寫 inference.py 的介面
-            
-            # 使用我們修改過後的 predictor.predict_from_image (稍後需要在 inference.py 中增加此方法)
-            # 或者直接修改 inference.py 讓 predict 接受 PIL Image
-            
-            # 這裡我們需要對 inference.py 做一點小修改來支援 memory image
-            # 暫時先把 PIL image 傳過去，假設我們會修改 inference.py
-            
-            # 呼叫預測 (注意：這裡假設 predict 已經被修改為支援 PIL Image 或我們需要修改它)
-            # 為了不改動太多 model_a 的代碼，我們先用臨時文件的方法 (雖然慢一點但最穩)
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                image.save(tmp.name)
-                tmp_path = tmp.name
-            
-            result = self.predictor.predict(tmp_path, top_k=3)
-            
-            # 清理暫存檔
-            Path(tmp_path).unlink()
+            indices = list(decoded.keys())
+            raw_results = self.predictor.predict_batch(
+                [decoded[idx] for idx in indices], top_k=3, max_batch_size=max_batch_size
+            )
             
             # 格式化輸出
-            return self._format_result(result)
+            for idx, raw in zip(indices, raw_results):
+                results[idx] = self._format_result(raw)
             
         except Exception as e:
             logger.error(f"❌ Model A inference error: {e}")
-            return None
+        
+        return results
+
+    def embed_images(self, image_bytes_list: List[bytes], max_batch_size: Optional[int] = None) -> List[Optional[np.ndarray]]:
+        """
+        批次計算 embedding (不做標籤與顏色分析)
+
+        Returns:
+            list: 與輸入順序相同，無法解碼或推論失敗的圖片為 None
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(image_bytes_list)
+        if not self.predictor or not image_bytes_list:
+            return results
+
+        decoded = {}
+        for idx, image_bytes in enumerate(image_bytes_list):
+            try:
+                decoded[idx] = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            except Exception as e:
+                logger.error(f"❌ Model A image decode error: {e}")
+
+        if not decoded:
+            return results
+
+        try:
+            indices = list(decoded.keys())
+            embeddings = self.predictor.embed_batch(
+                [decoded[idx] for idx in indices], max_batch_size=max_batch_size
+            )
+            for idx, embedding in zip(indices, embeddings):
+                results[idx] = embedding
+        except Exception as e:
+            logger.error(f"❌ Model A embedding error: {e}")
+
+        return results
 
     def _format_result(self, raw_result):
         """將 Model A 的原始輸出轉換為前端需要的格式"""
@@ -126,43 +194,14 @@ class ModelAAdapter:
             "colors": [color_name], # 前端顯示中文與 Hex
             "style": [style],
             "confidence": confidence,
+            "embedding": raw_result.get('embedding'),  # 512 維向量 (由呼叫端存入 EmbeddingStore)
             "source": "model_a" # 標記來源
         }
 
     def _get_color_name(self, hex_code):
-        """將 Hex 色碼轉換為中文顏色名稱 (簡單版)"""
-        # 將 hex 轉為 rgb
-        h = hex_code.lstrip('#')
-        r, g, b = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
-        
-        # 定義基本顏色中心點
-        colors = {
-            "黑色": (0, 0, 0),
-            "白色": (255, 255, 255),
-            "灰色": (128, 128, 128),
-            "紅色": (255, 0, 0),
-            "橘色": (255, 165, 0),
-            "黃色": (255, 255, 0),
-            "綠色": (0, 128, 0),
-            "藍色": (0, 0, 255),
-            "紫色": (128, 0, 128),
-            "粉紅": (255, 192, 203),
-            "棕色": (165, 42, 42),
-            "米色": (245, 245, 220),
-            "卡其": (240, 230, 140),
-            "深藍": (0, 0, 139),
-        }
-        
-        min_dist = float('inf')
-        closest_name = "其他"
-        
-        for name, (cr, cg, cb) in colors.items():
-            dist = ((r - cr)**2 + (g - cg)**2 + (b - cb)**2) ** 0.5
-            if dist < min_dist:
-                min_dist = dist
-                closest_name = name
-                
-        return closest_name
+        """將 Hex 色碼轉換為中文顏色名稱 (CIELAB 預先計算查表)"""
+        from model_a.colors import get_color_name, hex_to_rgb
+        return get_color_name(hex_to_rgb(hex_code))
 
     def _translate_style(self, style):
         MAPPING = {
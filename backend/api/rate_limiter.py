@@ -0,0 +1,176 @@
+"""
+速率限制模組
+以 SQLite 保存 token bucket 狀態，讓同一台機器上的所有 uvicorn worker 共用同一份 Gemini 配額
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucketRateLimiter:
+    """
+    跨行程 Token Bucket 限流器
+
+    每個 bucket (通常一個 Gemini 模型一個) 有固定補充速率與突發容量。
+    取 token 採「預約制」: 在同一個 IMMEDIATE 交易內扣掉 token (允許變成負數)，
+    再依欠額算出要等多久，因此等待者依照進入順序輪流取得配額，不需要輪詢資料庫。
+    """
+
+    def __init__(self, db_path: str, buckets: Dict[str, Dict]):
+        """
+        Args:
+            db_path: SQLite 檔案路徑 (同機多個 worker 需指向同一個檔案)
+            buckets: {名稱: {"rpm": 每分鐘請求數, "burst": 可累積的最大 token 數}}
+
+        Raises:
+            ValueError: rpm 或 burst 不是正數 (補充速率為 0 時無法計算等待時間)
+        """
+        for name, cfg in buckets.items():
+            if float(cfg["rpm"]) <= 0 or float(cfg.get("burst", 1)) <= 0:
+                raise ValueError(f"{name} 的 rpm 與 burst 必須大於 0")
+        self.db_path = db_path
+        self.buckets = {
+            name: {"rate": float(cfg["rpm"]) / 60.0, "capacity": float(cfg.get("burst", 1))}
+            for name, cfg in buckets.items()
+        }
+        self._metrics_lock = threading.Lock()
+        self._metrics = {name: self._empty_metrics() for name in self.buckets}
+        self._init_db()
+
+    @staticmethod
+    def _empty_metrics() -> Dict:
+        return {
+            "waiting": 0,
+            "acquired": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "last_wait_seconds": 0.0
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作開新連線，避免跨執行緒共用 sqlite3 連線
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _reserve(self, bucket: str, tokens: float) -> float:
+        """扣除 token 並回傳需要等待的秒數"""
+        cfg = self.buckets[bucket]
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (bucket,)
+            ).fetchone()
+            available = cfg["capacity"] if row is None else \
+                min(cfg["capacity"], row[0] + (now - row[1]) * cfg["rate"])
+            available -= tokens
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (bucket, available, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return max(0.0, -available / cfg["rate"])
+
+    def _record(self, bucket: str, waited: Optional[float] = None, delta_waiting: int = 0):
+        with self._metrics_lock:
+            m = self._metrics[bucket]
+            m["waiting"] += delta_waiting
+            if waited is not None:
+                m["acquired"] += 1
+                m["total_wait_seconds"] += waited
+                m["max_wait_seconds"] = max(m["max_wait_seconds"], waited)
+                m["last_wait_seconds"] = waited
+
+    def acquire(self, bucket: str, tokens: float = 1.0) -> float:
+        """
+        同步取得 token (在背景執行緒使用)
+
+        Returns:
+            實際等待秒數
+        """
+        if bucket not in self.buckets:
+            return 0.0
+
+        wait_time = self._reserve(bucket, tokens)
+        if wait_time > 0:
+            print(f"[RateLimit] ⏳ {bucket} 配額保護中，等待 {wait_time:.1f} 秒...")
+            self._record(bucket, delta_waiting=1)
+            try:
+                time.sleep(wait_time)
+            finally:
+                self._record(bucket, delta_waiting=-1)
+        self._record(bucket, waited=wait_time)
+        return wait_time
+
+    async def acquire_async(self, bucket: str, tokens: float = 1.0) -> float:
+        """
+        非同步取得 token (在 event loop 中使用)
+        預約 token 後以 asyncio.sleep 等待，等待期間不佔用執行緒
+
+        Returns:
+            實際等待秒數
+        """
+        if bucket not in self.buckets:
+            return 0.0
+
+        wait_time = await asyncio.to_thread(self._reserve, bucket, tokens)
+        if wait_time > 0:
+            print(f"[RateLimit] ⏳ {bucket} 配額保護中，等待 {wait_time:.1f} 秒...")
+            self._record(bucket, delta_waiting=1)
+            try:
+                await asyncio.sleep(wait_time)
+            finally:
+                self._record(bucket, delta_waiting=-1)
+        self._record(bucket, waited=wait_time)
+        return wait_time
+
+    def get_metrics(self) -> Dict:
+        """
+        取得限流統計
+
+        Returns:
+            dict: {bucket: {waiting, acquired, avg_wait_seconds, ..., queued_tokens}}
+            其中 waiting 為本行程等待中的請求數，queued_tokens 為所有行程合計的預約欠額
+        """
+        conn = self._connect()
+        try:
+            rows = {name: (tokens, updated_at) for name, tokens, updated_at in
+                    conn.execute("SELECT name, tokens, updated_at FROM token_buckets")}
+        finally:
+            conn.close()
+
+        now = time.time()
+        result = {}
+        with self._metrics_lock:
+            for name, cfg in self.buckets.items():
+                m = dict(self._metrics[name])
+                m["avg_wait_seconds"] = round(m["total_wait_seconds"] / m["acquired"], 3) if m["acquired"] else 0.0
+                tokens = cfg["capacity"]
+                if name in rows:
+                    stored, updated_at = rows[name]
+                    tokens = min(cfg["capacity"], stored + (now - updated_at) * cfg["rate"])
+                m["available_tokens"] = round(max(tokens, 0.0), 3)
+                m["queued_tokens"] = round(max(-tokens, 0.0), 3)
+                m["rpm"] = round(cfg["rate"] * 60, 3)
+                m["burst"] = cfg["capacity"]
+                result[name] = m
+        return result
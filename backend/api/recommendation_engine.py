@@ -1,38 +1,153 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 import random
 import logging
+import numpy as np
 from database.models import ClothingItem, WeatherData
+from database.embedding_store import EmbeddingStore
+from api.wardrobe_index import WardrobeIndex, NEUTRAL_COLORS
 
 logger = logging.getLogger(__name__)
 
+# 搜尋模式: exhaustive = 向量化評分所有有效組合；random = 舊版隨機抽樣 50 組
+SEARCH_EXHAUSTIVE = "exhaustive"
+SEARCH_RANDOM = "random"
+
+# 評分參數 (與 _score_outfit 一致)
+BASE_SCORE = 70
+COLOR_BONUS = 10
+STYLE_BONUS = 15
+USED_PENALTY = 20
+# embedding 相容度加分權重: 上衣與下身 (扣除平均後的) cosine 相似度 x 權重，四捨五入為整數
+# 預設 0 不啟用: 只有部分單品有向量時，加分會偏向有向量的單品
+EMBEDDING_WEIGHT = 0
+
 class RecommendationEngine:
-    def __init__(self):
-        self.NEUTRAL_COLORS = ["黑色", "白色", "灰色", "深藍", "卡其", "米色", "咖啡"]
+    def __init__(self, search_mode: str = SEARCH_EXHAUSTIVE, seed: Optional[int] = None,
+                 embedding_store: Optional[EmbeddingStore] = None, embedding_weight: int = EMBEDDING_WEIGHT):
+        """
+        Args:
+            search_mode: exhaustive (預設) 或 random
+            seed: 同分組合的排序亂數種子；指定後結果可重現
+            embedding_store: Model A embedding (None 或 embedding_weight 為 0 時不計相容度)
+            embedding_weight: 上衣與下身 embedding 相容度的加分權重
+        """
+        self.NEUTRAL_COLORS = list(NEUTRAL_COLORS)
+        self.search_mode = search_mode
+        self.seed = seed
+        self.embedding_store = embedding_store
+        self.embedding_weight = int(embedding_weight)
         
     def recommend(
-        self, wardrobe: List[ClothingItem], weather: WeatherData, occasion: str, 
+        self, wardrobe: Union[List[ClothingItem], WardrobeIndex], weather: WeatherData, occasion: str, 
         user_gender: str = "中性", target_style: Optional[str] = None, force_outer: bool = False,
-        used_items: Optional[List[int]] = None
+        used_items: Optional[List[int]] = None, top_k: int = 3
     ) -> List[Dict]:
-        """核心推薦 - 防止長袖配短褲版 + 軟扣分機制避免重複推薦"""
+        """
+        核心推薦 - 防止長袖配短褲版 + 軟扣分機制避免重複推薦
+
+        Args:
+            wardrobe: 衣物列表，或預先建好的 WardrobeIndex (不必每次重建)
+        """
         if used_items is None:
             used_items = []
-        valid_items = self._pre_filter(wardrobe, weather, occasion, user_gender)
-        
-        tops = [i for i in valid_items if i.category == "上衣"]
-        bottoms = [i for i in valid_items if i.category == "下身"]
-        outers = [i for i in valid_items if i.category == "外套"]
-        shoes = [i for i in valid_items if i.category == "鞋子"]
-            
+        index = self._as_index(wardrobe)
+        buckets = index.candidates(weather.temp)
+        need_outer = (weather.temp < 22) or force_outer
+
+        if self.search_mode == SEARCH_EXHAUSTIVE:
+            state = self._build_search(index, buckets, need_outer, target_style, used_items)
+            candidates = [self._materialize(state, idx)[0] for idx in self._top_k(state, top_k)] if state else []
+        else:
+            candidates = self._search_random(*self._bucket_items(buckets), need_outer, weather, target_style, used_items)
+
+        if not candidates: return []
+        candidates.sort(key=lambda x: x["score"], reverse=True)
+        return [self._to_result(c) for c in candidates[:top_k]]
+
+    def recommend_k(
+        self, wardrobe: Union[List[ClothingItem], WardrobeIndex], weather: WeatherData, occasion: str,
+        user_gender: str = "中性", target_style: Optional[str] = None, force_outer: bool = False,
+        used_items: Optional[List] = None, locked_items: Optional[List] = None, k: int = 3
+    ) -> List[Dict]:
+        """
+        一次產生 k 套多樣化推薦 (只過濾、評分一次)
+        每選出一套就把其中的單品 (指定單品除外) 加入已使用並就地扣分，
+        結果等同於每套都重新呼叫 recommend 並傳入累積的 used_items
+
+        Args:
+            wardrobe: 衣物列表，或預先建好的 WardrobeIndex
+            used_items: 一開始就扣分的單品 id
+            locked_items: 指定單品 id，選中後不加入已使用 (每套都可重複出現)
+        """
+        used_items = list(used_items or [])
+        locked = set(locked_items or []) | {str(x) for x in (locked_items or [])}
+        index = self._as_index(wardrobe)
+        buckets = index.candidates(weather.temp)
         need_outer = (weather.temp < 22) or force_outer
+
+        outfits = []
+        if self.search_mode != SEARCH_EXHAUSTIVE:
+            for _ in range(k):
+                candidates = self._search_random(*self._bucket_items(buckets), need_outer, weather, target_style, used_items)
+                if not candidates:
+                    break
+                best = max(candidates, key=lambda x: x["score"])
+                outfits.append(self._to_result(best))
+                used_items.extend(
+                    i.id for i in best["items"]
+                    if i.id is not None and i.id not in locked and str(i.id) not in locked
+                )
+            return outfits
+
+        state = self._build_search(index, buckets, need_outer, target_style, used_items)
+        if not state:
+            return []
+        for _ in range(k):
+            # 每次取目前最高分 (同分隨機)，再把選中的單品扣分
+            flat = state["score"].ravel()
+            idx = int(state["rng"].choice(np.flatnonzero(flat == flat.max())))
+            outfit, chosen = self._materialize(state, idx)
+            outfits.append(self._to_result(outfit))
+            self._mark_used(state, chosen, locked)
+        return outfits
+
+    def _as_index(self, wardrobe: Union[List[ClothingItem], WardrobeIndex]) -> WardrobeIndex:
+        if isinstance(wardrobe, WardrobeIndex):
+            return wardrobe
+        return WardrobeIndex(wardrobe, neutral_colors=self.NEUTRAL_COLORS)
+
+    @staticmethod
+    def _bucket_items(buckets: Dict) -> Tuple[List[ClothingItem], List[ClothingItem], List[ClothingItem], List[ClothingItem]]:
+        """(上衣, 下身, 鞋子, 外套) 衣物列表"""
+        return tuple(buckets[category][0] for category in ("上衣", "下身", "鞋子", "外套"))
+
+    @staticmethod
+    def _to_result(candidate: Dict) -> Dict:
+        return {
+            "items": [item.to_dict() for item in candidate["items"]],
+            "score": candidate["score"],
+            "reasons": candidate["reasons"],
+            "type": candidate["type"]
+        }
+
+    def _search_random(
+        self, tops: List[ClothingItem], bottoms: List[ClothingItem], shoes: List[ClothingItem],
+        outers: List[ClothingItem], need_outer: bool, weather: WeatherData,
+        target_style: Optional[str], used_items: List[int]
+    ) -> List[Dict]:
+        """舊版: 隨機抽樣 50 組 (上衣, 下身, 鞋子)"""
+        rng = random.Random(self.seed) if self.seed is not None else random
         candidates = []
         
         # 配對邏輯
         if tops and bottoms:
+            # embedding 相容度一次算好整個 上衣 x 下身 矩陣，抽樣時直接查表
+            bonus = self._embedding_bonus(tops, bottoms)
             for _ in range(50): # 增加嘗試次數
-                t = random.choice(tops)
-                b = random.choice(bottoms)
-                s = random.choice(shoes) if shoes else None
+                ti = rng.randrange(len(tops))
+                bi = rng.randrange(len(bottoms))
+                t, b = tops[ti], bottoms[bi]
+                s = rng.choice(shoes) if shoes else None
                 
                 # ✅ 關鍵平衡規則：防止長袖配短褲
                 # 長袖/厚重 (warmth > 6), 短褲/輕薄 (warmth < 4)
@@ -47,43 +162,306 @@ class RecommendationEngine:
                     if o: outfit_items.append(o)
                 
                 outfit = {"items": outfit_items, "score": 0, "reasons": [], "type": "2-piece"}
-                self._score_outfit(outfit, weather, target_style, used_items)
+                self._score_outfit(outfit, weather, target_style, used_items,
+                                   pair_bonus=int(bonus[ti, bi]) if bonus is not None else 0)
                 candidates.append(outfit)
+        return candidates
 
-        if not candidates: return []
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        
-        final_list = []
-        for c in candidates[:3]:
-            final_list.append({
-                "items": [item.to_dict() for item in c["items"]],
-                "score": c["score"],
-                "reasons": c["reasons"],
-                "type": c["type"]
-            })
-        return final_list
-
-    def _pre_filter(self, items: List[ClothingItem], weather: WeatherData, occasion: str, user_gender: str) -> List[ClothingItem]:
-        filtered = []
-        for item in items:
-            if weather.temp > 28 and item.warmth > 6: continue
-            if weather.temp < 15 and item.warmth < 3: continue
-            filtered.append(item)
-        return filtered
-
-    def _score_outfit(self, outfit: Dict, weather: WeatherData, target_style: str, used_items: Optional[List[int]] = None, penalty_amount: int = 20):
-        """計算服裝配對分數，支援軟扣分機制"""
-        score = 70
+    def _build_search(
+        self, index: WardrobeIndex, buckets: Dict, need_outer: bool,
+        target_style: Optional[str], used_items: List[int]
+    ) -> Optional[Dict]:
+        """
+        向量化窮舉: 一次評分所有有效的 (上衣, 下身, 鞋子) 組合
+        - 顏色 id / 保暖度直接取自衣櫥索引，外套以顏色相容矩陣依上衣決定 (同 _find_best_match)
+        - 單品依評分特徵 (顏色, 風格, 是否已用, 保暖區間) 分組，同組單品分數相同，只對分組評分
+        - 先以保暖規則剔除 (上衣, 下身) 組合，再與鞋子評分
+        - 有 embedding 時，(上衣分組, 下身分組) 加上組內最相容那一對的相容度分數 (選套後由 _mark_used 重新計算)
+
+        Returns:
+            搜尋狀態 (分數矩陣與分組對照)，沒有有效組合時回傳 None
+        """
+        tops, tw, tc = buckets["上衣"]
+        bottoms, bw, bc = buckets["下身"]
+        shoes, _, sc = buckets["鞋子"]
+        outers, _, outer_colors = buckets["外套"] if need_outer else ([], None, np.zeros(0, dtype=np.int32))
+        if not tops or not bottoms:
+            return None
+
+        used = set(used_items or [])
+        style = target_style.lower() if target_style else None
+
+        def features(items: List[Optional[ClothingItem]]) -> Tuple[np.ndarray, np.ndarray]:
+            """(是否符合風格, 已用扣分)；None 代表沒有該單品"""
+            styled = [i is not None and bool(style) and style in str(i.name).lower() for i in items]
+            penalty = [USED_PENALTY if i is not None and i.id in used else 0 for i in items]
+            return np.array(styled, dtype=bool), np.array(penalty, dtype=np.int16)
+
+        best_outer = index.best_match(tc, outer_colors)
+        outer_items = [outers[o] if o >= 0 else None for o in best_outer]
+        # 沒有外套 (-1) 時取到最後補上的 -1
+        oc = np.append(outer_colors, -1)[best_outer]
+        ts, tu = features(tops)
+        os_, ou = features(outer_items)
+        bs, bu = features(bottoms)
+        if shoes:
+            ss, su = features(shoes)
+        else:
+            sc, ss, su = np.array([-1]), np.array([False]), np.array([0], dtype=np.int16)
+        tc, bc, sc, oc = (a.astype(np.int16) for a in (tc, bc, sc, oc))
+
+        # 1. 分組: 保暖規則只看區間 (上衣 >6 / <3，下身 <4 / >7)
+        top_first, top_group = self._group_rows(tc, ts, tu, tw > 6, tw < 3, oc, os_, ou)
+        bottom_first, bottom_group = self._group_rows(bc, bs, bu, bw < 4, bw > 7)
+        shoe_first, shoe_group = self._group_rows(sc, ss, su)
+        item_bonus = self._embedding_bonus(tops, bottoms)
+        tc, ts, tu, tw, oc, os_, ou = (a[top_first] for a in (tc, ts, tu, tw, oc, os_, ou))
+        bc, bs, bu, bw = (a[bottom_first] for a in (bc, bs, bu, bw))
+        sc, ss, su = (a[shoe_first] for a in (sc, ss, su))
+
+        # 2. 保暖規則剪枝: 防止長袖配短褲 (及反之)
+        wt, wb = tw[:, None], bw[None, :]
+        pair_top, pair_bottom = np.nonzero(~(((wt > 6) & (wb < 4)) | ((wb > 7) & (wt < 3))))
+        if pair_top.size == 0:
+            return None
+
+        # 3. 評分 (組合數 x 鞋子分組)，與 _score_outfit 相同的規則
+        #    顏色種類數 = |{上衣, 下身, 外套}| + (鞋子顏色不在其中)
+        ct, cb, co = tc[pair_top], bc[pair_bottom], oc[pair_top]
+        pair_distinct = 1 + (cb != ct) + ((co >= 0) & (co != ct) & (co != cb))
+        pair_style = ts[pair_top] | bs[pair_bottom] | os_[pair_top]
+        pair_score = BASE_SCORE + STYLE_BONUS * pair_style.astype(np.int16) - tu[pair_top] - bu[pair_bottom] - ou[pair_top]
+        pair_bonus = None
+        if item_bonus is not None:
+            pair_bonus = self._group_max(item_bonus, top_group, bottom_group)[pair_top, pair_bottom]
+            pair_score = pair_score + pair_bonus
+
+        cs = sc[None, :]
+        shoe_new = (cs >= 0) & (cs != ct[:, None]) & (cs != cb[:, None]) & (cs != co[:, None])
+        color_ok = (pair_distinct[:, None] + shoe_new) <= 2
+        # 風格加分只算一次: 組合本身未符合時才看鞋子
+        shoe_styled = ss[None, :] & ~pair_style[:, None]
+        score = (pair_score[:, None] - su[None, :]
+                 + np.int16(COLOR_BONUS) * color_ok + np.int16(STYLE_BONUS) * shoe_styled)
+
+        return {
+            "score": score,
+            "pair_top": pair_top, "pair_bottom": pair_bottom,
+            "top_group": top_group, "bottom_group": bottom_group, "shoe_group": shoe_group,
+            "tops": tops, "bottoms": bottoms, "shoes": shoes, "outer_items": outer_items,
+            "used": used, "initial_used": set(used),
+            "item_bonus": item_bonus, "pair_bonus": pair_bonus,
+            "rng": np.random.default_rng(self.seed)
+        }
+
+    @staticmethod
+    def _top_k(state: Dict, top_k: int) -> List[int]:
+        """取分數達第 k 名門檻的組合，同分者隨機挑選 (指定 seed 時可重現)"""
+        flat = state["score"].ravel()
+        rng = state["rng"]
+        k = min(top_k, flat.size)
+        if k <= 0:
+            return []
+        # 分數為小範圍整數，以 bincount 找門檻 (比 partition 處理大量同分更快)
+        lowest = int(flat.min())
+        counts_desc = np.bincount(flat - lowest)[::-1]
+        threshold = lowest + counts_desc.size - 1 - int(np.argmax(np.cumsum(counts_desc) >= k))
+        above = np.flatnonzero(flat > threshold)
+        ties = np.flatnonzero(flat == threshold)
+        picked = rng.choice(ties, size=k - above.size, replace=False)
+        best = np.concatenate([rng.permutation(above), picked])
+        return [int(i) for i in best[np.argsort(-flat[best], kind="stable")]]
+
+    @staticmethod
+    def _materialize(state: Dict, idx: int) -> Tuple[Dict, Dict[str, int]]:
+        """
+        把分數矩陣的位置轉為實際套裝: 每個分組隨機挑一件，優先挑尚未使用的單品
+
+        Returns:
+            (套裝, 各類別選中的單品索引)
+        """
+        rng, used = state["rng"], state["used"]
+        shoe_count = state["score"].shape[1]
+        pair, shoe = divmod(idx, shoe_count)
+
+        def pick(items: List[ClothingItem], group_of: np.ndarray, group: int) -> int:
+            members = np.flatnonzero(group_of == group)
+            fresh = [m for m in members if items[m].id not in used]
+            return int(rng.choice(fresh or members))
+
+        item_bonus = state.get("item_bonus")
+        if item_bonus is None:
+            chosen = {
+                "top": pick(state["tops"], state["top_group"], state["pair_top"][pair]),
+                "bottom": pick(state["bottoms"], state["bottom_group"], state["pair_bottom"][pair])
+            }
+        else:
+            # 有 embedding 時上衣與下身一起挑: 「相容度 - 已用扣分」最高的一對 (同分隨機)，即分數矩陣中的值
+            top_members = np.flatnonzero(state["top_group"] == state["pair_top"][pair])
+            bottom_members = np.flatnonzero(state["bottom_group"] == state["pair_bottom"][pair])
+            sub = RecommendationEngine._adjusted_bonus(state, top_members, bottom_members)
+            t, b = divmod(int(rng.choice(np.flatnonzero(sub.ravel() == sub.max()))), bottom_members.size)
+            chosen = {"top": int(top_members[t]), "bottom": int(bottom_members[b])}
+        outfit_items = [state["tops"][chosen["top"]], state["bottoms"][chosen["bottom"]]]
+        if state["shoes"]:
+            chosen["shoe"] = pick(state["shoes"], state["shoe_group"], shoe)
+            outfit_items.append(state["shoes"][chosen["shoe"]])
+        outer = state["outer_items"][chosen["top"]]
+        if outer is not None:
+            outfit_items.append(outer)
+
+        outfit = {"items": outfit_items, "score": int(state["score"].flat[idx]), "reasons": [], "type": "2-piece"}
+        return outfit, chosen
+
+    @staticmethod
+    def _mark_used(state: Dict, chosen: Dict[str, int], locked: set):
+        """
+        將選中的單品 (指定單品除外) 標記為已使用，並就地更新分數矩陣
+        分組內仍有未使用的單品時分數不變 (下次會挑未使用的)，全部用完才扣分；
+        有 embedding 時同組單品的相容度不同，改為重新計算選中上衣 / 下身所在分組的組合分數
+        """
+        used, score = state["used"], state["score"]
+
+        def newly_used(item: ClothingItem) -> bool:
+            if item.id is None or item.id in used or item.id in locked or str(item.id) in locked:
+                return False
+            used.add(item.id)
+            return True
+
+        def exhausted(items: List[ClothingItem], group_of: np.ndarray, index: int) -> bool:
+            return all(items[m].id in used for m in np.flatnonzero(group_of == group_of[index]))
+
+        tops, bottoms, shoes = state["tops"], state["bottoms"], state["shoes"]
+        with_bonus = state["item_bonus"] is not None
+        top = tops[chosen["top"]]
+        if newly_used(top) and not with_bonus and exhausted(tops, state["top_group"], chosen["top"]):
+            score[state["pair_top"] == state["top_group"][chosen["top"]]] -= USED_PENALTY
+
+        outer = state["outer_items"][chosen["top"]]
+        if outer is not None and newly_used(outer):
+            # 外套隨上衣顏色決定，所有搭配此外套的上衣分組都要扣分
+            groups = np.unique([state["top_group"][i] for i, o in enumerate(state["outer_items"]) if o is outer])
+            score[np.isin(state["pair_top"], groups)] -= USED_PENALTY
+
+        bottom_new = newly_used(bottoms[chosen["bottom"]])
+        if bottom_new and not with_bonus and exhausted(bottoms, state["bottom_group"], chosen["bottom"]):
+            score[state["pair_bottom"] == state["bottom_group"][chosen["bottom"]]] -= USED_PENALTY
+
+        if with_bonus:
+            RecommendationEngine._refresh_pair_bonus(state, chosen["top"], chosen["bottom"])
+
+        if "shoe" in chosen and newly_used(shoes[chosen["shoe"]]) and exhausted(shoes, state["shoe_group"], chosen["shoe"]):
+            score[:, state["shoe_group"][chosen["shoe"]]] -= USED_PENALTY
+
+    @staticmethod
+    def _adjusted_bonus(state: Dict, top_rows: np.ndarray, bottom_rows: np.ndarray) -> np.ndarray:
+        """
+        單品組合的相容度減去本次選套中已使用的扣分 (一開始就在 used_items 的扣分已含在分組特徵中)
+
+        Returns:
+            [len(top_rows), len(bottom_rows)] 整數矩陣
+        """
+        used, initial = state["used"], state["initial_used"]
+
+        def penalty(items: List[ClothingItem], rows: np.ndarray) -> np.ndarray:
+            return np.array([USED_PENALTY if items[r].id in used and items[r].id not in initial else 0
+                             for r in rows], dtype=np.int16)
+
+        return (state["item_bonus"][np.ix_(top_rows, bottom_rows)]
+                - penalty(state["tops"], top_rows)[:, None] - penalty(state["bottoms"], bottom_rows)[None, :])
+
+    @staticmethod
+    def _refresh_pair_bonus(state: Dict, top: int, bottom: int):
+        """重新計算選中的上衣分組與下身分組所在的組合分數 (組內最佳一對的調整後相容度)"""
+        score, pair_bonus = state["score"], state["pair_bonus"]
+        pair_top, pair_bottom = state["pair_top"], state["pair_bottom"]
+        top_group, bottom_group = state["top_group"], state["bottom_group"]
+        all_tops, all_bottoms = np.arange(top_group.size), np.arange(bottom_group.size)
+
+        # 上衣分組 x 所有下身分組
+        rows = np.flatnonzero(top_group == top_group[top])
+        adjusted = RecommendationEngine._adjusted_bonus(state, rows, all_bottoms)
+        by_bottom = RecommendationEngine._group_max(adjusted, np.zeros(rows.size, dtype=np.int64), bottom_group)[0]
+        mask = pair_top == top_group[top]
+        new = by_bottom[pair_bottom[mask]]
+        score[mask] += (new - pair_bonus[mask])[:, None]
+        pair_bonus[mask] = new
+
+        # 所有上衣分組 x 下身分組
+        cols = np.flatnonzero(bottom_group == bottom_group[bottom])
+        adjusted = RecommendationEngine._adjusted_bonus(state, all_tops, cols)
+        by_top = RecommendationEngine._group_max(adjusted, top_group, np.zeros(cols.size, dtype=np.int64))[:, 0]
+        mask = pair_bottom == bottom_group[bottom]
+        new = by_top[pair_top[mask]]
+        score[mask] += (new - pair_bonus[mask])[:, None]
+        pair_bonus[mask] = new
+
+    def _embedding_bonus(self, tops: List[ClothingItem], bottoms: List[ClothingItem]) -> Optional[np.ndarray]:
+        """
+        上衣 x 下身的 embedding 相容度加分 (round(權重 x cosine))
+        向量先扣除整體平均再正規化，cosine 以 0 為中心；沒有向量的單品加分為 0 (即平均水準)，
+        兩邊都沒有向量時回傳 None
+        """
+        if self.embedding_store is None or not self.embedding_weight or not tops or not bottoms:
+            return None
+        try:
+            top_vectors, top_found = self.embedding_store.get_many([t.image_hash for t in tops])
+            bottom_vectors, bottom_found = self.embedding_store.get_many([b.image_hash for b in bottoms])
+        except Exception as e:
+            print(f"[AI] ⚠️ 讀取 embedding 失敗，略過相容度: {e}")
+            return None
+        if not top_found.any() or not bottom_found.any():
+            return None
+        mean = self.embedding_store.mean_vector()
+
+        def centred(vectors: np.ndarray, found: np.ndarray) -> np.ndarray:
+            vectors = np.where(found[:, None], vectors - mean, 0).astype(np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        similarity = centred(top_vectors, top_found) @ centred(bottom_vectors, bottom_found).T
+        return np.rint(self.embedding_weight * similarity).astype(np.int16)
+
+    @staticmethod
+    def _group_max(values: np.ndarray, row_group: np.ndarray, col_group: np.ndarray) -> np.ndarray:
+        """依列 / 行分組取最大值 (分組編號為 0..G-1)"""
+        row_order = np.argsort(row_group, kind="stable")
+        row_starts = np.flatnonzero(np.r_[True, np.diff(row_group[row_order]) != 0])
+        reduced = np.maximum.reduceat(values[row_order], row_starts, axis=0)
+        col_order = np.argsort(col_group, kind="stable")
+        col_starts = np.flatnonzero(np.r_[True, np.diff(col_group[col_order]) != 0])
+        return np.maximum.reduceat(reduced[:, col_order], col_starts, axis=1)
+
+    @staticmethod
+    def _group_rows(*columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """依特徵欄位分組，回傳 (每組代表列的索引, 每列所屬組別)"""
+        keys = np.stack([np.asarray(c, dtype=np.int16) for c in columns], axis=1)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        return first, inverse.reshape(-1)
+
+    def _score_outfit(self, outfit: Dict, weather: WeatherData, target_style: str, used_items: Optional[List[int]] = None, penalty_amount: int = USED_PENALTY,
+                      pair_bonus: Optional[int] = None):
+        """
+        計算服裝配對分數，支援軟扣分機制 (規則變更時需同步 _build_search 的向量化評分)
+        pair_bonus: 呼叫端已算好的 (上衣, 下身) 相容度加分；None 則在此查詢 embedding
+        """
+        score = BASE_SCORE
         items = outfit["items"]
         
         # 簡單評分 logic
         colors = [i.color for i in items]
-        if len(set(colors)) <= 2: score += 10
+        if len(set(colors)) <= 2: score += COLOR_BONUS
         
         if target_style:
             for item in items:
                 if target_style.lower() in str(item.name).lower():
-                    score += 15; break
+                    score += STYLE_BONUS; break
+
+        # embedding 相容度 (上衣, 下身)
+        if pair_bonus is None:
+            bonus = self._embedding_bonus(items[:1], items[1:2])
+            pair_bonus = int(bonus[0, 0]) if bonus is not None else 0
+        score += pair_bonus
         
         # ✅ 軟扣分機制：若該單品已在前面被使用，扣分
         if used_items:
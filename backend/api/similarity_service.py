@@ -0,0 +1,149 @@
+"""
+相似單品服務
+以 Model A embedding 為每位使用者建立向量矩陣 (單品數 x 512，L2 正規化)，
+查詢時以一次矩陣乘法 (BLAS) 算出所有單品的 cosine 相似度，再以 argpartition 取前 k 名
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from database.embedding_store import EmbeddingStore
+from database.models import ClothingItem
+from api.wardrobe_service import WardrobeService
+
+
+class UserEmbeddingIndex:
+    """單一使用者有 embedding 的單品與其向量矩陣"""
+
+    def __init__(self, items: List[ClothingItem], matrix: np.ndarray, complete: bool):
+        self.items = items
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        # 所有單品都有向量 (為 False 時，EmbeddingStore 有新向量就重建)
+        self.complete = complete
+        self._row_of = {item.id: row for row, item in enumerate(items)}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def row_of(self, item_id) -> Optional[int]:
+        row = self._row_of.get(item_id)
+        if row is None and isinstance(item_id, str) and item_id.isdigit():
+            row = self._row_of.get(int(item_id))
+        return row
+
+    def search(self, query: np.ndarray, k: int, exclude: Optional[int] = None,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        以 cosine 相似度排序取前 k 名
+
+        Args:
+            query: 已正規化的查詢向量
+            exclude: 排除的列 (查詢單品本身)
+            mask: 只考慮 mask 為 True 的列
+
+        Returns:
+            [(列號, 相似度), ...] 由高到低
+        """
+        scores = self.matrix @ query
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        if exclude is not None:
+            scores[exclude] = -np.inf
+
+        valid = int(np.isfinite(scores).sum())
+        k = min(k, valid)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.size else np.arange(scores.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+
+class SimilarityService:
+    """相似單品查詢 (每位使用者一份 embedding 矩陣，隨衣櫥索引的版本更新)"""
+
+    def __init__(self, embedding_store: EmbeddingStore, wardrobe_service: WardrobeService,
+                 cache_max_users: int = 256):
+        """
+        Args:
+            embedding_store: Model A embedding 儲存
+            wardrobe_service: 衣櫥服務 (提供快取的衣櫥索引)
+            cache_max_users: 最多快取幾位使用者的矩陣 (LRU)
+        """
+        self.embedding_store = embedding_store
+        self.wardrobe_service = wardrobe_service
+        self.cache_max_users = cache_max_users
+        # user_id -> (衣櫥索引, 索引版本, store 版本, UserEmbeddingIndex)
+        self._cache: "OrderedDict[str, Tuple[object, int, int, UserEmbeddingIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "builds": 0}
+
+    def get_user_index(self, user_id: str) -> UserEmbeddingIndex:
+        """取得使用者的 embedding 矩陣 (衣櫥或向量有變動時才重建)"""
+        wardrobe_index = self.wardrobe_service.get_wardrobe_index(user_id)
+        store_version = self.embedding_store.version
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry and entry[0] is wardrobe_index and entry[1] == wardrobe_index.version \
+                    and (entry[3].complete or entry[2] == store_version):
+                self._cache.move_to_end(user_id)
+                return entry[3]
+            index_version = wardrobe_index.version
+
+        start = time.perf_counter()
+        items = [item for item in wardrobe_index.items() if item.image_hash]
+        matrix, found = self.embedding_store.get_many([item.image_hash for item in items])
+        complete = bool(found.all())
+        user_index = UserEmbeddingIndex([item for item, ok in zip(items, found) if ok], matrix[found], complete)
+        print(f"[Embedding] 🔧 建立 {user_id[:8]} 的向量矩陣: {len(user_index)}/{len(items)} 件 "
+              f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+        with self._lock:
+            self._stats["builds"] += 1
+            self._cache[user_id] = (wardrobe_index, index_version, store_version, user_index)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_max_users:
+                self._cache.popitem(last=False)
+        return user_index
+
+    def similar_items(self, user_id: str, item_id, k: int = 10,
+                      same_category: bool = False) -> Optional[List[Dict]]:
+        """
+        與指定單品最相似的 k 件衣物
+
+        Args:
+            item_id: 查詢的單品 id
+            k: 回傳件數
+            same_category: 只回傳同類別的單品
+
+        Returns:
+            衣物 dict 列表 (含 similarity，由高到低)；單品不存在或尚無 embedding 時為 None
+        """
+        user_index = self.get_user_index(user_id)
+        row = user_index.row_of(item_id)
+        if row is None:
+            return None
+
+        mask = None
+        if same_category:
+            category = user_index.items[row].category
+            mask = np.array([item.category == category for item in user_index.items], dtype=bool)
+
+        with self._lock:
+            self._stats["queries"] += 1
+        results = []
+        for match_row, score in user_index.search(user_index.matrix[row], max(0, k), exclude=row, mask=mask):
+            data = user_index.items[match_row].to_dict()
+            data.pop("image_data", None)
+            data["similarity"] = round(score, 4)
+            results.append(data)
+        return results
+
+    def get_stats(self) -> Dict:
+        """查詢統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_users"] = len(self._cache)
+        stats["store"] = self.embedding_store.get_stats()
+        return stats
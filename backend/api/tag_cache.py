@@ -0,0 +1,129 @@
+"""
+辨識結果快取模組
+以圖片 SHA256 為 key 的持久化 LRU 快取，重複上傳同一張照片時不必再呼叫 Gemini 或 Model A
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+
+class TagCache:
+    """SQLite 持久化 LRU 標籤快取 (可跨 worker 共用)"""
+
+    def __init__(self, db_path: str, max_entries: int = 5000):
+        """
+        Args:
+            db_path: SQLite 檔案路徑
+            max_entries: 最多保留幾筆，超過時淘汰最久未使用的項目
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS tag_cache ("
+                    "image_hash TEXT PRIMARY KEY, tags TEXT NOT NULL, last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_cache_access ON tag_cache (last_access)")
+        finally:
+            conn.close()
+
+    def _bump(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def get_many(self, image_hashes: List[str]) -> Dict[str, Dict]:
+        """
+        批次查詢快取
+
+        Returns:
+            {image_hash: tags} (只包含命中的項目)
+        """
+        unique_hashes = list(dict.fromkeys(image_hashes))
+        if not unique_hashes:
+            return {}
+
+        found = {}
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    placeholders = ",".join("?" * len(unique_hashes))
+                    rows = conn.execute(
+                        f"SELECT image_hash, tags FROM tag_cache WHERE image_hash IN ({placeholders})",
+                        unique_hashes
+                    ).fetchall()
+                    found = {h: json.loads(tags) for h, tags in rows}
+                    if found:
+                        # 更新存取時間以維持 LRU 順序
+                        now = time.time()
+                        conn.executemany(
+                            "UPDATE tag_cache SET last_access = ? WHERE image_hash = ?",
+                            [(now, h) for h in found]
+                        )
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"[Cache] 讀取標籤快取失敗: {e}")
+            found = {}
+
+        self._bump("hits", len(found))
+        self._bump("misses", len(unique_hashes) - len(found))
+        return found
+
+    def put_many(self, entries: Dict[str, Dict]):
+        """批次寫入快取，並淘汰超出容量的舊項目"""
+        if not entries:
+            return
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO tag_cache (image_hash, tags, last_access) VALUES (?, ?, ?)",
+                        [(h, json.dumps(tags, ensure_ascii=False), now) for h, tags in entries.items()]
+                    )
+                    count = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()[0]
+                    overflow = count - self.max_entries
+                    if overflow > 0:
+                        conn.execute(
+                            "DELETE FROM tag_cache WHERE image_hash IN ("
+                            "SELECT image_hash FROM tag_cache ORDER BY last_access ASC LIMIT ?)",
+                            (overflow,)
+                        )
+                        self._bump("evictions", overflow)
+            finally:
+                conn.close()
+            self._bump("writes", len(entries))
+        except Exception as e:
+            print(f"[Cache] 寫入標籤快取失敗: {e}")
+
+    def get_stats(self) -> Dict:
+        """取得命中率等統計 (計數為本行程累計)"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        try:
+            conn = self._connect()
+            try:
+                stats["entries"] = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()[0]
+            finally:
+                conn.close()
+        except Exception:
+            stats["entries"] = None
+        stats["max_entries"] = self.max_entries
+        return stats
@@ -0,0 +1,311 @@
+"""
+上傳任務服務層
+將 AI 辨識與資料庫儲存移到背景 worker pool 執行，API 只負責收檔並立即回傳 job_id
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from database.models import ClothingItem
+from api.image_normalizer import ImageNormalizer
+
+
+class UploadJobService:
+    """
+    背景上傳任務管理 (有上限的 worker pool + 每張圖片的進度狀態)
+
+    任務狀態只存在本行程的記憶體中，/api/upload/status/{job_id} 必須打到建立任務的同一個行程，
+    因此服務需以單一 uvicorn worker 執行 (多 worker 時查詢可能找不到任務)
+    """
+
+    # 任務狀態
+    JOB_QUEUED = "queued"
+    JOB_TAGGING = "tagging"
+    JOB_SAVING = "saving"
+    JOB_DONE = "done"
+    JOB_FAILED = "failed"
+
+    # 單張圖片狀態
+    IMAGE_PENDING = "pending"
+    IMAGE_TAGGING = "tagging"
+    IMAGE_SAVING = "saving"
+    IMAGE_SAVED = "saved"
+    IMAGE_DUPLICATE = "duplicate"
+    IMAGE_FAILED = "failed"
+
+    # 厚度字串對應數值
+    WARMTH_MAP = {"薄": 2, "適中": 5, "厚": 8}
+
+    def __init__(self, ai_service, wardrobe_service, max_workers: int = 2,
+                 max_pending_jobs: int = 20, job_ttl_seconds: int = 3600,
+                 image_normalizer: Optional[ImageNormalizer] = None, embed_on_upload: bool = False,
+                 max_images_per_job: int = 10):
+        """
+        Args:
+            ai_service: AIService 實例
+            wardrobe_service: WardrobeService 實例
+            image_normalizer: 辨識與儲存前的圖片正規化 (None 則使用原始檔案)
+            max_workers: 同時執行的上傳任務數上限
+            max_pending_jobs: 尚未完成的任務數上限 (超過則拒絕新任務)
+            job_ttl_seconds: 已完成任務保留多久供查詢
+            embed_on_upload: 儲存前以 Model A 計算 embedding (相似單品與相容度加分使用)
+            max_images_per_job: 單一任務最多幾張圖片 (超過則拒絕)
+        """
+        self.ai_service = ai_service
+        self.wardrobe_service = wardrobe_service
+        self.max_pending_jobs = max_pending_jobs
+        self.job_ttl_seconds = job_ttl_seconds
+        self.image_normalizer = image_normalizer
+        self.embed_on_upload = embed_on_upload
+        self.max_images_per_job = max_images_per_job
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-job")
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: str, files: List[Tuple[str, bytes]], warmth_str: str = "薄") -> Tuple[Optional[str], str]:
+        """
+        建立上傳任務並排入背景執行
+
+        Args:
+            user_id: 使用者 ID
+            files: [(檔名, 圖片 bytes), ...]
+            warmth_str: 使用者指定厚度 (薄/適中/厚)
+
+        Returns:
+            (job_id, 結果訊息)，無法排入時 job_id 為 None
+        """
+        if len(files) > self.max_images_per_job:
+            return None, f"一次最多上傳 {self.max_images_per_job} 張圖片"
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "user_id": user_id,
+            "status": self.JOB_QUEUED,
+            "warmth": self.WARMTH_MAP.get(warmth_str, 5),
+            "created_at": now,
+            "updated_at": now,
+            "message": None,
+            "images": [
+                {
+                    "index": idx,
+                    "filename": filename,
+                    "size": len(content),
+                    "normalized_size": None,
+                    "status": self.IMAGE_PENDING,
+                    "tags": None,
+                    "message": None
+                }
+                for idx, (filename, content) in enumerate(files)
+            ]
+        }
+
+        with self._lock:
+            self._purge_expired(now)
+            pending = sum(1 for j in self._jobs.values() if j["status"] not in (self.JOB_DONE, self.JOB_FAILED))
+            if pending >= self.max_pending_jobs:
+                return None, "系統忙碌中，請稍後再試"
+            self._jobs[job_id] = job
+
+        img_bytes_list = [content for _, content in files]
+        self._executor.submit(self._run_job, job_id, img_bytes_list)
+        print(f"[UPLOAD] 任務 {job_id} 已排入 ({len(files)} 張圖片)")
+        return job_id, "已排入處理佇列"
+
+    def get_status(self, job_id: str, user_id: str) -> Optional[Dict]:
+        """取得任務進度 (僅限任務擁有者查詢)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["user_id"] != user_id:
+                return None
+            return self._snapshot(job)
+
+    def shutdown(self, wait: bool = True):
+        """
+        停止接收新任務
+
+        Args:
+            wait: True 則等待執行中與排隊中的任務完成；False 則取消尚未開始的任務並立即返回
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    # ========== 背景執行 ==========
+
+    def _run_job(self, job_id: str, img_bytes_list: List[bytes]):
+        """Worker 執行的完整上傳流程: 圖片正規化 -> 重複檢查 -> AI 辨識 -> 批次儲存"""
+        try:
+            # 任務 dict 由 submit / _purge_expired 在鎖內增刪，這裡也在鎖內取出需要的欄位
+            with self._lock:
+                job = self._jobs[job_id]
+                job = {
+                    "user_id": job["user_id"],
+                    "warmth": job["warmth"],
+                    "filenames": [image["filename"] for image in job["images"]]
+                }
+            user_id = job["user_id"]
+            self._set_job_status(job_id, self.JOB_TAGGING)
+            self._set_all_images(job_id, self.IMAGE_TAGGING)
+
+            # image_hash 以原始檔案計算 (與舊資料相同，也不受正規化設定影響)，重複檢查與快取都以此為 key
+            hashes = [self.wardrobe_service.get_image_hash(img) for img in img_bytes_list]
+
+            # 修正方向、縮圖並去除中繼資料，辨識與儲存都使用正規化後的圖片
+            mime_type = "image/jpeg"
+            if self.image_normalizer:
+                img_bytes_list = [self.image_normalizer.normalize(img) for img in img_bytes_list]
+                mime_type = self.image_normalizer.mime_type
+                for idx, img_bytes in enumerate(img_bytes_list):
+                    self._update_image(job_id, idx, normalized_size=len(img_bytes))
+
+            # 一次查詢所有 hash，衣櫥中已有或同批次重複的圖片不送 AI 辨識也不寫入
+            existing = self.wardrobe_service.find_existing_hashes(user_id, hashes)
+            first_seen: Dict[str, int] = {}
+            new_indices = []
+            for idx, img_hash in enumerate(hashes):
+                if img_hash in existing:
+                    self._update_image(job_id, idx, status=self.IMAGE_DUPLICATE,
+                                       message=f"衣櫥中已有相同圖片: {existing[img_hash]}")
+                elif img_hash in first_seen:
+                    other = job["filenames"][first_seen[img_hash]]
+                    self._update_image(job_id, idx, status=self.IMAGE_DUPLICATE,
+                                       message=f"與本次上傳的 {other} 相同")
+                else:
+                    first_seen[img_hash] = idx
+                    new_indices.append(idx)
+
+            if len(new_indices) < len(img_bytes_list):
+                print(f"[UPLOAD] 任務 {job_id}: 略過 {len(img_bytes_list) - len(new_indices)} 張重複圖片")
+
+            if new_indices:
+                print(f"[UPLOAD] 任務 {job_id}: 開始 AI 辨識 {len(new_indices)} 張圖片...")
+                tags_list = self.ai_service.batch_auto_tag(
+                    [img_bytes_list[i] for i in new_indices], mime_type, image_hashes=[hashes[i] for i in new_indices]
+                )
+
+                if not tags_list:
+                    for idx in new_indices:
+                        self._update_image(job_id, idx, status=self.IMAGE_FAILED, message="AI 辨識失敗")
+                    self._set_job_status(job_id, self.JOB_FAILED, "AI 辨識失敗,請稍後再試")
+                    return
+
+                # 先存 embedding 再寫入衣櫥，衣櫥索引更新時就能取得向量；失敗不影響上傳
+                if self.embed_on_upload:
+                    try:
+                        self.ai_service.store_embeddings(
+                            [img_bytes_list[i] for i in new_indices], image_hashes=[hashes[i] for i in new_indices]
+                        )
+                    except Exception as e:
+                        print(f"[UPLOAD] ⚠️ 任務 {job_id}: 計算 embedding 失敗: {e}")
+
+                self._set_job_status(job_id, self.JOB_SAVING)
+                self._save_tagged(job_id, job, new_indices, img_bytes_list, hashes, tags_list)
+
+            self._set_job_status(job_id, self.JOB_DONE)
+            snapshot = self.get_status(job_id, user_id)
+            print(f"[UPLOAD] 任務 {job_id} 完成: 成功 {snapshot['success_count']} 件, "
+                  f"重複 {snapshot['duplicate_count']} 件, 失敗 {snapshot['fail_count']} 件")
+        except Exception as e:
+            print(f"[ERROR] 任務 {job_id} 執行異常: {e}")
+            print(f"[ERROR] 詳細堆疊: {traceback.format_exc()}")
+            self._set_all_images(job_id, self.IMAGE_FAILED, str(e), only_unfinished=True)
+            self._set_job_status(job_id, self.JOB_FAILED, f"上傳失敗: {e}")
+
+    def _save_tagged(self, job_id: str, job: Dict, indices: List[int], img_bytes_list: List[bytes],
+                     hashes: List[str], tags_list: List[Dict]):
+        """把辨識結果組成衣物資料並以單次 bulk insert 寫入"""
+        entries = []
+        entry_indices = []
+        for idx, tags in zip(indices, tags_list):
+            filename = job["filenames"][idx]
+            self._update_image(job_id, idx, status=self.IMAGE_SAVING, tags=tags)
+            item = ClothingItem(
+                user_id=job["user_id"],
+                name=tags.get('name', filename),
+                category=tags.get('category', '其他'),
+                color=tags.get('color', '未知'),
+                style=tags.get('style', ''),
+                warmth=job["warmth"],  # 使用使用者指定的厚度
+                image_hash=hashes[idx]
+            )
+            entries.append((item, img_bytes_list[idx]))
+            entry_indices.append(idx)
+
+        # AI 回傳數量不足時，剩下的圖片視為失敗
+        for idx in indices[len(tags_list):]:
+            self._update_image(job_id, idx, status=self.IMAGE_FAILED, message="AI 未回傳標籤")
+
+        results = self.wardrobe_service.save_items(entries)
+        for idx, (success, msg) in zip(entry_indices, results):
+            if success:
+                self._update_image(job_id, idx, status=self.IMAGE_SAVED)
+            else:
+                self._update_image(job_id, idx, status=self.IMAGE_FAILED, message=msg)
+                print(f"[ERROR] 任務 {job_id}: '{job['filenames'][idx]}' 儲存失敗 - {msg}")
+
+    # ========== 狀態管理 ==========
+
+    def _set_job_status(self, job_id: str, status: str, message: Optional[str] = None):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = status
+            job["updated_at"] = time.time()
+            if message:
+                job["message"] = message
+
+    def _update_image(self, job_id: str, idx: int, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["images"][idx].update(fields)
+            job["updated_at"] = time.time()
+
+    def _set_all_images(self, job_id: str, status: str, message: Optional[str] = None, only_unfinished: bool = False):
+        with self._lock:
+            job = self._jobs[job_id]
+            for image in job["images"]:
+                if only_unfinished and image["status"] in (self.IMAGE_SAVED, self.IMAGE_DUPLICATE, self.IMAGE_FAILED):
+                    continue
+                image["status"] = status
+                if message:
+                    image["message"] = message
+            job["updated_at"] = time.time()
+
+    def _purge_expired(self, now: float):
+        """移除已結束且超過保留時間的任務 (呼叫者需持有 lock)"""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in (self.JOB_DONE, self.JOB_FAILED)
+            and now - job["updated_at"] > self.job_ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _snapshot(self, job: Dict) -> Dict:
+        """組出回傳給前端的任務進度 (呼叫者需持有 lock)"""
+        images = [dict(image) for image in job["images"]]
+        total = len(images)
+        success_count = sum(1 for i in images if i["status"] == self.IMAGE_SAVED)
+        fail_count = sum(1 for i in images if i["status"] == self.IMAGE_FAILED)
+        duplicate_count = sum(1 for i in images if i["status"] == self.IMAGE_DUPLICATE)
+        fail_details = [f"{i['filename']}: {i['message']}" for i in images if i["status"] == self.IMAGE_FAILED]
+        duplicates = [f"{i['filename']}: {i['message']}" for i in images if i["status"] == self.IMAGE_DUPLICATE]
+        processed = success_count + duplicate_count + fail_count
+
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "finished": job["status"] in (self.JOB_DONE, self.JOB_FAILED),
+            "message": job["message"],
+            "total": total,
+            "processed": processed,
+            "progress": round(processed / total, 3) if total else 1.0,
+            "success_count": success_count,
+            "duplicate_count": duplicate_count,
+            "fail_count": fail_count,
+            "items": [i["tags"] for i in images if i["status"] == self.IMAGE_SAVED],
+            "fail_details": fail_details if fail_details else None,
+            "duplicates": duplicates if duplicates else None,
+            "images": images
+        }
@@ -13,6 +13,50 @@ class UserService:
     def __init__(self, supabase_client: SupabaseClient):
         self.db = supabase_client
     
+    # ========== 帳號 ==========
+
+    def login(self, username: str, password: str) -> Optional[str]:
+        """
+        驗證帳號密碼
+
+        Returns:
+            使用者 ID，驗證失敗則為 None
+        """
+        result = self.db.client.table("users")\
+            .select("id")\
+            .eq("username", username)\
+            .eq("password", password)\
+            .execute()
+
+        if result.data:
+            return str(result.data[0]['id'])
+        return None
+
+    def register(self, username: str, password: str) -> Tuple[bool, str]:
+        """
+        註冊新帳號
+
+        Returns:
+            (是否成功, 訊息)
+        """
+        # 檢查重複
+        existing = self.db.client.table("users")\
+            .select("id")\
+            .eq("username", username)\
+            .execute()
+
+        if existing.data:
+            return False, "使用者名稱已存在"
+
+        # 新增用戶（讓 Supabase 自動生成 UUID）
+        result = self.db.client.table("users")\
+            .insert({"username": username, "password": password})\
+            .execute()
+
+        if result.data:
+            return True, "註冊成功"
+        return False, "註冊失敗"
+
     # ========== 個人資料管理 ==========
     
     def get_profile(self, user_id: str) -> Optional[Dict]:
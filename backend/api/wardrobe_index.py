@@ -0,0 +1,201 @@
+"""
+衣櫥索引模組
+每位使用者一份: 類別分桶 (依保暖度排序的陣列) 與顏色相容矩陣
+新增 / 修改 / 刪除衣物時增量更新，推薦引擎直接查詢，不必每次從 ClothingItem 列表重建
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from database.models import ClothingItem
+
+# 推薦引擎使用的類別
+CATEGORIES = ("上衣", "下身", "外套", "鞋子")
+
+# 百搭色: 與任何顏色都相容
+NEUTRAL_COLORS = ("黑色", "白色", "灰色", "深藍", "卡其", "米色", "咖啡")
+
+# 沒有保暖度時的預設值 (同 ClothingItem)
+DEFAULT_WARMTH = 5
+
+
+class WardrobeIndex:
+    """
+    單一使用者的衣櫥索引
+
+    - 每個類別一組依保暖度排序的陣列 (slot, 保暖度, 顏色 id)，天氣過濾以 searchsorted 切片
+    - 顏色相容矩陣 compat[a, b]: b 可搭配 a (同色或 b 為百搭色)
+    - rank 記錄 get_wardrobe 的順序 (新到舊)，查詢結果依 rank 排序
+    """
+
+    def __init__(self, items: Iterable[ClothingItem] = (), neutral_colors: Iterable[str] = NEUTRAL_COLORS):
+        """
+        Args:
+            items: 衣物 (依 get_wardrobe 的順序，即新到舊)
+            neutral_colors: 百搭色
+        """
+        self._lock = threading.RLock()
+        self._neutral = set(neutral_colors)
+        # 每次增量更新遞增，依索引建立的衍生資料 (例如 embedding 矩陣) 據此判斷是否過期
+        self.version = 0
+
+        # slot: 單品在索引中的位置 (刪除後留空，不重複使用)
+        self._slots: List[Optional[ClothingItem]] = []
+        self._ranks: List[int] = []
+        self._slot_of: Dict = {}  # item id -> slot
+
+        self._color_ids: Dict = {}
+        self._compat = np.zeros((0, 0), dtype=bool)
+
+        empty = np.zeros(0, dtype=np.int32)
+        # 類別 -> (slots, 保暖度, 顏色 id)，依保暖度排序
+        self._buckets: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {
+            category: (empty, empty, empty) for category in CATEGORIES
+        }
+
+        self._build(list(items))
+
+    def _build(self, items: List[ClothingItem]):
+        """一次建立所有分桶 (只排序一次，不逐筆插入)"""
+        rows: Dict[str, List[Tuple[int, int, int]]] = {category: [] for category in CATEGORIES}
+        for rank, item in enumerate(items):
+            slot = len(self._slots)
+            self._slots.append(item)
+            self._ranks.append(rank)
+            if item.id is not None:
+                self._slot_of[item.id] = slot
+            if item.category in rows:
+                rows[item.category].append((slot, self._warmth_of(item), self._color_id(item.color)))
+
+        for category, category_rows in rows.items():
+            if not category_rows:
+                continue
+            slots, warmth, colors = (np.array(column, dtype=np.int32) for column in zip(*category_rows))
+            order = np.argsort(warmth, kind="stable")
+            self._buckets[category] = (slots[order], warmth[order], colors[order])
+
+    # ========== 增量更新 ==========
+
+    def upsert(self, item: ClothingItem):
+        """新增或修改衣物 (修改時保留原本的順序，新衣物排在最前面)"""
+        with self._lock:
+            slot = self._slot_of.get(item.id) if item.id is not None else None
+            if slot is not None:
+                rank = self._ranks[slot]
+                self._remove_slot(slot)
+            else:
+                rank = min(self._ranks, default=1) - 1
+            self._insert(item, rank)
+            self.version += 1
+
+    def remove(self, item_id) -> bool:
+        """刪除衣物，回傳是否存在"""
+        with self._lock:
+            slot = self._slot_of.get(item_id)
+            if slot is None:
+                return False
+            self._remove_slot(slot)
+            self.version += 1
+            return True
+
+    def _insert(self, item: ClothingItem, rank: int):
+        slot = len(self._slots)
+        self._slots.append(item)
+        self._ranks.append(rank)
+        if item.id is not None:
+            self._slot_of[item.id] = slot
+
+        if item.category not in self._buckets:
+            return
+        slots, warmth, colors = self._buckets[item.category]
+        item_warmth = self._warmth_of(item)
+        pos = int(np.searchsorted(warmth, item_warmth, side="right"))
+        self._buckets[item.category] = (
+            np.insert(slots, pos, slot),
+            np.insert(warmth, pos, item_warmth),
+            np.insert(colors, pos, self._color_id(item.color))
+        )
+
+    def _remove_slot(self, slot: int):
+        item = self._slots[slot]
+        self._slots[slot] = None
+        if item.id is not None:
+            self._slot_of.pop(item.id, None)
+
+        if item.category not in self._buckets:
+            return
+        slots, warmth, colors = self._buckets[item.category]
+        pos = np.flatnonzero(slots == slot)
+        self._buckets[item.category] = (np.delete(slots, pos), np.delete(warmth, pos), np.delete(colors, pos))
+
+    def _color_id(self, color) -> int:
+        """顏色 id (新顏色時擴充相容矩陣)"""
+        color_id = self._color_ids.get(color)
+        if color_id is not None:
+            return color_id
+
+        color_id = len(self._color_ids)
+        self._color_ids[color] = color_id
+        compat = np.zeros((color_id + 1, color_id + 1), dtype=bool)
+        compat[:color_id, :color_id] = self._compat
+        # 新顏色可以搭配既有的百搭色；新顏色是百搭色時，所有顏色都能搭配它
+        for other, other_id in self._color_ids.items():
+            if other in self._neutral:
+                compat[color_id, other_id] = True
+        compat[color_id, color_id] = True
+        if color in self._neutral:
+            compat[:, color_id] = True
+        self._compat = compat
+        return color_id
+
+    @staticmethod
+    def _warmth_of(item: ClothingItem) -> int:
+        return item.warmth if item.warmth is not None else DEFAULT_WARMTH
+
+    # ========== 查詢 ==========
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(1 for item in self._slots if item is not None)
+
+    def items(self) -> List[ClothingItem]:
+        """所有衣物 (get_wardrobe 的順序)"""
+        with self._lock:
+            order = sorted((rank, slot) for slot, rank in enumerate(self._ranks) if self._slots[slot] is not None)
+            return [self._slots[slot] for _, slot in order]
+
+    def candidates(self, temp: float) -> Dict[str, Tuple[List[ClothingItem], np.ndarray, np.ndarray]]:
+        """
+        依氣溫過濾各類別 (太熱排除保暖度 > 6，太冷排除保暖度 < 3)
+
+        Returns:
+            類別 -> (衣物, 保暖度陣列, 顏色 id 陣列)，依 get_wardrobe 的順序
+        """
+        result = {}
+        with self._lock:
+            ranks = np.asarray(self._ranks)
+            for category, (slots, warmth, colors) in self._buckets.items():
+                lo, hi = 0, slots.size
+                if temp > 28:
+                    hi = int(np.searchsorted(warmth, 6, side="right"))
+                elif temp < 15:
+                    lo = int(np.searchsorted(warmth, 3, side="left"))
+                slots, warmth, colors = slots[lo:hi], warmth[lo:hi], colors[lo:hi]
+                order = np.argsort(ranks[slots], kind="stable")
+                result[category] = ([self._slots[s] for s in slots[order]], warmth[order], colors[order])
+        return result
+
+    def best_match(self, base_colors: np.ndarray, candidate_colors: np.ndarray) -> np.ndarray:
+        """
+        每個基準顏色的最佳搭配 (同 RecommendationEngine._find_best_match):
+        第一個同色或百搭色的候選，沒有則取第一個候選
+
+        Returns:
+            候選索引陣列 (沒有候選時為 -1)
+        """
+        if candidate_colors.size == 0:
+            return np.full(base_colors.size, -1, dtype=np.int32)
+        with self._lock:
+            compat = self._compat
+        matches = compat[base_colors][:, candidate_colors]
+        # 沒有相容候選時 argmax 為 0，正好是第一個候選
+        return matches.argmax(axis=1).astype(np.int32)
@@ -4,18 +4,64 @@
 """
 import base64
 import hashlib
-from typing import List, Tuple, Optional
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 from database.models import ClothingItem
 from database.supabase_client import SupabaseClient
+from database.blob_store import BlobStore, is_valid_hash
+from api.wardrobe_index import WardrobeIndex
 
 class WardrobeService:
-    def __init__(self, supabase_client: SupabaseClient):
+    # 圖片 API 路徑 (存在 image_url 欄位)
+    IMAGE_URL_PREFIX = "/api/image/"
+
+    # 衣櫥列表可選欄位 (預設不含 image_data，圖片改由 /api/image/{hash} 取得)
+    WARDROBE_FIELDS = ("id", "name", "category", "color", "style", "warmth",
+                       "image_hash", "image_url", "image_data", "created_at")
+    DEFAULT_LIST_FIELDS = ("id", "name", "category", "color", "style", "warmth",
+                           "image_hash", "image_url", "created_at")
+    MAX_PAGE_SIZE = 100
+
+    # 批次更新允許的欄位，與每次 in_ 查詢最多帶幾個 id
+    BULK_UPDATE_FIELDS = ("category", "color", "style", "warmth")
+    BULK_CHUNK_SIZE = 200
+
+    def __init__(self, supabase_client: SupabaseClient, blob_store: Optional[BlobStore] = None,
+                 cache_ttl_seconds: float = 300, cache_max_users: int = 256):
+        """
+        Args:
+            supabase_client: Supabase 客戶端
+            blob_store: 圖片本體儲存位置 (None 則沿用 image_data base64 欄位)
+            cache_ttl_seconds: 衣櫥快取存活時間 (其他 worker 的寫入最多延遲這麼久才會看到)
+            cache_max_users: 最多快取幾位使用者的衣櫥 (LRU)
+        """
         self.db = supabase_client
+        self.blob_store = blob_store
+
+        # 每位使用者的衣櫥 metadata 快取: user_id -> (到期時間, 資料列)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_users = cache_max_users
+        self._cache: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        # 每次失效都遞增版本，避免失效前開始的讀取把舊資料寫回快取
+        self._cache_versions: Dict[str, int] = {}
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+        # 每位使用者的推薦用衣櫥索引: user_id -> (到期時間, WardrobeIndex)，寫入時增量更新而非重建
+        self._indexes: "OrderedDict[str, Tuple[float, WardrobeIndex]]" = OrderedDict()
     
     @staticmethod
     def get_image_hash(img_bytes: bytes) -> str:
-        """計算圖片的 SHA256 hash 值"""
+        """
+        計算圖片的 SHA256 hash 值
+
+        image_hash 一律以使用者上傳的原始檔案計算 (正規化前)，與舊資料一致，
+        也不會因正規化設定或 Pillow 版本改變；重複檢查、標籤快取、embedding 與圖片網址都以此為 key
+        """
         return hashlib.sha256(img_bytes).hexdigest()
     
     def check_duplicate_image(self, user_id: str, img_hash: str) -> Tuple[bool, Optional[str]]:
@@ -39,6 +85,25 @@ class WardrobeService:
             print(f"檢查重複失敗: {str(e)}")
             return False, None
     
+    def find_existing_hashes(self, user_id: str, img_hashes: List[str]) -> Dict[str, str]:
+        """
+        一次查詢多張圖片是否已存在 (in_ 篩選 image_hash)
+
+        Returns:
+            {已存在的 image_hash: 衣物名稱}
+        """
+        existing = {}
+        unique_hashes = list(dict.fromkeys(h for h in img_hashes if h))
+        for i in range(0, len(unique_hashes), self.BULK_CHUNK_SIZE):
+            result = self.db.client.table("my_wardrobe")\
+                .select("image_hash, name")\
+                .eq("user_id", user_id)\
+                .in_("image_hash", unique_hashes[i:i + self.BULK_CHUNK_SIZE])\
+                .execute()
+            for row in result.data:
+                existing.setdefault(row["image_hash"], row["name"])
+        return existing
+
     def save_item(self, item: ClothingItem, img_bytes: bytes) -> Tuple[bool, str]:
         """
         儲存衣物到資料庫
@@ -50,35 +115,277 @@ class WardrobeService:
         Returns:
             (是否成功, 結果訊息)
         """
+        return self.save_items([(item, img_bytes)])[0]
+
+    def save_items(self, entries: List[Tuple[ClothingItem, bytes]]) -> List[Tuple[bool, str]]:
+        """
+        批次儲存衣物 (一次 bulk insert)
+        bulk insert 失敗時改為逐筆寫入，讓單筆錯誤不影響其他衣物
+
+        Args:
+            entries: [(衣物資料模型, 圖片 bytes), ...]
+
+        Returns:
+            與 entries 同順序的 [(是否成功, 結果訊息), ...]
+        """
+        results: List[Tuple[bool, str]] = [(False, "")] * len(entries)
+        rows = {}
+        for idx, (item, img_bytes) in enumerate(entries):
+            try:
+                rows[idx] = self._prepare_row(item, img_bytes)
+            except Exception as e:
+                results[idx] = (False, str(e))
+
+        inserted: List[Dict] = []
         try:
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            img_hash = self.get_image_hash(img_bytes)
-            
-            item.image_data = img_base64
-            item.image_hash = img_hash
-            item.created_at = datetime.now()
-            
-            data = item.to_dict()
-            result = self.db.client.table("my_wardrobe").insert(data).execute()
-            
-            return True, "儲存成功"
+            if rows:
+                inserted = self.db.client.table("my_wardrobe").insert(list(rows.values())).execute().data
+                for idx in rows:
+                    results[idx] = (True, "儲存成功")
         except Exception as e:
-            return False, str(e)
+            print(f"批次寫入失敗，改為逐筆寫入: {str(e)}")
+            for idx, row in rows.items():
+                try:
+                    inserted.extend(self.db.client.table("my_wardrobe").insert(row).execute().data)
+                    results[idx] = (True, "儲存成功")
+                except Exception as row_error:
+                    results[idx] = (False, str(row_error))
+        finally:
+            for user_id in {item.user_id for item, _ in entries}:
+                self._update_index(user_id, upserts=[row for row in inserted if str(row.get("user_id")) == str(user_id)])
+                self.invalidate_cache(user_id)
+
+        return results
+
+    def _prepare_row(self, item: ClothingItem, img_bytes: bytes) -> dict:
+        """
+        儲存圖片本體並組出要寫入的資料列
+        item.image_hash 已設定 (原始上傳檔的 hash) 時沿用，否則以 img_bytes 計算
+        """
+        img_hash = item.image_hash or self.get_image_hash(img_bytes)
+
+        if self.blob_store:
+            # 圖片存到 blob store，資料列只保留網址
+            self.blob_store.put(img_hash, img_bytes)
+            item.image_data = None
+        else:
+            item.image_data = base64.b64encode(img_bytes).decode('utf-8')
+        # 兩種模式都由 /api/image/{hash} 提供圖片 (get_image 會退回讀取 image_data)
+        item.image_url = f"{self.IMAGE_URL_PREFIX}{img_hash}"
+        item.image_hash = img_hash
+        item.created_at = datetime.now()
+
+        return item.to_dict()
     
+    def get_image(self, img_hash: str) -> Optional[bytes]:
+        """
+        依 image_hash 取得圖片
+        先查 blob store，尚未遷移的舊資料則從 image_data 欄位解碼
+        """
+        if not is_valid_hash(img_hash):
+            return None
+
+        if self.blob_store:
+            data = self.blob_store.get(img_hash)
+            if data is not None:
+                return data
+
+        try:
+            result = self.db.client.table("my_wardrobe")\
+                .select("image_data")\
+                .eq("image_hash", img_hash)\
+                .not_.is_("image_data", "null")\
+                .limit(1)\
+                .execute()
+            if result.data:
+                return base64.b64decode(result.data[0]["image_data"])
+        except Exception as e:
+            print(f"讀取圖片失敗: {str(e)}")
+        return None
+
     def get_wardrobe(self, user_id: str) -> List[ClothingItem]:
-        """獲取使用者的衣櫥"""
+        """
+        獲取使用者的衣櫥 (只含 metadata，不含 image_data)
+        優先使用快取，寫入操作會讓該使用者的快取失效
+        """
+        rows = self._cache_get(user_id)
+        if rows is not None:
+            return [ClothingItem.from_dict(row) for row in rows]
+
+        version = self._cache_version(user_id)
         try:
             response = self.db.client.table("my_wardrobe")\
-                .select("*")\
+                .select(",".join(self.DEFAULT_LIST_FIELDS))\
                 .eq("user_id", user_id)\
                 .order("created_at", desc=True)\
                 .execute()
             
+            self._cache_put(user_id, response.data, version)
             return [ClothingItem.from_dict(item) for item in response.data]
         except Exception as e:
             print(f"讀取衣櫥失敗: {str(e)}")
             return []
+
+    # ========== 衣櫥快取 ==========
+
+    def _cache_version(self, user_id: str) -> int:
+        with self._cache_lock:
+            return self._cache_versions.get(user_id, 0)
+
+    def _cache_get(self, user_id: str) -> Optional[List[Dict]]:
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry and entry[0] > time.time():
+                self._cache.move_to_end(user_id)
+                self._cache_stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._cache[user_id]
+            self._cache_stats["misses"] += 1
+            return None
+
+    def _cache_put(self, user_id: str, rows: List[Dict], version: int):
+        if self.cache_ttl_seconds <= 0 or self.cache_max_users <= 0:
+            return
+        with self._cache_lock:
+            if self._cache_versions.get(user_id, 0) != version:
+                return  # 讀取期間發生寫入，這份資料可能已過期
+            self._cache[user_id] = (time.time() + self.cache_ttl_seconds, rows)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_max_users:
+                self._cache.popitem(last=False)
+                self._cache_stats["evictions"] += 1
+
+    def invalidate_cache(self, user_id: str):
+        """讓使用者的衣櫥快取失效 (新增/修改/刪除後呼叫)"""
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+            self._cache_versions[user_id] = self._cache_versions.get(user_id, 0) + 1
+            self._cache_stats["invalidations"] += 1
+
+    def get_cache_stats(self) -> Dict:
+        """衣櫥快取統計"""
+        with self._cache_lock:
+            stats = dict(self._cache_stats)
+            stats["users"] = len(self._cache)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats.update({"ttl_seconds": self.cache_ttl_seconds, "max_users": self.cache_max_users})
+        with self._cache_lock:
+            stats["indexes"] = len(self._indexes)
+        return stats
+
+    # ========== 推薦用衣櫥索引 ==========
+
+    def get_wardrobe_index(self, user_id: str) -> WardrobeIndex:
+        """
+        獲取使用者的衣櫥索引 (類別分桶、保暖度排序、顏色相容矩陣)
+        建立一次後快取，本服務的新增/修改/刪除會增量更新；逾時 (其他 worker 的寫入) 才重建
+        """
+        with self._cache_lock:
+            entry = self._indexes.get(user_id)
+            if entry and entry[0] > time.time():
+                self._indexes.move_to_end(user_id)
+                return entry[1]
+            version = self._cache_versions.get(user_id, 0)
+
+        index = WardrobeIndex(self.get_wardrobe(user_id))
+        if self.cache_ttl_seconds <= 0 or self.cache_max_users <= 0:
+            return index
+        with self._cache_lock:
+            if self._cache_versions.get(user_id, 0) == version:
+                self._indexes[user_id] = (time.time() + self.cache_ttl_seconds, index)
+                self._indexes.move_to_end(user_id)
+                while len(self._indexes) > self.cache_max_users:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def _update_index(self, user_id: str, upserts: List[Dict] = (), removed=()):
+        """把寫入結果套用到已建立的索引 (upserts 為資料庫回傳的資料列)"""
+        with self._cache_lock:
+            entry = self._indexes.get(user_id)
+        if not entry:
+            return
+        index = entry[1]
+        for row in upserts:
+            index.upsert(ClothingItem.from_dict({k: row[k] for k in ("user_id",) + self.DEFAULT_LIST_FIELDS if k in row}))
+        for item_id in removed:
+            index.remove(item_id)
+
+    def _drop_index(self, user_id: str):
+        """寫入失敗 (結果不確定) 時捨棄索引，下次重建"""
+        with self._cache_lock:
+            self._indexes.pop(user_id, None)
     
+    def get_wardrobe_page(self, user_id: str, fields: Optional[List[str]] = None,
+                          category: Optional[str] = None, cursor: Optional[str] = None,
+                          limit: int = 50) -> Tuple[List[Dict], Optional[str]]:
+        """
+        分頁讀取衣櫥 (keyset 分頁，依 created_at, id 由新到舊)
+
+        Args:
+            user_id: 使用者 ID
+            fields: 要回傳的欄位 (None 則使用 DEFAULT_LIST_FIELDS)
+            category: 只取此分類
+            cursor: 上一頁回傳的 next_cursor
+            limit: 每頁筆數 (上限 MAX_PAGE_SIZE)
+
+        Returns:
+            (本頁資料, 下一頁 cursor；沒有下一頁則為 None)
+
+        Raises:
+            ValueError: 欄位或 cursor 不合法
+        """
+        fields = list(fields or self.DEFAULT_LIST_FIELDS)
+        unknown = [f for f in fields if f not in self.WARDROBE_FIELDS]
+        if unknown:
+            raise ValueError(f"不支援的欄位: {', '.join(unknown)}")
+        # 分頁需要 id 與 created_at
+        for key in ("id", "created_at"):
+            if key not in fields:
+                fields.append(key)
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+
+        query = self.db.client.table("my_wardrobe")\
+            .select(",".join(fields))\
+            .eq("user_id", user_id)
+        if category:
+            query = query.eq("category", category)
+        if cursor:
+            created_at, last_id = self._decode_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+            )
+
+        # 多取一筆判斷是否還有下一頁
+        rows = query.order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)\
+            .execute().data
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    @staticmethod
+    def _encode_cursor(created_at: str, item_id: int) -> str:
+        raw = json.dumps({"c": created_at, "i": item_id}).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, int]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            created_at, item_id = str(data["c"]), int(data["i"])
+        except Exception:
+            raise ValueError("cursor 格式錯誤")
+        # 避免把任意字串拼進 PostgREST filter
+        if '"' in created_at or "," in created_at or ")" in created_at:
+            raise ValueError("cursor 格式錯誤")
+        return created_at, item_id
+
     def update_item(self, user_id: str, item_id: int, data: dict) -> bool:
         """更新衣物資訊"""
         try:
@@ -88,10 +395,14 @@ class WardrobeService:
                 .eq("id", item_id)\
                 .eq("user_id", user_id)\
                 .execute()
+            self._update_index(user_id, upserts=result.data)
             return len(result.data) > 0
         except Exception as e:
             print(f"資料庫更新失敗: {str(e)}")
+            self._drop_index(user_id)
             return False
+        finally:
+            self.invalidate_cache(user_id)
 
     def delete_item(self, user_id: str, item_id: int) -> bool:
         """刪除單件衣物"""
@@ -101,43 +412,109 @@ class WardrobeService:
                 .eq("id", item_id)\
                 .eq("user_id", user_id)\
                 .execute()
+            self._update_index(user_id, removed=[item_id])
             return True
         except Exception as e:
             print(f"刪除失敗: {str(e)}")
+            self._drop_index(user_id)
             return False
+        finally:
+            self.invalidate_cache(user_id)
     
-    def batch_delete_items(self, user_id: str, item_ids: List[int]) -> Tuple[bool, int, int]:
-        """批次刪除衣物"""
+    def batch_delete_items(self, user_id: str, item_ids: List[int]) -> Tuple[bool, List[Dict]]:
+        """
+        批次刪除衣物 (以 in_ 篩選，一次查詢刪除所有 id)
+
+        Returns:
+            (是否執行成功, [{id, status}])，status 為 deleted / not_found
+        """
         if not item_ids:
-            return False, 0, 0
-            
+            return False, []
+
         try:
-            success_count = 0
-            fail_count = 0
-            
-            for item_id in item_ids:
-                try:
-                    self.db.client.table("my_wardrobe")\
-                        .delete()\
-                        .eq("id", item_id)\
-                        .eq("user_id", user_id)\
-                        .execute()
-                    success_count += 1
-                except:
-                    fail_count += 1
-            
-            return True, success_count, fail_count
+            deleted = set()
+            for chunk in self._chunk_ids(item_ids):
+                result = self.db.client.table("my_wardrobe")\
+                    .delete()\
+                    .in_("id", chunk)\
+                    .eq("user_id", user_id)\
+                    .execute()
+                deleted.update(row["id"] for row in result.data)
+
+            self._update_index(user_id, removed=deleted)
+            return True, self._id_outcomes(item_ids, deleted, "deleted")
         except Exception as e:
             print(f"批次刪除失敗: {str(e)}")
-            return False, 0, 0
+            self._drop_index(user_id)
+            return False, []
+        finally:
+            self.invalidate_cache(user_id)
+
+    def batch_update_items(self, user_id: str, item_ids: List[int], data: dict) -> Tuple[bool, List[Dict]]:
+        """
+        批次更新衣物 (所有 id 套用相同欄位值，一次查詢完成)
+
+        Args:
+            data: 只允許 BULK_UPDATE_FIELDS 中的欄位
+
+        Returns:
+            (是否執行成功, [{id, status}])，status 為 updated / not_found
+
+        Raises:
+            ValueError: 沒有可更新的欄位或欄位不合法
+        """
+        data = {k: v for k, v in data.items() if v is not None}
+        unknown = [k for k in data if k not in self.BULK_UPDATE_FIELDS]
+        if unknown:
+            raise ValueError(f"不支援批次更新的欄位: {', '.join(unknown)}")
+        if not data:
+            raise ValueError("沒有要更新的欄位")
+        if "warmth" in data and not 1 <= int(data["warmth"]) <= 10:
+            raise ValueError("厚度必須介於 1-10")
+        if not item_ids:
+            return False, []
+
+        try:
+            updated_rows = []
+            for chunk in self._chunk_ids(item_ids):
+                result = self.db.client.table("my_wardrobe")\
+                    .update(data)\
+                    .in_("id", chunk)\
+                    .eq("user_id", user_id)\
+                    .execute()
+                updated_rows.extend(result.data)
+
+            self._update_index(user_id, upserts=updated_rows)
+            return True, self._id_outcomes(item_ids, {row["id"] for row in updated_rows}, "updated")
+        except Exception as e:
+            print(f"批次更新失敗: {str(e)}")
+            self._drop_index(user_id)
+            return False, []
+        finally:
+            self.invalidate_cache(user_id)
+
+    def _chunk_ids(self, item_ids: List[int]) -> List[List[int]]:
+        """去除重複 id 並切塊 (避免 in_ 篩選的網址過長)"""
+        unique_ids = list(dict.fromkeys(item_ids))
+        return [unique_ids[i:i + self.BULK_CHUNK_SIZE] for i in range(0, len(unique_ids), self.BULK_CHUNK_SIZE)]
+
+    @staticmethod
+    def _id_outcomes(item_ids: List[int], affected: set, status: str) -> List[Dict]:
+        return [
+            {"id": item_id, "status": status if item_id in affected else "not_found"}
+            for item_id in dict.fromkeys(item_ids)
+        ]
     
     def get_category_statistics(self, user_id: str) -> dict:
-        """獲取衣櫥分類統計"""
-        items = self.get_wardrobe(user_id)
-        
+        """獲取衣櫥分類統計 (只讀取 category 欄位)"""
+        response = self.db.client.table("my_wardrobe")\
+            .select("category")\
+            .eq("user_id", user_id)\
+            .execute()
+
         categories = {}
-        for item in items:
-            cat = item.category or "其他"
+        for row in response.data:
+            cat = row.get("category") or "其他"
             categories[cat] = categories.get(cat, 0) + 1
         
         return categories
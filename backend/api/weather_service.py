@@ -1,22 +1,89 @@
 """
 天氣服務層
 處理天氣資料獲取與快取 - 使用台灣中央氣象署 API
+一次下載全國觀測資料，建立以縣市為索引的快照 (每個縣市預先選好測站並算好體感溫度)
 """
-import requests
-from datetime import datetime, timedelta
-from typing import Optional
+import asyncio
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
 from database.models import WeatherData
-import urllib3
+
+# 中央氣象署開放資料平台 API
+CWA_API_BASE = "https://opendata.cwa.gov.tw/api/v1/rest/datastore"
+DATASET_BUREAU = "O-A0003-001"  # 局屬氣象站
+DATASET_AUTO = "O-A0001-001"    # 自動氣象站
+
+# 需要重試的 HTTP 狀態碼 (流量限制 / 伺服器錯誤)；重試間隔為 0 ~ RETRY_BASE_DELAY * 2^n 的隨機值
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 0.5
+
+# 局屬站少於此數量的縣市，以自動氣象站補充候選
+MIN_BUREAU_CANDIDATES = 3
+
+# 觀測資料每小時整點觀測、約 15 分鐘後發布；尚未發布時每 5 分鐘重試
+CWA_PUBLISH_DELAY = timedelta(minutes=15)
+CWA_RETRY_INTERVAL = timedelta(minutes=5)
+CWA_TIMEZONE = timezone(timedelta(hours=8))
+
+# 全國縣市數 (局屬站涵蓋不足時也要下載自動氣象站)
+COUNTY_COUNT = 22
+
+# 縣市 -> 測站對照的有效時間；期間內只依對照下載選中的自動站，不必每次下載整份自動站資料
+STATION_INDEX_MAX_AGE = timedelta(hours=24)
+
+
+def normalize_county(name: str) -> str:
+    """正規化縣市名稱 (台→臺，去除縣/市)"""
+    return (name or "").strip().replace('台', '臺').replace('縣', '').replace('市', '')
+
 
 class WeatherService:
-    def __init__(self, api_key: str, cache_hours: int = 1):
+    def __init__(self, api_key: str, cache_hours: int = 1, refresh_interval_seconds: int = 1800,
+                 snapshot_path: Optional[str] = None, max_stale_hours: float = 6,
+                 connect_timeout: float = 5.0, read_timeout: float = 10.0, max_retries: int = 3,
+                 verify_tls: bool = True):
+        """
+        Args:
+            api_key: 中央氣象署 API Key
+            cache_hours: 無法判斷觀測時間時的快照有效時間
+            refresh_interval_seconds: 背景更新的最長間隔
+            snapshot_path: 快照存檔路徑 (None 則不存檔)
+            max_stale_hours: 過期快照超過此時數就不先回傳，改為等待更新
+            connect_timeout: 建立連線逾時秒數
+            read_timeout: 讀取回應逾時秒數
+            max_retries: 連線錯誤 / 逾時 / 5xx 的重試次數
+            verify_tls: 是否驗證中央氣象署的 TLS 憑證 (僅在憑證鏈有問題的環境才關閉)
+        """
         self.api_key = api_key
         self.cache_hours = cache_hours
-        self._cache = {}  # {city: (weather_data, timestamp)}
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.snapshot_path = snapshot_path
+        self.max_stale_hours = max_stale_hours
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.verify_tls = verify_tls
+
+        # 全國快照: {"fetched_at", "observed_at", "expires_at", "index_built_at": datetime, "counties": {正規化縣市: 測站資料}}
+        self._snapshot: Optional[Dict] = self._load_snapshot()
+        # single-flight: 同時間只有一個更新 task，其他請求等待同一份結果
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        # 下載失敗後的重試時間 (快照 expires_at 不變，過期資料仍標示為 stale)
+        self._retry_after: Optional[datetime] = None
+        # 共用連線池 (keep-alive)，於 event loop 中延遲建立
+        self._http: Optional[httpx.AsyncClient] = None
     
-    def get_weather(self, city: str) -> Optional[WeatherData]:
+    async def get_weather(self, city: str) -> Optional[WeatherData]:
         """
         獲取天氣資料(含快取機制) - 使用中央氣象署 API
+        快照過期時先回傳舊資料並在背景更新 (stale-while-revalidate)
         
         Args:
             city: 城市名稱 (例如: 臺北市, 高雄市)
@@ -24,186 +91,282 @@ class WeatherService:
         Returns:
             WeatherData 或 None
         """
-        # 檢查快取
-        if city in self._cache:
-            cached_data, cached_time = self._cache[city]
-            if datetime.now() - cached_time < timedelta(hours=self.cache_hours):
-                return cached_data
-        
-        # 獲取新資料
+        snapshot = self._snapshot
+        if not snapshot or (self._age_seconds(snapshot) > self.max_stale_hours * 3600 and self._retry_due()):
+            # 沒有可用的快照 (或太舊)，只能等待下載；失敗時 (及之後的重試間隔內) 仍退回舊快照
+            snapshot = await self.refresh() or snapshot
+        elif not self._is_fresh(snapshot):
+            self._refresh_in_background()
+        if not snapshot:
+            return None
+
+        entry = snapshot["counties"].get(normalize_county(city))
+        if not entry:
+            print(f"找不到城市 {city} 的有效氣象站資料")
+            return None
+
+        return WeatherData(
+            temp=entry["temp"],
+            feels_like=entry["feels_like"],
+            desc=entry["desc"],
+            city=city,
+            update_time=snapshot["fetched_at"],
+            observed_at=snapshot["observed_at"],
+            age_seconds=int(self._age_seconds(snapshot)),
+            stale=not self._is_fresh(snapshot)
+        )
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _is_fresh(self, snapshot: Optional[Dict]) -> bool:
+        return bool(snapshot) and self._now() < snapshot["expires_at"]
+
+    def _retry_due(self) -> bool:
+        """上次下載失敗後是否已過重試間隔"""
+        return self._retry_after is None or self._now() >= self._retry_after
+
+    def _age_seconds(self, snapshot: Dict) -> float:
+        """快照資料的年齡 (以觀測時間計算)"""
+        return max(0.0, (self._now() - snapshot["observed_at"]).total_seconds())
+
+    def _next_expiry(self, observed_at: Optional[datetime]) -> datetime:
+        """
+        依中央氣象署每小時發布的時程計算到期時間:
+        觀測整點 + 1 小時 + 發布延遲；若已過該時間仍是同一筆觀測 (尚未發布)，稍後重試
+        """
+        now = self._now()
+        if observed_at is None:
+            return now + timedelta(hours=self.cache_hours)
+
+        expires_at = observed_at.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1) + CWA_PUBLISH_DELAY
+        if expires_at <= now:
+            return now + CWA_RETRY_INTERVAL
+        return expires_at
+
+    async def refresh(self, force: bool = False) -> Optional[Dict]:
+        """
+        重新下載全國快照 (single-flight)
+        多個請求同時未命中時只會有一次下載，其餘等待同一個 task 後直接使用新快照
+
+        Returns:
+            最新快照，下載失敗時回傳目前的快照 (可能為 None)
+        """
+        if not force and self._is_fresh(self._snapshot):
+            return self._snapshot
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._do_refresh())
+        # shield: 單一請求被取消時不影響共用的更新 task
+        return await asyncio.shield(self._refresh_task)
+
+    async def _do_refresh(self) -> Optional[Dict]:
+        snapshot = await self._build_snapshot()
+        if snapshot:
+            self._snapshot = snapshot
+            self._retry_after = None
+            await asyncio.to_thread(self._save_snapshot, snapshot)
+        else:
+            # 下載失敗: 延後重試，避免每個請求都再打一次 API (不延長 expires_at，舊資料仍回報 stale)
+            self._retry_after = self._now() + CWA_RETRY_INTERVAL
+        return self._snapshot
+
+    def _refresh_in_background(self):
+        """已有更新在進行中、或仍在下載失敗後的重試間隔內就不觸發"""
+        if not self._retry_due():
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._do_refresh())
+
+    # ========== 快照存檔 ==========
+
+    def _load_snapshot(self) -> Optional[Dict]:
+        """啟動時載入上次的快照 (即使已過期也能先提供資料)"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
         try:
-            # 中央氣象署開放資料平台 API (O-A0003-001 局屬氣象站)
-            # 必須使用正確的 API Key (Authorization)
-            url = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0003-001"
-            params = {
-                "Authorization": self.api_key
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            snapshot = {
+                "fetched_at": datetime.fromisoformat(data["fetched_at"]),
+                "observed_at": datetime.fromisoformat(data["observed_at"]),
+                "expires_at": datetime.fromisoformat(data["expires_at"]),
+                "index_built_at": datetime.fromisoformat(data["index_built_at"]) if data.get("index_built_at") else None,
+                "counties": data["counties"]
             }
-            
-            # 使用 verify=False 繞過 SSL 驗證 (避免某些環境下的證書問題)
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.get(url, params=params, timeout=10, verify=False)
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            # 檢查回應格式
-            if not data.get('success'):
-                print(f"天氣 API 回應異常: {data}")
-                return None
-            
-            # 解析資料
-            records = data.get('records', {})
-            stations = records.get('Station', [])
-            
-            # 確保輸入的城市名稱格式正確
-            target_city = city
-            
-            # 輔助函數: 正規化城市名稱
-            def normalize_name(name):
-                return name.replace('台', '臺').replace('縣', '').replace('市', '')
-            
-            target_city_norm = normalize_name(target_city)
-            
-            # 收集該縣市所有候選氣象站
-            candidates = []
-            
-            # 1. 搜尋局屬氣象站 (O-A0003-001)
-            for station in stations:
-                geo_info = station.get('GeoInfo', {})
-                county_name = geo_info.get('CountyName', '')
-                
-                if normalize_name(county_name) == target_city_norm:
-                    weather_element = station.get('WeatherElement', {})
-                    temp = float(weather_element.get('AirTemperature', -99))
-                    
-                    if temp > -90:
-                        altitude = float(geo_info.get('StationAltitude', 9999))
-                        candidates.append({
-                            'station': station,
-                            'altitude': altitude,
-                            'source': 'O-A0003-001'
-                        })
-
-            # 2. 如果候選名單很少(小於3個)，嘗試自動氣象站 (O-A0001-001) 補充資料
-            if len(candidates) < 3:
-                try:
-                    url_auto = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0001-001"
-                    response_auto = requests.get(url_auto, params=params, timeout=10, verify=False)
-                    if response_auto.status_code == 200:
-                        data_auto = response_auto.json()
-                        if data_auto.get('success'):
-                            stations_auto = data_auto.get('records', {}).get('Station', [])
-                            for station in stations_auto:
-                                geo_info = station.get('GeoInfo', {})
-                                county_name = geo_info.get('CountyName', '')
-                                
-                                if normalize_name(county_name) == target_city_norm:
-                                    weather_element = station.get('WeatherElement', {})
-                                    temp = float(weather_element.get('AirTemperature', -99))
-                                    
-                                    if temp > -90:
-                                        altitude = float(geo_info.get('StationAltitude', 9999))
-                                        candidates.append({
-                                            'station': station,
-                                            'altitude': altitude,
-                                            'source': 'O-A0001-001'
-                                        })
-                except Exception as e:
-                    print(f"獲取自動氣象站資料失敗: {str(e)}")
-
-            if not candidates:
-                print(f"找不到城市 {city} 的有效氣象站資料")
-                return None
-            
-            # 3. 排序: 優先選擇海拔最低的氣象站
-            candidates.sort(key=lambda x: x['altitude'])
-            
-            best_match = candidates[0]
-            found_station = best_match['station']
-            valid_weather_element = found_station.get('WeatherElement', {})
-            
-            # 提取溫度和天氣描述
-            temp = float(valid_weather_element.get('AirTemperature', 0))
+            print(f"[Weather] 載入天氣快照 ({len(snapshot['counties'])} 個縣市, 觀測時間 {data['observed_at']})")
+            return snapshot
+        except Exception as e:
+            print(f"天氣快照載入失敗: {str(e)}")
+            return None
+
+    def _save_snapshot(self, snapshot: Dict):
+        if not self.snapshot_path:
+            return
+        try:
+            data = {
+                "fetched_at": snapshot["fetched_at"].isoformat(),
+                "observed_at": snapshot["observed_at"].isoformat(),
+                "expires_at": snapshot["expires_at"].isoformat(),
+                "index_built_at": snapshot["index_built_at"].isoformat() if snapshot.get("index_built_at") else None,
+                "counties": snapshot["counties"]
+            }
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            os.makedirs(directory, exist_ok=True)
+            # 先寫暫存檔再 rename，避免其他 worker 讀到寫一半的檔案
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"天氣快照存檔失敗: {str(e)}")
+
+    # ========== 背景更新 ==========
+
+    def start_background_refresh(self):
+        """啟動背景 task，依快照到期時間更新 (需在 event loop 中呼叫)"""
+        if self._loop_task and not self._loop_task.done():
+            return
+        self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self):
+        """停止背景更新並關閉連線池"""
+        for task in (self._loop_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _refresh_loop(self):
+        while True:
             try:
-                humidity_raw = valid_weather_element.get('RelativeHumidity', -99)
-                humidity = float(humidity_raw)
-            except Exception:
-                humidity = -99.0
-            # 濕度防呆：缺值或異常時給預設 60%
-            if humidity < 0 or humidity > 100:
-                humidity = 60.0
-
-            # 風速（可能不存在）
-            wind_speed = None
-            for key in ["WindSpeed", "WindSpeedObs", "WindSpeed10M"]:
-                if key in valid_weather_element:
-                    try:
-                        wind_speed = float(valid_weather_element.get(key))
-                    except Exception:
-                        wind_speed = None
-                    break
+                await self.refresh()
+            except Exception as e:
+                print(f"天氣背景更新失敗: {str(e)}")
 
-            weather_desc = valid_weather_element.get('Weather', '晴')
-            if weather_desc == '-99':
-                weather_desc = '多雲'
-            
-            # 體感溫度計算（簡版 Heat Index / 風寒）
-            def heat_index_c(t, rh):
-                # NOAA Heat Index 改寫攝氏版本
-                return (
-                    -8.784695 +
-                    1.61139411 * t +
-                    2.338549 * rh -
-                    0.14611605 * t * rh -
-                    0.012308094 * (t ** 2) -
-                    0.016424828 * (rh ** 2) +
-                    0.002211732 * (t ** 2) * rh +
-                    0.00072546 * t * (rh ** 2) -
-                    0.000003582 * (t ** 2) * (rh ** 2)
-                )
-
-            def wind_chill_c(t, wind_ms):
-                # 公式需要 km/h
-                v = wind_ms * 3.6
-                return 13.12 + 0.6215 * t - 11.37 * (v ** 0.16) + 0.3965 * t * (v ** 0.16)
-
-            feels_like = temp
-            if temp >= 27 and humidity >= 40:
-                hi = heat_index_c(temp, humidity)
-                # Heat Index 不應低於實際溫度
-                feels_like = max(temp, hi)
-            elif temp <= 10:
-                if wind_speed and wind_speed > 0:
-                    wc = wind_chill_c(temp, wind_speed)
-                    feels_like = min(temp, wc)  # 風寒不應高於實測
-                else:
-                    feels_like = temp - 2
-            elif 18 <= temp < 27 and humidity >= 60:
-                # 中溫高濕微調：隨濕度線性加成 0.5~2.5 度
-                add = 0.5 + (min(humidity, 90) - 60) / 30 * 2.0
-                feels_like = temp + add
-            elif 10 < temp < 18 and wind_speed and wind_speed > 2:
-                # 輕度風寒：風速>2 m/s 時扣 1~2 度
-                feels_like = temp - min(2.0, 0.5 + (wind_speed / 5))
-            elif temp > 26 and humidity > 60:
-                # 保留原本輕量加成邏輯（高濕但未達 27 度，且未觸發上方中溫段）
-                feels_like = temp + ((humidity - 60) / 100) * 3
-            
-            weather_data = WeatherData(
-                temp=temp,
-                feels_like=round(feels_like, 1),
-                desc=weather_desc,
-                city=city,
-                update_time=datetime.now()
+            # 睡到快照到期或下載失敗後的重試時間 (最多 refresh_interval_seconds)
+            wait = self.refresh_interval_seconds
+            next_at = self._retry_after or (self._snapshot["expires_at"] if self._snapshot else None)
+            if next_at:
+                wait = min(wait, max((next_at - self._now()).total_seconds(), 30))
+            await asyncio.sleep(wait)
+
+    # ========== 快照建立 ==========
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=CWA_API_BASE,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=60),
+                verify=self.verify_tls
             )
-            
-            self._cache[city] = (weather_data, datetime.now())
-            return weather_data
-            
-        except requests.exceptions.Timeout:
-            print(f"天氣 API 請求超時: {city}")
+        return self._http
+
+    async def _fetch_stations(self, dataset: str, station_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        下載單一資料集的測站 (連線錯誤、逾時與 5xx 以指數退避 + jitter 重試)
+
+        Args:
+            station_ids: 只下載這些測站 (None 則下載全部)
+        """
+        params = {"Authorization": self.api_key}
+        if station_ids:
+            params["StationId"] = ",".join(station_ids)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client().get(f"/{dataset}", params=params)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                # 含 ConnectTimeout / ReadTimeout / ConnectError
+                error = f"{type(e).__name__}: {e}"
+                response = None
+
+            if attempt == self.max_retries:
+                raise RuntimeError(f"天氣 API {dataset} 重試 {self.max_retries} 次仍失敗 ({error})")
+            delay = random.uniform(0, RETRY_BASE_DELAY * (2 ** attempt))
+            print(f"[Weather] ⚠️ {dataset} 請求失敗 ({error})，{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+        response.raise_for_status()
+        data = response.json()
+
+        # 檢查回應格式
+        if not data.get('success'):
+            raise ValueError(f"天氣 API 回應異常: {data}")
+        return data.get('records', {}).get('Station', [])
+
+    @staticmethod
+    def _has_valid_temp(station: Dict) -> bool:
+        """測站有有效氣溫 (缺值為 -99)"""
+        try:
+            return float(station.get('WeatherElement', {}).get('AirTemperature', -99)) > -90
+        except (TypeError, ValueError):
+            return False
+
+    @classmethod
+    def _collect_candidates(cls, stations: List[Dict], source: str, candidates: Dict[str, List[Dict]]):
+        """依縣市收集有效測站"""
+        for station in stations:
+            geo_info = station.get('GeoInfo', {})
+            county = normalize_county(geo_info.get('CountyName', ''))
+            if not county:
+                continue
+            try:
+                altitude = float(geo_info.get('StationAltitude', 9999))
+            except (TypeError, ValueError):
+                continue
+            if cls._has_valid_temp(station):
+                candidates.setdefault(county, []).append({
+                    'station': station,
+                    'altitude': altitude,
+                    'source': source
+                })
+
+    async def _build_snapshot(self) -> Optional[Dict]:
+        """
+        下載全國觀測資料並為每個縣市預先選出測站、計算體感溫度
+        選站結果 (縣市 -> 測站) 保存在快照中，STATION_INDEX_MAX_AGE 內沿用，只下載選中的自動站
+        """
+        try:
+            # 1. 局屬氣象站 (O-A0003-001)，資料量小，每次都下載
+            bureau_stations = await self._fetch_stations(DATASET_BUREAU)
+
+            previous = self._snapshot
+            counties = None
+            index_built_at = previous.get("index_built_at") if previous else None
+            if index_built_at and self._now() - index_built_at < STATION_INDEX_MAX_AGE:
+                counties = await self._refresh_indexed_stations(previous["counties"], bureau_stations)
+            if counties is None:
+                counties, complete = await self._select_stations(bureau_stations)
+                # 自動站下載失敗時不保留選站結果，下次更新再重新選站
+                index_built_at = self._now() if complete else None
+
+            if not counties:
+                print("天氣快照沒有任何有效測站資料")
+                return None
+
+            # 以最新的觀測時間作為這份快照的時間
+            obs_times = [t for t in (self._parse_time(e["obs_time"]) for e in counties.values()) if t]
+            now = self._now()
+            observed_at = max(obs_times) if obs_times else None
+
+            print(f"[Weather] 🌤️ 已更新全國天氣快照 ({len(counties)} 個縣市)")
+            return {
+                "fetched_at": now,
+                "observed_at": observed_at or now,
+                "expires_at": self._next_expiry(observed_at),
+                "index_built_at": index_built_at,
+                "counties": counties
+            }
+
+        except httpx.TimeoutException:
+            print("天氣 API 請求超時")
             return None
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, RuntimeError) as e:
             print(f"天氣 API 請求失敗: {str(e)}")
             return None
         except (KeyError, ValueError, IndexError) as e:
@@ -212,7 +375,166 @@ class WeatherService:
         except Exception as e:
             print(f"天氣資料處理失敗: {str(e)}")
             return None
+
+    async def _select_stations(self, bureau_stations: List[Dict]) -> Tuple[Dict[str, Dict], bool]:
+        """
+        重新選站: 局屬站候選太少 (或沒有局屬站) 的縣市下載整份自動氣象站資料補充
+
+        Returns:
+            (各縣市的測站資料, 是否完整 (需要的自動站資料有成功下載))
+        """
+        complete = True
+        candidates: Dict[str, List[Dict]] = {}
+        self._collect_candidates(bureau_stations, DATASET_BUREAU, candidates)
+
+        # 候選太少 (或完全沒有局屬站) 的縣市以自動氣象站 (O-A0001-001) 補充，整份資料只下載一次
+        sparse = {county for county, items in candidates.items() if len(items) < MIN_BUREAU_CANDIDATES}
+        if sparse or len(candidates) < COUNTY_COUNT:
+            try:
+                auto_candidates: Dict[str, List[Dict]] = {}
+                self._collect_candidates(await self._fetch_stations(DATASET_AUTO), DATASET_AUTO, auto_candidates)
+                for county, items in auto_candidates.items():
+                    if county in sparse or county not in candidates:
+                        candidates.setdefault(county, []).extend(items)
+            except Exception as e:
+                complete = False
+                print(f"獲取自動氣象站資料失敗: {str(e)}")
+
+        counties = {}
+        for county, items in candidates.items():
+            # 排序: 優先選擇海拔最低的氣象站
+            best = min(items, key=lambda x: x['altitude'])
+            counties[county] = self._station_to_entry(best['station'], best['source'])
+        return counties, complete
+
+    async def _refresh_indexed_stations(self, previous_counties: Dict[str, Dict],
+                                        bureau_stations: List[Dict]) -> Optional[Dict[str, Dict]]:
+        """
+        沿用上次選出的測站，只更新其觀測值 (自動站只下載選中的那幾站)
+
+        Returns:
+            各縣市的測站資料；有測站停報或快照沒有測站代碼時回傳 None (需重新選站)
+        """
+        if any(not entry.get("station_id") for entry in previous_counties.values()):
+            return None
+
+        by_source = {DATASET_BUREAU: {s.get('StationId'): s for s in bureau_stations}}
+        auto_ids = sorted({e["station_id"] for e in previous_counties.values() if e.get("source") == DATASET_AUTO})
+        if auto_ids:
+            try:
+                auto_stations = await self._fetch_stations(DATASET_AUTO, station_ids=auto_ids)
+            except Exception as e:
+                print(f"獲取自動氣象站資料失敗: {str(e)}")
+                return None
+            by_source[DATASET_AUTO] = {s.get('StationId'): s for s in auto_stations}
+
+        counties = {}
+        for county, entry in previous_counties.items():
+            station = by_source.get(entry.get("source"), {}).get(entry["station_id"])
+            if not station or not self._has_valid_temp(station):
+                print(f"[Weather] {county} 測站 {entry.get('station')} 無有效資料，重新選站")
+                return None
+            counties[county] = self._station_to_entry(station, entry["source"])
+        return counties
+
+    @staticmethod
+    def _parse_time(value: Optional[str]) -> Optional[datetime]:
+        """解析 ObsTime (ISO 8601，含時區)"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=CWA_TIMEZONE)
+
+    @classmethod
+    def _station_to_entry(cls, station: Dict, source: str) -> Dict:
+        """從測站資料取出溫度、天氣描述並計算體感溫度"""
+        valid_weather_element = station.get('WeatherElement', {})
+
+        # 提取溫度和天氣描述
+        temp = float(valid_weather_element.get('AirTemperature', 0))
+        try:
+            humidity_raw = valid_weather_element.get('RelativeHumidity', -99)
+            humidity = float(humidity_raw)
+        except Exception:
+            humidity = -99.0
+        # 濕度防呆：缺值或異常時給預設 60%
+        if humidity < 0 or humidity > 100:
+            humidity = 60.0
+
+        # 風速（可能不存在）
+        wind_speed = None
+        for key in ["WindSpeed", "WindSpeedObs", "WindSpeed10M"]:
+            if key in valid_weather_element:
+                try:
+                    wind_speed = float(valid_weather_element.get(key))
+                except Exception:
+                    wind_speed = None
+                break
+
+        weather_desc = valid_weather_element.get('Weather', '晴')
+        if weather_desc == '-99':
+            weather_desc = '多雲'
+
+        return {
+            "temp": temp,
+            "feels_like": round(cls._feels_like(temp, humidity, wind_speed), 1),
+            "desc": weather_desc,
+            "station": station.get('StationName', ''),
+            "station_id": station.get('StationId'),
+            "source": source,
+            "obs_time": station.get('ObsTime', {}).get('DateTime')
+        }
+
+    @staticmethod
+    def _feels_like(temp: float, humidity: float, wind_speed: Optional[float]) -> float:
+        """體感溫度計算（簡版 Heat Index / 風寒）"""
+        def heat_index_c(t, rh):
+            # NOAA Heat Index 改寫攝氏版本
+            return (
+                -8.784695 +
+                1.61139411 * t +
+                2.338549 * rh -
+                0.14611605 * t * rh -
+                0.012308094 * (t ** 2) -
+                0.016424828 * (rh ** 2) +
+                0.002211732 * (t ** 2) * rh +
+                0.00072546 * t * (rh ** 2) -
+                0.000003582 * (t ** 2) * (rh ** 2)
+            )
+
+        def wind_chill_c(t, wind_ms):
+            # 公式需要 km/h
+            v = wind_ms * 3.6
+            return 13.12 + 0.6215 * t - 11.37 * (v ** 0.16) + 0.3965 * t * (v ** 0.16)
+
+        feels_like = temp
+        if temp >= 27 and humidity >= 40:
+            hi = heat_index_c(temp, humidity)
+            # Heat Index 不應低於實際溫度
+            feels_like = max(temp, hi)
+        elif temp <= 10:
+            if wind_speed and wind_speed > 0:
+                wc = wind_chill_c(temp, wind_speed)
+                feels_like = min(temp, wc)  # 風寒不應高於實測
+            else:
+                feels_like = temp - 2
+        elif 18 <= temp < 27 and humidity >= 60:
+            # 中溫高濕微調：隨濕度線性加成 0.5~2.5 度
+            add = 0.5 + (min(humidity, 90) - 60) / 30 * 2.0
+            feels_like = temp + add
+        elif 10 < temp < 18 and wind_speed and wind_speed > 2:
+            # 輕度風寒：風速>2 m/s 時扣 1~2 度
+            feels_like = temp - min(2.0, 0.5 + (wind_speed / 5))
+        elif temp > 26 and humidity > 60:
+            # 保留原本輕量加成邏輯（高濕但未達 27 度，且未觸發上方中溫段）
+            feels_like = temp + ((humidity - 60) / 100) * 3
+        return feels_like
     
     def clear_cache(self):
-        """清除快取"""
-        self._cache.clear()
+        """清除快取 (含存檔)"""
+        self._snapshot = None
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
@@ -3,6 +3,7 @@
 統一管理所有配置，支援環境變數和 Streamlit Secrets
 """
 import os
+import tempfile
 from dataclasses import dataclass
 from typing import Optional
 
@@ -17,6 +18,38 @@ class AppConfig:
     api_rate_limit_seconds: int = 15
     max_batch_upload: int = 10
     weather_cache_hours: int = 1
+    weather_refresh_seconds: int = 1800
+    weather_snapshot_path: str = os.path.join(tempfile.gettempdir(), "fashion_agent_weather.json")
+    weather_max_stale_hours: float = 6
+    weather_connect_timeout: float = 5.0
+    weather_read_timeout: float = 10.0
+    weather_max_retries: int = 3
+    # 某些環境下中央氣象署的憑證鏈無法驗證時，可設 CWA_VERIFY_TLS=0 關閉
+    weather_verify_tls: bool = True
+    upload_worker_count: int = 2
+    max_pending_upload_jobs: int = 20
+    upload_job_ttl_seconds: int = 3600
+    rate_limit_db_path: str = os.path.join(tempfile.gettempdir(), "fashion_agent_rate_limit.sqlite3")
+    tag_cache_path: str = os.path.join(tempfile.gettempdir(), "fashion_agent_tag_cache.sqlite3")
+    tag_cache_max_entries: int = 5000
+    model_a_warmup: bool = False
+    # 子批次最少張數 (並行數為 1 時不切子批次)
+    tag_batch_size: int = 4
+    # 同時辨識的子批次數；只有在 Gemini 突發量 (GEMINI_T1_BURST) 大於 1 時調高才有效，實際值以 burst 為上限
+    tag_max_concurrency: int = 1
+    image_max_edge: int = 1280
+    image_format: str = "JPEG"
+    image_quality: int = 85
+    blob_store_backend: str = "database"
+    blob_store_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "images")
+    blob_store_bucket: str = "wardrobe-images"
+    wardrobe_cache_ttl_seconds: int = 300
+    wardrobe_cache_max_users: int = 256
+    db_max_concurrency: int = 8
+    db_timeout_seconds: float = 10.0
+    embedding_store_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embeddings")
+    embed_on_upload: bool = False
+    embedding_weight: int = 0
     
     @classmethod
     def from_env(cls) -> 'AppConfig':
@@ -26,7 +59,34 @@ class AppConfig:
             weather_api_key=os.getenv("CWA_API_KEY", "") or os.getenv("WEATHER_KEY", ""),  # 優先使用 CWA Key，相容舊設定
             supabase_url=os.getenv("SUPABASE_URL", ""),
             supabase_key=os.getenv("SUPABASE_KEY", ""),
-            default_city=os.getenv("DEFAULT_CITY", "臺北市")  # 改用中文城市名稱
+            default_city=os.getenv("DEFAULT_CITY", "臺北市"),  # 改用中文城市名稱
+            upload_worker_count=int(os.getenv("UPLOAD_WORKERS", "2")),
+            rate_limit_db_path=os.getenv("RATE_LIMIT_DB_PATH", cls.rate_limit_db_path),
+            tag_cache_path=os.getenv("TAG_CACHE_PATH", cls.tag_cache_path),
+            tag_cache_max_entries=int(os.getenv("TAG_CACHE_MAX_ENTRIES", "5000")),
+            model_a_warmup=os.getenv("MODEL_A_WARMUP", "0").lower() in ("1", "true", "yes"),
+            tag_batch_size=int(os.getenv("TAG_BATCH_SIZE", "4")),
+            tag_max_concurrency=int(os.getenv("TAG_MAX_CONCURRENCY", "1")),
+            image_max_edge=int(os.getenv("IMAGE_MAX_EDGE", "1280")),
+            image_format=os.getenv("IMAGE_FORMAT", "JPEG"),
+            image_quality=int(os.getenv("IMAGE_QUALITY", "85")),
+            blob_store_backend=os.getenv("BLOB_STORE", "database"),
+            blob_store_path=os.getenv("BLOB_STORE_PATH", cls.blob_store_path),
+            blob_store_bucket=os.getenv("BLOB_STORE_BUCKET", "wardrobe-images"),
+            wardrobe_cache_ttl_seconds=int(os.getenv("WARDROBE_CACHE_TTL", "300")),
+            wardrobe_cache_max_users=int(os.getenv("WARDROBE_CACHE_MAX_USERS", "256")),
+            db_max_concurrency=int(os.getenv("DB_MAX_CONCURRENCY", "8")),
+            db_timeout_seconds=float(os.getenv("DB_TIMEOUT_SECONDS", "10")),
+            weather_refresh_seconds=int(os.getenv("WEATHER_REFRESH_SECONDS", "1800")),
+            weather_snapshot_path=os.getenv("WEATHER_SNAPSHOT_PATH", cls.weather_snapshot_path),
+            weather_max_stale_hours=float(os.getenv("WEATHER_MAX_STALE_HOURS", "6")),
+            weather_connect_timeout=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "5")),
+            weather_read_timeout=float(os.getenv("WEATHER_READ_TIMEOUT", "10")),
+            weather_max_retries=int(os.getenv("WEATHER_MAX_RETRIES", "3")),
+            weather_verify_tls=os.getenv("CWA_VERIFY_TLS", "1").lower() not in ("0", "false", "no"),
+            embedding_store_path=os.getenv("EMBEDDING_STORE_PATH", cls.embedding_store_path),
+            embed_on_upload=os.getenv("EMBED_ON_UPLOAD", "0").lower() in ("1", "true", "yes"),
+            embedding_weight=int(os.getenv("EMBEDDING_WEIGHT", "0"))
         )
     
     def is_valid(self) -> bool:
@@ -38,6 +98,25 @@ class AppConfig:
             self.supabase_key
         ])
 
+# Gemini 各模型速率限制 - 所有 worker 共用 (rpm: 每分鐘請求數, burst: 可累積的突發量)
+# 預設 4 rpm 等同原本每 15 秒一次的間隔
+GEMINI_RATE_LIMITS = {
+    "gemini-2.5-flash": {
+        "rpm": float(os.getenv("GEMINI_T1_RPM", "4")),
+        "burst": float(os.getenv("GEMINI_T1_BURST", "1"))
+    },
+    "gemini-3-flash-preview": {
+        "rpm": float(os.getenv("GEMINI_T2_RPM", "4")),
+        "burst": float(os.getenv("GEMINI_T2_BURST", "1"))
+    }
+}
+
+# Gemini 各模型熔斷設定 - 連續失敗 failure_threshold 次後跳過該模型 cooldown_seconds 秒，之後以單一請求試探
+GEMINI_CIRCUIT_BREAKER = {
+    "failure_threshold": int(os.getenv("GEMINI_BREAKER_THRESHOLD", "2")),
+    "cooldown_seconds": float(os.getenv("GEMINI_BREAKER_COOLDOWN", "120"))
+}
+
 # 台灣城市資料 - 使用中央氣象署格式
 TAIWAN_CITIES = {
     "臺北市": "臺北市",
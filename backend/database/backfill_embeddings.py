@@ -0,0 +1,97 @@
+"""
+Embedding 回填工具
+為尚未有 Model A embedding 的既有衣物計算向量並寫入 EmbeddingStore
+(上傳時只在 EMBED_ON_UPLOAD 開啟後才會計算，舊資料需要用這個工具補上)
+
+用法 (於專案根目錄，使用與服務相同的環境變數；EMBEDDING_STORE_PATH 需指向服務實際使用的目錄):
+    python backend/database/backfill_embeddings.py              # 執行回填
+    python backend/database/backfill_embeddings.py --dry-run    # 只統計，不計算
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import AppConfig
+from database.supabase_client import SupabaseClient
+from database.blob_store import create_blob_store, is_valid_hash
+from database.embedding_store import EmbeddingStore
+from api.ai_service import AIService
+from api.wardrobe_service import WardrobeService
+
+
+def backfill(wardrobe_service: WardrobeService, ai_service: AIService,
+             batch_size: int = 32, dry_run: bool = False) -> dict:
+    """
+    依 id 順序分批讀取 my_wardrobe，為缺少 embedding 的 image_hash 計算向量
+
+    Returns:
+        dict: {scanned, missing, stored, failed}
+    """
+    client = wardrobe_service.db.client
+    stats = {"scanned": 0, "missing": 0, "stored": 0, "failed": 0}
+    last_id = 0
+
+    while True:
+        rows = client.table("my_wardrobe")\
+            .select("id, image_hash")\
+            .gt("id", last_id)\
+            .order("id")\
+            .limit(batch_size)\
+            .execute().data
+        if not rows:
+            break
+
+        last_id = rows[-1]["id"]
+        stats["scanned"] += len(rows)
+        # 同一張圖片可能被多位使用者上傳，以 image_hash 去重
+        hashes = list(dict.fromkeys(row["image_hash"] for row in rows if is_valid_hash(row.get("image_hash"))))
+        missing = ai_service.embedding_store.missing(hashes)
+        stats["missing"] += len(missing)
+
+        if missing and not dry_run:
+            images, image_hashes = [], []
+            for img_hash in missing:
+                img_bytes = wardrobe_service.get_image(img_hash)
+                if img_bytes is None:
+                    stats["failed"] += 1
+                    print(f"[ERROR] image_hash={img_hash} 找不到圖片")
+                    continue
+                images.append(img_bytes)
+                image_hashes.append(img_hash)
+
+            try:
+                stats["stored"] += ai_service.store_embeddings(images, image_hashes)
+            except Exception as e:
+                stats["failed"] += len(images)
+                print(f"[ERROR] id<={last_id} 的批次計算失敗: {e}")
+
+        print(f"[BACKFILL] 已處理 {stats['scanned']} 筆 (缺少 {stats['missing']}, 寫入 {stats['stored']}, 失敗 {stats['failed']})")
+
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="為既有衣物回填 Model A embedding")
+    parser.add_argument("--batch-size", type=int, default=32, help="每批讀取的資料列數 (也是每次 Model A 推論的上限)")
+    parser.add_argument("--dry-run", action="store_true", help="只統計缺少的筆數，不計算")
+    args = parser.parse_args(argv)
+
+    config = AppConfig.from_env()
+    supabase_client = SupabaseClient(config.supabase_url, config.supabase_key)
+    blob_store = create_blob_store(
+        config.blob_store_backend, supabase_client, config.blob_store_path, config.blob_store_bucket
+    )
+    wardrobe_service = WardrobeService(supabase_client, blob_store=blob_store)
+    ai_service = AIService(config.gemini_api_key, embedding_store=EmbeddingStore(config.embedding_store_path))
+
+    stats = backfill(wardrobe_service, ai_service, batch_size=args.batch_size, dry_run=args.dry_run)
+    mode = "(dry-run) " if args.dry_run else ""
+    print(f"✅ {mode}完成: 掃描 {stats['scanned']} 筆, 缺少 {stats['missing']} 筆, "
+          f"寫入 {stats['stored']} 筆, 失敗 {stats['failed']} 筆")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+圖片 Blob 儲存 - Content-addressed Blob Store
+以圖片 SHA256 (image_hash) 為 key 儲存圖片本體，資料表只保留 image_url
+image_hash 是原始上傳檔的 hash，存入的內容為正規化後的圖片；同一個 key 的內容不會再改變
+"""
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+from database.supabase_client import SupabaseClient
+
+# image_hash 格式 (SHA256 hex)
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_hash(img_hash: str) -> bool:
+    return bool(img_hash and HASH_PATTERN.match(img_hash))
+
+
+def guess_mime_type(data: bytes) -> str:
+    """依檔頭判斷圖片格式"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class BlobStore(ABC):
+    """Blob 儲存介面 (以 image_hash 為 key，內容不可變)"""
+
+    @abstractmethod
+    def put(self, img_hash: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, img_hash: str) -> Optional[bytes]:
+        ...
+
+    def exists(self, img_hash: str) -> bool:
+        return self.get(img_hash) is not None
+
+    @abstractmethod
+    def delete(self, img_hash: str) -> None:
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """本機檔案系統 (root/ab/abcdef...)"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, img_hash: str) -> str:
+        if not is_valid_hash(img_hash):
+            raise ValueError(f"無效的 image_hash: {img_hash}")
+        return os.path.join(self.root, img_hash[:2], img_hash)
+
+    def put(self, img_hash: str, data: bytes) -> None:
+        path = self._path(img_hash)
+        if os.path.exists(path):
+            return  # 內容定址: 同 hash 即同內容
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先寫暫存檔再 rename，避免讀到寫一半的檔案
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, img_hash: str) -> Optional[bytes]:
+        try:
+            with open(self._path(img_hash), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def exists(self, img_hash: str) -> bool:
+        try:
+            return os.path.exists(self._path(img_hash))
+        except ValueError:
+            return False
+
+    def delete(self, img_hash: str) -> None:
+        try:
+            os.remove(self._path(img_hash))
+        except (FileNotFoundError, ValueError):
+            pass
+
+
+class SupabaseBlobStore(BlobStore):
+    """Supabase Storage bucket"""
+
+    def __init__(self, supabase_client: SupabaseClient, bucket: str):
+        self.db = supabase_client
+        self.bucket = bucket
+
+    @staticmethod
+    def _path(img_hash: str) -> str:
+        if not is_valid_hash(img_hash):
+            raise ValueError(f"無效的 image_hash: {img_hash}")
+        return f"{img_hash[:2]}/{img_hash}"
+
+    def _storage(self):
+        return self.db.client.storage.from_(self.bucket)
+
+    def put(self, img_hash: str, data: bytes) -> None:
+        self._storage().upload(
+            self._path(img_hash), data,
+            {"content-type": guess_mime_type(data), "cache-control": "31536000", "upsert": "true"}
+        )
+
+    def get(self, img_hash: str) -> Optional[bytes]:
+        try:
+            return self._storage().download(self._path(img_hash))
+        except Exception:
+            return None
+
+    def delete(self, img_hash: str) -> None:
+        self._storage().remove([self._path(img_hash)])
+
+
+def create_blob_store(backend: str, supabase_client: SupabaseClient, local_path: str, bucket: str) -> Optional[BlobStore]:
+    """
+    依設定建立 Blob Store
+
+    預設 'database' 不使用 Blob Store，圖片仍寫入 my_wardrobe.image_data；
+    'local' 只適用於有持久磁碟的部署 (Render 等平台每次部署都會清空本機檔案)
+
+    Args:
+        backend: 'database'、'local' 或 'supabase'
+        supabase_client: Supabase 客戶端 (supabase 模式使用)
+        local_path: 本機儲存目錄 (local 模式使用)
+        bucket: Storage bucket 名稱 (supabase 模式使用)
+
+    Returns:
+        BlobStore；'database' 模式回傳 None
+    """
+    if backend == "supabase":
+        print(f"[INFO] 圖片儲存: Supabase Storage bucket '{bucket}'")
+        return SupabaseBlobStore(supabase_client, bucket)
+
+    if backend == "local":
+        print(f"[INFO] 圖片儲存: 本機目錄 {local_path} (需為持久磁碟)")
+        return LocalBlobStore(local_path)
+
+    if backend != "database":
+        print(f"[WARN] 不支援的圖片儲存方式 {backend}，改為存入資料庫 image_data 欄位")
+    print("[INFO] 圖片儲存: 資料庫 image_data 欄位")
+    return None
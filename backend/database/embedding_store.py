@@ -0,0 +1,241 @@
+"""
+Embedding 儲存 - 以 image_hash 為 key 的 Model A 向量
+向量 (L2 正規化後的 float32) 逐列存於 memory-mapped 檔案，image_hash -> 列號對照存於 SQLite，
+多個 worker 共用同一份檔案；查詢時直接從 mmap 取列，不必整份載入記憶體
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+class EmbeddingStore:
+    """Model A embedding 儲存 (image_hash -> dim 維 float32 向量)"""
+
+    def __init__(self, path: str, dim: int = 512, grow_rows: int = 1024):
+        """
+        Args:
+            path: 儲存目錄 (向量檔與 SQLite 對照表)
+            dim: 向量維度 (Model A 為 512)
+            grow_rows: 向量檔容量不足時，每次至少擴充的列數
+        """
+        self.path = path
+        self.dim = dim
+        self.grow_rows = max(1, grow_rows)
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, f"embeddings_{dim}.f32")
+        self.db_path = os.path.join(path, "embeddings.sqlite3")
+
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        # 本行程寫入新向量時遞增，查詢端據此判斷快取的矩陣是否過期
+        self.version = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+        self._mean: Optional[Tuple[Tuple[int, int], np.ndarray]] = None
+
+        self._init_db()
+        self._load_rows()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    image_hash TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL UNIQUE
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load_rows(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT image_hash, row FROM embeddings").fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._rows.update(rows)
+
+    # ========== 向量檔 ==========
+
+    def _capacity(self) -> int:
+        try:
+            return os.path.getsize(self.vectors_path) // (self.dim * 4)
+        except FileNotFoundError:
+            return 0
+
+    def _ensure_capacity(self, rows: int):
+        """向量檔至少容納 rows 列 (不足時以 truncate 擴充，呼叫端需持有寫入鎖)"""
+        capacity = self._capacity()
+        if capacity >= rows:
+            return
+        new_capacity = max(rows, capacity * 2, self.grow_rows)
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._mmap = None
+
+    def _matrix(self, max_row: int) -> Optional[np.memmap]:
+        """目前的 mmap (其他 worker 擴充過檔案時重新映射)"""
+        if self._mmap is None or self._mmap.shape[0] <= max_row:
+            capacity = self._capacity()
+            if capacity <= max_row:
+                return None
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return self._mmap
+
+    # ========== 讀寫 ==========
+
+    def put_many(self, entries: Dict[str, Iterable[float]]) -> int:
+        """
+        批次寫入向量 (已存在的 hash 略過)
+
+        Returns:
+            實際寫入的筆數
+        """
+        vectors = {}
+        for img_hash, vector in entries.items():
+            if vector is None or img_hash in self._rows:
+                continue
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            norm = float(np.linalg.norm(vector))
+            if vector.size != self.dim or not np.isfinite(norm) or norm == 0:
+                print(f"[Embedding] ⚠️ 略過無效向量 {img_hash[:12]} (維度 {vector.size})")
+                continue
+            vectors[img_hash] = vector / norm
+        if not vectors:
+            return 0
+
+        with self._lock:
+            conn = self._connect()
+            conn.isolation_level = None
+            try:
+                # BEGIN IMMEDIATE: 跨 worker 序列化列號配置，先寫向量再 commit 對照表，
+                # 其他 worker 看得到對照就讀得到向量
+                conn.execute("BEGIN IMMEDIATE")
+                placeholders = ",".join("?" * len(vectors))
+                existing = dict(conn.execute(
+                    f"SELECT image_hash, row FROM embeddings WHERE image_hash IN ({placeholders})",
+                    list(vectors.keys())
+                ).fetchall())
+                self._rows.update(existing)
+                new_hashes = [h for h in vectors if h not in existing]
+                if not new_hashes:
+                    conn.execute("COMMIT")
+                    return 0
+
+                next_row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings").fetchone()[0]
+                rows = list(range(next_row, next_row + len(new_hashes)))
+                self._ensure_capacity(rows[-1] + 1)
+                matrix = self._matrix(rows[-1])
+                matrix[rows] = np.stack([vectors[h] for h in new_hashes])
+                matrix.flush()
+
+                conn.executemany("INSERT INTO embeddings (image_hash, row) VALUES (?, ?)", zip(new_hashes, rows))
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+            self._rows.update(zip(new_hashes, rows))
+            self._stats["writes"] += len(new_hashes)
+            self.version += 1
+
+        print(f"[Embedding] 💾 寫入 {len(new_hashes)} 筆向量")
+        return len(new_hashes)
+
+    def _lookup_rows(self, hashes: List[str]) -> List[Optional[int]]:
+        """hash -> 列號 (本行程沒有的再查 SQLite，涵蓋其他 worker 寫入的向量)"""
+        missing = list({h for h in hashes if h and h not in self._rows})
+        if missing:
+            conn = self._connect()
+            try:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    found = conn.execute(
+                        f"SELECT image_hash, row FROM embeddings WHERE image_hash IN ({placeholders})", chunk
+                    ).fetchall()
+                    with self._lock:
+                        self._rows.update(found)
+            finally:
+                conn.close()
+        return [self._rows.get(h) if h else None for h in hashes]
+
+    def get_many(self, hashes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批次讀取向量
+
+        Returns:
+            (matrix, found): matrix 為 [N, dim] float32 (找不到的列為 0)，found 為 bool 陣列
+        """
+        rows = self._lookup_rows(hashes)
+        found = np.array([row is not None for row in rows], dtype=bool)
+        matrix = np.zeros((len(hashes), self.dim), dtype=np.float32)
+        if found.any():
+            row_ids = np.array([row for row in rows if row is not None], dtype=np.int64)
+            with self._lock:
+                mm = self._matrix(int(row_ids.max()))
+                if mm is None:
+                    found[:] = False
+                else:
+                    matrix[found] = mm[row_ids]
+        with self._lock:
+            hits = int(found.sum())
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(hashes) - hits
+        return matrix, found
+
+    def get(self, img_hash: str) -> Optional[np.ndarray]:
+        matrix, found = self.get_many([img_hash])
+        return matrix[0] if found[0] else None
+
+    def missing(self, hashes: Iterable[str]) -> List[str]:
+        """尚未儲存向量的 hash (保持順序、去除重複)"""
+        hashes = list(dict.fromkeys(h for h in hashes if h))
+        return [h for h, row in zip(hashes, self._lookup_rows(hashes)) if row is None]
+
+    def __contains__(self, img_hash: str) -> bool:
+        return self._lookup_rows([img_hash])[0] is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def mean_vector(self) -> np.ndarray:
+        """
+        所有向量的平均 (依寫入版本快取)
+        Model A 的 embedding 經過 ReLU 皆為非負，任兩件的 cosine 普遍偏高；扣除平均後再比較才有鑑別度
+        """
+        with self._lock:
+            key = (self.version, len(self._rows))
+            if self._mean is not None and self._mean[0] == key:
+                return self._mean[1]
+            mean = np.zeros(self.dim, dtype=np.float32)
+            rows = np.sort(np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows)))
+            mm = self._matrix(int(rows[-1])) if rows.size else None
+            if mm is not None:
+                total = np.zeros(self.dim, dtype=np.float64)
+                for start in range(0, rows.size, 4096):
+                    total += mm[rows[start:start + 4096]].sum(axis=0, dtype=np.float64)
+                mean = (total / rows.size).astype(np.float32)
+            self._mean = (key, mean)
+            return mean
+
+    def get_stats(self) -> Dict:
+        """儲存統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["vectors"] = len(self._rows)
+        stats["dim"] = self.dim
+        stats["file_bytes"] = self._capacity() * self.dim * 4
+        return stats
@@ -0,0 +1,101 @@
+"""
+圖片遷移工具
+把 my_wardrobe.image_data 中的 base64 圖片搬到 Blob Store，並改寫 image_url、清空 image_data
+
+用法 (於專案根目錄，使用與服務相同的環境變數，且 BLOB_STORE 需設為 supabase 或 local):
+    python backend/database/migrate_images.py              # 執行遷移
+    python backend/database/migrate_images.py --dry-run    # 只統計，不寫入
+"""
+import argparse
+import base64
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import AppConfig
+from database.supabase_client import SupabaseClient
+from database.blob_store import create_blob_store, is_valid_hash
+from api.wardrobe_service import WardrobeService
+
+
+def migrate(wardrobe_service: WardrobeService, batch_size: int = 50, dry_run: bool = False) -> dict:
+    """
+    依 id 順序分批搬移尚有 image_data 的資料列
+
+    Returns:
+        dict: {scanned, migrated, failed, bytes}
+    """
+    client = wardrobe_service.db.client
+    stats = {"scanned": 0, "migrated": 0, "failed": 0, "bytes": 0}
+    last_id = 0
+
+    while True:
+        rows = client.table("my_wardrobe")\
+            .select("id, image_hash, image_data")\
+            .not_.is_("image_data", "null")\
+            .gt("id", last_id)\
+            .order("id")\
+            .limit(batch_size)\
+            .execute().data
+        if not rows:
+            break
+
+        for row in rows:
+            last_id = row["id"]
+            stats["scanned"] += 1
+            try:
+                img_bytes = base64.b64decode(row["image_data"])
+                # 沿用資料列的 image_hash (原始上傳檔的 hash，正規化後的內容 hash 會不同)，重複檢查才不會失效
+                img_hash = row.get("image_hash")
+                if not is_valid_hash(img_hash):
+                    img_hash = WardrobeService.get_image_hash(img_bytes)
+                stats["bytes"] += len(img_bytes)
+
+                if dry_run:
+                    continue
+
+                wardrobe_service.blob_store.put(img_hash, img_bytes)
+                client.table("my_wardrobe")\
+                    .update({
+                        "image_hash": img_hash,
+                        "image_url": f"{WardrobeService.IMAGE_URL_PREFIX}{img_hash}",
+                        "image_data": None
+                    })\
+                    .eq("id", row["id"])\
+                    .execute()
+                stats["migrated"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[ERROR] id={row['id']} 遷移失敗: {e}")
+
+        print(f"[MIGRATE] 已處理 {stats['scanned']} 筆 (成功 {stats['migrated']}, 失敗 {stats['failed']})")
+
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="將 my_wardrobe.image_data 遷移到 Blob Store")
+    parser.add_argument("--batch-size", type=int, default=50, help="每批讀取的資料列數")
+    parser.add_argument("--dry-run", action="store_true", help="只統計，不寫入")
+    args = parser.parse_args(argv)
+
+    config = AppConfig.from_env()
+    supabase_client = SupabaseClient(config.supabase_url, config.supabase_key)
+    blob_store = create_blob_store(
+        config.blob_store_backend, supabase_client, config.blob_store_path, config.blob_store_bucket
+    )
+    if blob_store is None:
+        print("❌ 請先設定 BLOB_STORE=supabase (或有持久磁碟時使用 local) 再執行遷移")
+        return 1
+    wardrobe_service = WardrobeService(supabase_client, blob_store=blob_store)
+
+    stats = migrate(wardrobe_service, batch_size=args.batch_size, dry_run=args.dry_run)
+    mode = "(dry-run) " if args.dry_run else ""
+    print(f"✅ {mode}完成: 掃描 {stats['scanned']} 筆, 遷移 {stats['migrated']} 筆, "
+          f"失敗 {stats['failed']} 筆, 共 {stats['bytes'] / 1024 / 1024:.1f} MB")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,13 +9,19 @@ class WeatherData:
     desc: str
     city: str
     update_time: datetime
+    observed_at: Optional[datetime] = None  # 測站觀測時間
+    age_seconds: int = 0  # 資料年齡 (距觀測時間)
+    stale: bool = False  # 快照已過期、背景更新中
     
     def to_dict(self) -> dict:
         return {
             "temp": round(self.temp, 1),
             "feels_like": round(self.feels_like, 1),
             "desc": self.desc,
-            "city": self.city
+            "city": self.city,
+            "observed_at": self.observed_at.isoformat() if self.observed_at else None,
+            "age_seconds": self.age_seconds,
+            "stale": self.stale
         }
 @dataclass
 class ClothingItem:
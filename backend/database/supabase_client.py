@@ -2,24 +2,40 @@
 Supabase 客戶端 - Database Client
 統一管理資料庫連接,適用於 Streamlit Cloud
 """
-from supabase import create_client, Client
-from typing import Optional
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from supabase import create_client, Client, ClientOptions
 
 class SupabaseClient:
     """Supabase 資料庫客戶端"""
-    
-    def __init__(self, url: str, key: str):
+
+    def __init__(self, url: str, key: str, max_workers: int = 8, timeout: float = 10.0):
         """
         初始化 Supabase 客戶端
-        
+
         Args:
             url: Supabase 專案 URL
             key: Supabase Anon Key
+            max_workers: 同時進行的資料庫呼叫上限 (超過的呼叫排隊等待)
+            timeout: 單次呼叫逾時秒數
         """
         self.url = url
         self.key = key
+        self.max_workers = max_workers
+        self.timeout = timeout
         self._client: Optional[Client] = None
-    
+        self._client_lock = threading.Lock()
+
+        # supabase-py 為同步客戶端，async handler 透過這個有上限的 executor 呼叫，避免阻塞 event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "active": 0, "timeouts": 0, "errors": 0}
+
     @property
     def client(self) -> Client:
         """
@@ -27,13 +43,81 @@ class SupabaseClient:
         使用延遲初始化模式
         """
         if self._client is None:
-            self._client = create_client(self.url, self.key)
+            with self._client_lock:
+                if self._client is None:
+                    self._client = create_client(self.url, self.key, options=self._build_options())
         return self._client
-    
+
+    def _build_options(self) -> ClientOptions:
+        """共用連線池 (keep-alive) 與逾時設定"""
+        options = ClientOptions(
+            postgrest_client_timeout=self.timeout,
+            storage_client_timeout=int(self.timeout)
+        )
+        # 新版 supabase-py 可傳入共用的 httpx.Client
+        if hasattr(options, "httpx_client"):
+            options.httpx_client = httpx.Client(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_workers * 2,
+                    max_keepalive_connections=self.max_workers
+                )
+            )
+        return options
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        在資料庫 executor 中執行同步函式 (例如 Service 方法)，不阻塞 event loop
+
+        Args:
+            func: 要執行的函式
+            timeout: 逾時秒數 (None 則使用預設值)；逾時會拋出 asyncio.TimeoutError
+
+        Returns:
+            func 的回傳值
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._tracked_call, func, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, call),
+                timeout=timeout or self.timeout * 3  # 含排隊時間與 Service 內的多次查詢
+            )
+        except asyncio.TimeoutError:
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            print(f"[DB] ⏱️ 資料庫呼叫逾時: {getattr(func, '__qualname__', func)}")
+            raise
+
+    def _tracked_call(self, func: Callable, *args, **kwargs) -> Any:
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["active"] += 1
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._stats["active"] -= 1
+
+    def get_stats(self) -> Dict:
+        """資料庫呼叫統計"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["max_workers"] = self.max_workers
+        return stats
+
+    def shutdown(self):
+        """等待進行中的呼叫結束並關閉 executor"""
+        self._executor.shutdown(wait=True)
+
     def test_connection(self) -> bool:
         """
         測試資料庫連接
-        
+
         Returns:
             是否連接成功
         """
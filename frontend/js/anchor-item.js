@@ -54,7 +54,7 @@ const AnchorItemUI = {
     async openModal() {
         // 載入用戶的衣櫥
         try {
-            const result = await API.getWardrobe();
+            const result = await API.getWardrobeAll();
             if (result.success && result.items) {
                 this.wardrobeItems = result.items;
                 this.renderWardrobeList(result.items);
@@ -91,7 +91,7 @@ const AnchorItemUI = {
                 div.classList.add('selected');
             }
 
-            const imgSrc = item.image_data ? `data:image/jpeg;base64,${item.image_data}` : 'static/images/placeholder.jpg';
+            const imgSrc = Utils.getItemImageSrc(item, 'static/images/placeholder.jpg');
 
             div.innerHTML = `
                 <img src="${imgSrc}" alt="${item.name}">
@@ -78,8 +78,41 @@ const API = {
         return response.json();
     },
 
+    async getUploadStatus(jobId) {
+        const user = AppState.getUser();
+        const response = await fetch(
+            `${API_BASE_URL}/api/upload/status/${encodeURIComponent(jobId)}?user_id=${encodeURIComponent(user.id)}`
+        );
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        return response.json();
+    },
+
+    // 輪詢上傳任務直到完成，onProgress 會收到每次的進度資料
+    async waitForUploadJob(jobId, onProgress = null, intervalMs = 1500) {
+        while (true) {
+            const status = await this.getUploadStatus(jobId);
+
+            if (!status.success) {
+                return status;
+            }
+            if (onProgress) {
+                onProgress(status);
+            }
+            if (status.finished) {
+                return status;
+            }
+
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    },
+
     // ========== 衣櫥 API ==========
-    async getWardrobe() {
+    // 分頁讀取衣櫥: options = { category, cursor, limit, fields }
+    async getWardrobe(options = {}) {
         const user = AppState.getUser();
 
         // ✅ 改這裡：驗證 user_id 存在
@@ -89,8 +122,41 @@ const API = {
 
         console.log(`[INFO] 查詢衣櫥: user_id=${user.id}`);
 
+        const params = new URLSearchParams({ user_id: user.id });
+        if (options.category) params.append('category', options.category);
+        if (options.cursor) params.append('cursor', options.cursor);
+        if (options.limit) params.append('limit', options.limit);
+        if (options.fields) params.append('fields', options.fields.join(','));
+
+        const response = await fetch(`${API_BASE_URL}/api/wardrobe?${params.toString()}`);
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        return response.json();
+    },
+
+    // 依 next_cursor 讀完所有分頁 (用於需要完整清單的選單)
+    async getWardrobeAll(options = {}) {
+        const items = [];
+        let cursor = null;
+        do {
+            const result = await this.getWardrobe({ ...options, cursor, limit: 100 });
+            if (!result.success) {
+                return result;
+            }
+            items.push(...(result.items || []));
+            cursor = result.next_cursor;
+        } while (cursor);
+
+        return { success: true, items };
+    },
+
+    async getWardrobeStats() {
+        const user = AppState.getUser();
         const response = await fetch(
-            `${API_BASE_URL}/api/wardrobe?user_id=${encodeURIComponent(user.id)}`  // ✅ encodeURIComponent
+            `${API_BASE_URL}/api/wardrobe/stats?user_id=${encodeURIComponent(user.id)}`
         );
 
         if (!response.ok) {
@@ -140,6 +206,33 @@ const API = {
         return response.json();
     },
 
+    // 批次更新: data 只需包含要修改的欄位 (category / color / style / warmth)
+    async batchUpdateItems(itemIds, data) {
+        const user = AppState.getUser();
+        const formData = new FormData();
+        formData.append('user_id', user.id);
+
+        itemIds.forEach(id => {
+            formData.append('item_ids', id);
+        });
+        ['category', 'color', 'style', 'warmth'].forEach(key => {
+            if (data[key] !== undefined && data[key] !== null && data[key] !== '') {
+                formData.append(key, data[key]);
+            }
+        });
+
+        const response = await fetch(`${API_BASE_URL}/api/wardrobe/batch-update`, {
+            method: 'POST',
+            body: formData
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
+        return response.json();
+    },
+
     // ========== 推薦 API ==========
     async getRecommendation(city, style, occasion, lockedItemIds = []) {
         const user = AppState.getUser();
@@ -450,6 +543,20 @@ const Utils = {
         });
     },
 
+    // 衣物圖片來源 (優先使用 image_url / image_hash，尚未遷移的舊資料退回 base64)
+    getItemImageSrc(item, fallback = null) {
+        if (item.image_url) {
+            return item.image_url.startsWith('/') ? `${API_BASE_URL}${item.image_url}` : item.image_url;
+        }
+        if (item.image_hash) {
+            return `${API_BASE_URL}/api/image/${item.image_hash}`;
+        }
+        if (item.image_data) {
+            return `data:image/jpeg;base64,${item.image_data}`;
+        }
+        return fallback;
+    },
+
     // 格式化檔案大小
     formatFileSize(bytes) {
         if (bytes === 0) return '0 Bytes';
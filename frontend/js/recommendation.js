@@ -147,7 +147,7 @@ const RecommendationUI = {
 
         // ✅ 修復問題 8: 檢查是否需要購物連結容器
         let shoppingHtml = '';
-        if (!currentItem.id || currentItem.id === 'ai_suggested' || !currentItem.image_data) {
+        if (!currentItem.id || currentItem.id === 'ai_suggested' || !Utils.getItemImageSrc(currentItem)) {
             shoppingHtml = `<div id="shopping-container-${this.currentSetIndex}-${this.currentItemIndex}"></div>`;
         }
 
@@ -197,7 +197,7 @@ const RecommendationUI = {
 
     renderClothingItem(item) {
         // 處理圖片
-        const imgSrc = item.image_data ? `data:image/jpeg;base64,${item.image_data}` : 'static/images/placeholder.jpg';
+        const imgSrc = Utils.getItemImageSrc(item, 'static/images/placeholder.jpg');
 
         return `
             <div class="recommended-item animate-fade-in">
@@ -241,6 +241,7 @@ const UploadUI = {
 
             let totalSuccess = 0;
             let totalFail = 0;
+            let totalDuplicate = 0;
             const allItems = [];
 
             for (const [warmthKey, items] of Object.entries(groups)) {
@@ -253,13 +254,25 @@ const UploadUI = {
                     items.map(item => ImageUtils.compressImage(item.file))
                 );
 
-                // 2. 上傳到後端
-                const result = await API.uploadImages(compressedFiles, warmthKey);
+                // 2. 上傳到後端 (回傳 job_id，辨識與儲存在背景進行)
+                const job = await API.uploadImages(compressedFiles, warmthKey);
+                if (!job.success) {
+                    totalFail += items.length;
+                    console.error(`類別 ${warmthKey} 上傳失敗:`, job.message);
+                    continue;
+                }
+
+                // 3. 輪詢任務進度
+                const result = await API.waitForUploadJob(job.job_id, (status) => {
+                    console.log(`[上傳進度] 極${warmthKey}: ${status.processed}/${status.total} (${status.status})`);
+                });
 
-                if (result.success) {
+                if (result.success && result.status === 'done') {
                     totalSuccess += (result.success_count || 0);
                     totalFail += (result.fail_count || 0);
+                    totalDuplicate += (result.duplicate_count || 0);
                     if (result.items) allItems.push(...result.items);
+                    if (result.duplicates) console.log(`[上傳] 略過重複圖片:`, result.duplicates);
                 } else {
                     totalFail += items.length;
                     console.error(`類別 ${warmthKey} 上傳失敗:`, result.message);
@@ -273,7 +286,8 @@ const UploadUI = {
 
             // 顯示最終結果
             const duration = ((Date.now() - startTime) / 1000).toFixed(1);
-            Toast.success(`🎉 任務完成！成功: ${totalSuccess}, 失敗: ${totalFail} (耗時 ${duration}s)`);
+            const duplicateText = totalDuplicate > 0 ? `, 重複略過: ${totalDuplicate}` : '';
+            Toast.success(`🎉 任務完成！成功: ${totalSuccess}${duplicateText}, 失敗: ${totalFail} (耗時 ${duration}s)`);
 
             if (allItems.length > 0) {
                 this.showUploadResults(allItems);
@@ -4,6 +4,8 @@ const WardrobeUI = {
     selectedItems: new Set(),
     isBatchDeleteMode: false,
     currentFilter: 'all', // 當前過濾分類
+    nextCursor: null, // 下一頁的分頁游標 (null 表示沒有更多)
+    pageSize: 30,
 
     // ========== 初始化 ==========
     init() {
@@ -37,6 +39,13 @@ const WardrobeUI = {
             });
         }
 
+        const loadMoreBtn = document.getElementById('wardrobe-load-more-btn');
+        if (loadMoreBtn) {
+            loadMoreBtn.addEventListener('click', () => {
+                this.loadMore();
+            });
+        }
+
         // 綁定過濾按鈕事件
         const filterBtns = document.querySelectorAll('.filter-btn');
         filterBtns.forEach(btn => {
@@ -78,7 +87,8 @@ const WardrobeUI = {
         });
 
         console.log(`🔍 切換過濾分類: ${filter}`);
-        this.renderWardrobe();
+        // 分類過濾改由後端處理，重新載入第一頁
+        this.loadWardrobe();
     },
 
     // ========== 輔助函數 - 放在最前面 ==========
@@ -90,8 +100,8 @@ const WardrobeUI = {
         return div.innerHTML;
     },
 
-    /**✅ 安全版本的 updateStats - 必須放在 loadWardrobe 之前*/
-    updateStatsSafely() {
+    /**✅ 安全版本的 updateStats - 必須放在 loadWardrobe 之前 (統計由後端計算，不受分頁影響)*/
+    async updateStatsSafely() {
         const totalItemsEl = document.getElementById('total-items');
         const statsGridEl = document.getElementById('wardrobe-stats');
 
@@ -106,18 +116,19 @@ const WardrobeUI = {
         }
 
         try {
-            totalItemsEl.textContent = this.items.length;
+            const result = await API.getWardrobeStats();
+            if (!result.success) {
+                console.warn('⚠️ 取得衣櫥統計失敗:', result.message);
+                return;
+            }
 
-            const categories = {};
-            this.items.forEach(item => {
-                const cat = item.category || '其他';
-                categories[cat] = (categories[cat] || 0) + 1;
-            });
+            const categories = result.categories || {};
+            totalItemsEl.textContent = result.total;
 
             statsGridEl.innerHTML = `
                 <div class="stat-card">
                     <span class="stat-label">總計</span>
-                    <span class="stat-value">${this.items.length}</span>
+                    <span class="stat-value" id="total-items">${result.total}</span>
                 </div>
                 ${Object.entries(categories).map(([cat, count]) => `
                     <div class="stat-card">
@@ -141,11 +152,15 @@ const WardrobeUI = {
         try {
             console.log('📥 開始載入衣櫥...');
 
-            const result = await API.getWardrobe();
+            const result = await API.getWardrobe({
+                category: this.currentFilter !== 'all' ? this.currentFilter : null,
+                limit: this.pageSize
+            });
             console.log('📊 API 返回結果:', result);
 
             if (result.success) {
                 this.items = result.items || [];
+                this.nextCursor = result.next_cursor || null;
                 console.log(`✅ 成功載入 ${this.items.length} 件衣服`);
 
                 const wardrobeGrid = document.getElementById('wardrobe-grid');
@@ -184,6 +199,35 @@ const WardrobeUI = {
         }
     },
 
+    async loadMore() {
+        if (!this.nextCursor) return;
+
+        const loadMoreBtn = document.getElementById('wardrobe-load-more-btn');
+        if (loadMoreBtn) loadMoreBtn.disabled = true;
+
+        try {
+            const result = await API.getWardrobe({
+                category: this.currentFilter !== 'all' ? this.currentFilter : null,
+                cursor: this.nextCursor,
+                limit: this.pageSize
+            });
+
+            if (result.success) {
+                this.items = this.items.concat(result.items || []);
+                this.nextCursor = result.next_cursor || null;
+                console.log(`✅ 再載入 ${(result.items || []).length} 件衣服 (共 ${this.items.length} 件)`);
+                this.renderWardrobe();
+            } else {
+                Toast.error(result.message || '載入衣櫥失敗');
+            }
+        } catch (error) {
+            console.error('💥 載入更多衣物發生錯誤:', error);
+            Toast.error('載入失敗: ' + error.message);
+        } finally {
+            if (loadMoreBtn) loadMoreBtn.disabled = false;
+        }
+    },
+
     renderWardrobe() {
         const grid = document.getElementById('wardrobe-grid');
         const emptyState = document.getElementById('wardrobe-empty');
@@ -193,12 +237,13 @@ const WardrobeUI = {
             return;
         }
 
-        // 根據過濾條件篩選
-        let displayItems = this.items;
-        if (this.currentFilter !== 'all') {
-            displayItems = this.items.filter(item => item.category === this.currentFilter);
+        // 已由後端依分類過濾
+        const displayItems = this.items;
+
+        const loadMoreBtn = document.getElementById('wardrobe-load-more-btn');
+        if (loadMoreBtn) {
+            loadMoreBtn.style.display = this.nextCursor ? 'inline-block' : 'none';
         }
-        console.log(`🔍 過濾後顯示 ${displayItems.length} 件 (總共 ${this.items.length} 件)`);
 
         if (displayItems.length === 0) {
             grid.style.display = 'none';
@@ -272,9 +317,8 @@ const WardrobeUI = {
             `;
         }
 
-        const imageSrc = item.image_data ?
-            `data:image/jpeg;base64,${item.image_data}` :
-            'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect fill=%22%23ddd%22 width=%22100%22 height=%22100%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E無圖片%3C/text%3E%3C/svg%3E';
+        const imageSrc = Utils.getItemImageSrc(item,
+            'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect fill=%22%23ddd%22 width=%22100%22 height=%22100%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E無圖片%3C/text%3E%3C/svg%3E');
 
         const category = item.category || '其他';
         const color = item.color || '未知';
@@ -1,21 +1,28 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 from pathlib import Path
+import asyncio
 import sys
 import os
 
 sys.path.insert(0, str(Path(__file__).parent / 'backend'))
 
-from config import AppConfig
+from config import AppConfig, GEMINI_RATE_LIMITS
 from database.supabase_client import SupabaseClient
+from database.blob_store import create_blob_store, guess_mime_type
+from database.embedding_store import EmbeddingStore
 from api.ai_service import AIService
+from api.rate_limiter import TokenBucketRateLimiter
+from api.tag_cache import TagCache
 from api.weather_service import WeatherService
 from api.wardrobe_service import WardrobeService
 from api.user_service import UserService
-from database.models import ClothingItem
+from api.upload_job_service import UploadJobService
+from api.image_normalizer import ImageNormalizer
+from api.similarity_service import SimilarityService
 
 app = FastAPI()
 
@@ -28,14 +35,82 @@ app.add_middleware(
 )
 
 config = AppConfig.from_env()
-supabase_client = SupabaseClient(config.supabase_url, config.supabase_key)
-ai_service = AIService(config.gemini_api_key)
-weather_service = WeatherService(config.weather_api_key)
-wardrobe_service = WardrobeService(supabase_client)
+supabase_client = SupabaseClient(
+    config.supabase_url, config.supabase_key,
+    max_workers=config.db_max_concurrency, timeout=config.db_timeout_seconds
+)
+rate_limiter = TokenBucketRateLimiter(config.rate_limit_db_path, GEMINI_RATE_LIMITS)
+tag_cache = TagCache(config.tag_cache_path, max_entries=config.tag_cache_max_entries)
+embedding_store = EmbeddingStore(config.embedding_store_path)
+ai_service = AIService(
+    config.gemini_api_key, rate_limiter=rate_limiter, tag_cache=tag_cache,
+    tag_batch_size=config.tag_batch_size, tag_max_concurrency=config.tag_max_concurrency,
+    embedding_store=embedding_store, embedding_weight=config.embedding_weight
+)
+weather_service = WeatherService(
+    config.weather_api_key,
+    cache_hours=config.weather_cache_hours,
+    refresh_interval_seconds=config.weather_refresh_seconds,
+    snapshot_path=config.weather_snapshot_path,
+    max_stale_hours=config.weather_max_stale_hours,
+    connect_timeout=config.weather_connect_timeout,
+    read_timeout=config.weather_read_timeout,
+    max_retries=config.weather_max_retries,
+    verify_tls=config.weather_verify_tls
+)
+blob_store = create_blob_store(
+    config.blob_store_backend, supabase_client, config.blob_store_path, config.blob_store_bucket
+)
+wardrobe_service = WardrobeService(
+    supabase_client, blob_store=blob_store,
+    cache_ttl_seconds=config.wardrobe_cache_ttl_seconds,
+    cache_max_users=config.wardrobe_cache_max_users
+)
+similarity_service = SimilarityService(
+    embedding_store, wardrobe_service, cache_max_users=config.wardrobe_cache_max_users
+)
 user_service = UserService(supabase_client)
+image_normalizer = ImageNormalizer(config.image_max_edge, config.image_format, config.image_quality)
+upload_job_service = UploadJobService(
+    ai_service, wardrobe_service,
+    max_workers=config.upload_worker_count,
+    max_pending_jobs=config.max_pending_upload_jobs,
+    job_ttl_seconds=config.upload_job_ttl_seconds,
+    image_normalizer=image_normalizer,
+    embed_on_upload=config.embed_on_upload,
+    max_images_per_job=config.max_batch_upload
+)
 
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
+@app.on_event("startup")
+async def start_weather_refresh():
+    """背景定期更新全國天氣快照，請求時不必等待中央氣象署 API"""
+    if config.weather_api_key:
+        weather_service.start_background_refresh()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """關閉天氣背景更新與 HTTP 連線池，等待上傳任務完成後再釋放資料庫 executor"""
+    await weather_service.stop_background_refresh()
+    # 上傳任務會寫入資料庫，需先等任務結束再關閉 Supabase executor
+    await asyncio.to_thread(upload_job_service.shutdown, wait=True)
+    await asyncio.to_thread(supabase_client.shutdown)
+
+@app.on_event("startup")
+async def warmup_model_a():
+    """選擇性預熱本地 Model A (MODEL_A_WARMUP=1)，在背景執行不阻塞啟動"""
+    if not config.model_a_warmup:
+        return
+
+    def _warmup():
+        from api.model_a_adapter import ModelAAdapter
+        print("[INFO] Model A 預熱中...")
+        ok = ModelAAdapter().warmup()
+        print(f"[INFO] Model A 預熱{'完成' if ok else '略過 (模型不可用)'}")
+
+    asyncio.get_running_loop().run_in_executor(None, _warmup)
+
 @app.get("/")
 async def read_root():
     return FileResponse("frontend/index.html")
@@ -44,22 +119,31 @@ async def read_root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """服務內部統計 (用於調整配額與容量)"""
+    return {
+        "rate_limiter": await asyncio.to_thread(rate_limiter.get_metrics),
+        "tag_cache": await asyncio.to_thread(tag_cache.get_stats),
+        "circuit_breakers": ai_service.get_breaker_states(),
+        "image_normalizer": image_normalizer.get_stats(),
+        "wardrobe_cache": wardrobe_service.get_cache_stats(),
+        "embeddings": similarity_service.get_stats(),
+        "database": supabase_client.get_stats()
+    }
+
 # ========== 認證 ==========
 
 @app.post("/api/login")
 async def login(username: str = Form(...), password: str = Form(...)):
     """登入"""
     try:
-        result = supabase_client.client.table("users")\
-            .select("id")\
-            .eq("username", username)\
-            .eq("password", password)\
-            .execute()
+        user_id = await supabase_client.run(user_service.login, username, password)
         
-        if result.data:
+        if user_id:
             return {
                 "success": True,
-                "user_id": str(result.data[0]['id']),
+                "user_id": user_id,
                 "username": username
             }
         
@@ -72,24 +156,8 @@ async def login(username: str = Form(...), password: str = Form(...)):
 async def register(username: str = Form(...), password: str = Form(...)):
     """註冊"""
     try:
-        # 檢查重複
-        existing = supabase_client.client.table("users")\
-            .select("id")\
-            .eq("username", username)\
-            .execute()
-        
-        if existing.data:
-            return {"success": False, "message": "使用者名稱已存在"}
-        
-        # 新增用戶（讓 Supabase 自動生成 UUID）
-        result = supabase_client.client.table("users")\
-            .insert({"username": username, "password": password})\
-            .execute()
-        
-        if result.data:
-            return {"success": True, "message": "註冊成功"}
-        
-        return {"success": False, "message": "註冊失敗"}
+        success, msg = await supabase_client.run(user_service.register, username, password)
+        return {"success": success, "message": msg}
     except Exception as e:
         print(f"[ERROR] 註冊: {str(e)}")
         return {"success": False, "message": "註冊失敗"}
@@ -100,7 +168,7 @@ async def register(username: str = Form(...), password: str = Form(...)):
 async def get_weather(city: str = "Taipei"):
     """天氣"""
     try:
-        weather = weather_service.get_weather(city)
+        weather = await weather_service.get_weather(city)
         return weather.to_dict() if weather else {"error": "無法獲取天氣"}
     except Exception as e:
         print(f"[ERROR] 天氣: {str(e)}")
@@ -110,7 +178,7 @@ async def get_weather(city: str = "Taipei"):
 
 @app.post("/api/upload")
 async def upload_images(request: Request):
-    """上傳衣物"""
+    """上傳衣物 - 收檔後立即回傳 job_id，辨識與儲存交由背景 worker 處理"""
     import traceback
     
     try:
@@ -122,82 +190,31 @@ async def upload_images(request: Request):
         files = form.getlist("files")
         warmth_str = form.get("warmth", "薄")
         
-        # 映射厚度字串到數值
-        warmth_map = {"薄": 2, "適中": 5, "厚": 8}
-        user_warmth = warmth_map.get(warmth_str, 5)
-        
-        print(f"[INFO] 步驟 1: 接收到 user_id={user_id}, 文件數量={len(files)}, 厚度={warmth_str}({user_warmth})")
+        print(f"[INFO] 步驟 1: 接收到 user_id={user_id}, 文件數量={len(files)}, 厚度={warmth_str}")
         
         if not user_id or not files:
             print(f"[ERROR] 缺少必要參數: user_id={user_id}, files={len(files) if files else 0}")
             return {"success": False, "message": "缺少必要參數"}
         
         # 步驟 2: 讀取圖片
-        img_bytes_list = []
-        file_names = []
-        
+        uploaded = []
         for idx, file in enumerate(files):
             content = await file.read()
-            img_bytes_list.append(content)
-            file_names.append(file.filename)
+            uploaded.append((file.filename, content))
             print(f"[INFO] 步驟 2.{idx+1}: 讀取文件 '{file.filename}', 大小={len(content)} bytes")
         
-        # 步驟 3: AI 辨識
-        print(f"[INFO] 步驟 3: 開始 AI 辨識 {len(img_bytes_list)} 張圖片...")
-        tags_list = ai_service.batch_auto_tag(img_bytes_list)
-        
-        if not tags_list:
-            print(f"[ERROR] AI 辨識失敗: tags_list 為 None")
-            return {"success": False, "message": "AI 辨識失敗,請稍後再試"}
-        
-        print(f"[INFO] 步驟 3: AI 辨識成功,返回 {len(tags_list)} 個標籤")
-        for idx, tags in enumerate(tags_list):
-            print(f"[INFO]   - 圖片 {idx+1}: {tags}")
-        
-        # 步驟 4: 儲存到資料庫
-        print(f"[INFO] 步驟 4: 開始儲存到資料庫...")
-        success_count = 0
-        fail_count = 0
-        fail_details = []
-        
-        for idx, (img_bytes, tags, filename) in enumerate(zip(img_bytes_list, tags_list, file_names)):
-            try:
-                print(f"[INFO] 步驟 4.{idx+1}: 處理 '{filename}'...")
-                
-                item = ClothingItem(
-                    user_id=user_id,
-                    name=tags.get('name', filename),
-                    category=tags.get('category', '其他'),
-                    color=tags.get('color', '未知'),
-                    style=tags.get('style', ''),
-                    warmth=user_warmth # 使用使用者指定的厚度
-                )
-                
-                success, msg = wardrobe_service.save_item(item, img_bytes)
-                
-                if success:
-                    success_count += 1
-                    print(f"[INFO] 步驟 4.{idx+1}: '{filename}' 儲存成功")
-                else:
-                    fail_count += 1
-                    fail_details.append(f"{filename}: {msg}")
-                    print(f"[ERROR] 步驟 4.{idx+1}: '{filename}' 儲存失敗 - {msg}")
-                    
-            except Exception as e:
-                fail_count += 1
-                error_msg = str(e)
-                fail_details.append(f"{filename}: {error_msg}")
-                print(f"[ERROR] 步驟 4.{idx+1}: '{filename}' 處理異常 - {error_msg}")
-                print(f"[ERROR] 詳細錯誤: {traceback.format_exc()}")
-        
-        print(f"[INFO] ========== 上傳完成: 成功 {success_count} 件, 失敗 {fail_count} 件 ==========")
+        # 步驟 3: 排入背景任務 (AI 辨識 + 儲存)
+        job_id, msg = upload_job_service.submit(user_id, uploaded, warmth_str)
+        if not job_id:
+            return {"success": False, "message": msg}
         
+        print(f"[INFO] 步驟 3: 已建立上傳任務 {job_id}")
         return {
             "success": True,
-            "success_count": success_count,
-            "fail_count": fail_count,
-            "items": tags_list[:success_count],
-            "fail_details": fail_details if fail_details else None
+            "job_id": job_id,
+            "status": UploadJobService.JOB_QUEUED,
+            "total": len(uploaded),
+            "message": msg
         }
         
     except Exception as e:
@@ -207,23 +224,85 @@ async def upload_images(request: Request):
         print(f"[ERROR] 詳細堆疊: {traceback.format_exc()}")
         return {"success": False, "message": f"上傳失敗: {error_msg}"}
 
+@app.get("/api/upload/status/{job_id}")
+async def get_upload_status(job_id: str, user_id: str):
+    """查詢上傳任務進度"""
+    try:
+        status = upload_job_service.get_status(job_id, user_id)
+        if not status:
+            return {"success": False, "message": "找不到上傳任務"}
+        return {"success": True, **status}
+    except Exception as e:
+        print(f"[ERROR] 上傳進度: {str(e)}")
+        return {"success": False, "message": "查詢失敗"}
+
+# ========== 圖片 ==========
+
+@app.get("/api/image/{img_hash}")
+async def get_image(img_hash: str, request: Request):
+    """依 image_hash 取得衣物圖片 (內容定址，可永久快取)"""
+    etag = f'"{img_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    data = await supabase_client.run(wardrobe_service.get_image, img_hash)
+    if data is None:
+        raise HTTPException(status_code=404, detail="找不到圖片")
+    return Response(content=data, media_type=guess_mime_type(data), headers=headers)
+
 # ========== 衣櫥 ==========
 
 @app.get("/api/wardrobe")
-async def get_wardrobe(user_id: str):
-    """取得衣櫥"""
+async def get_wardrobe(user_id: str, fields: Optional[str] = None, category: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = 50):
+    """
+    取得衣櫥 (分頁)
+    fields: 以逗號分隔的欄位；category: 分類過濾；cursor: 上一頁的 next_cursor
+    """
     try:
-        items = wardrobe_service.get_wardrobe(user_id)
-        return {"success": True, "items": [item.to_dict() for item in items]}
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        items, next_cursor = await supabase_client.run(
+            wardrobe_service.get_wardrobe_page, user_id,
+            fields=field_list, category=category or None, cursor=cursor, limit=limit
+        )
+        return {"success": True, "items": items, "next_cursor": next_cursor}
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         print(f"[ERROR] 衣櫥: {str(e)}")
         return {"success": False, "message": "查詢失敗"}
 
+@app.get("/api/wardrobe/stats")
+async def get_wardrobe_stats(user_id: str):
+    """衣櫥分類統計"""
+    try:
+        categories = await supabase_client.run(wardrobe_service.get_category_statistics, user_id)
+        return {"success": True, "total": sum(categories.values()), "categories": categories}
+    except Exception as e:
+        print(f"[ERROR] 衣櫥統計: {str(e)}")
+        return {"success": False, "message": "查詢失敗"}
+
+@app.get("/api/wardrobe/{item_id}/similar")
+async def get_similar_items(item_id: int, user_id: str, k: int = 10, same_category: bool = False):
+    """以 Model A embedding 找出衣櫥中最相似的單品 (k: 件數上限；same_category: 只找同類別)"""
+    try:
+        items = await supabase_client.run(
+            similarity_service.similar_items, user_id, item_id, k=min(max(k, 1), 50), same_category=same_category
+        )
+        if items is None:
+            return {"success": False, "message": "找不到此衣物或尚未建立特徵向量"}
+        return {"success": True, "items": items}
+    except Exception as e:
+        print(f"[ERROR] 相似單品: {str(e)}")
+        return {"success": False, "message": "查詢失敗"}
+
 @app.post("/api/wardrobe/delete")
 async def delete_item(user_id: str = Form(...), item_id: int = Form(...)):
     """刪除衣物"""
     try:
-        success = wardrobe_service.delete_item(user_id, item_id)
+        success = await supabase_client.run(wardrobe_service.delete_item, user_id, item_id)
         return {"success": success}
     except Exception as e:
         print(f"[ERROR] 刪除: {str(e)}")
@@ -231,14 +310,36 @@ async def delete_item(user_id: str = Form(...), item_id: int = Form(...)):
 
 @app.post("/api/wardrobe/batch-delete")
 async def batch_delete(user_id: str = Form(...), item_ids: List[int] = Form(...)):
-    """批量刪除"""
+    """批量刪除 (單次查詢，回傳每個 id 的結果)"""
     try:
-        success, count, fail = wardrobe_service.batch_delete_items(user_id, item_ids)
-        return {"success": success, "success_count": count, "fail_count": fail}
+        success, results = await supabase_client.run(wardrobe_service.batch_delete_items, user_id, item_ids)
+        count = sum(1 for r in results if r["status"] == "deleted")
+        return {"success": success, "success_count": count, "fail_count": len(results) - count, "results": results}
     except Exception as e:
         print(f"[ERROR] 批量刪除: {str(e)}")
         return {"success": False, "success_count": 0, "fail_count": len(item_ids)}
 
+@app.post("/api/wardrobe/batch-update")
+async def batch_update(
+    user_id: str = Form(...),
+    item_ids: List[int] = Form(...),
+    category: Optional[str] = Form(None),
+    color: Optional[str] = Form(None),
+    style: Optional[str] = Form(None),
+    warmth: Optional[int] = Form(None)
+):
+    """批量更新 (所有選取的衣物套用相同欄位值，只需傳入要修改的欄位)"""
+    try:
+        data = {"category": category, "color": color, "style": style, "warmth": warmth}
+        success, results = await supabase_client.run(wardrobe_service.batch_update_items, user_id, item_ids, data)
+        count = sum(1 for r in results if r["status"] == "updated")
+        return {"success": success, "success_count": count, "fail_count": len(results) - count, "results": results}
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    except Exception as e:
+        print(f"[ERROR] 批量更新: {str(e)}")
+        return {"success": False, "success_count": 0, "fail_count": len(item_ids)}
+
 # ========== 推薦 ==========
 
 @app.post("/api/recommendation")
@@ -251,16 +352,18 @@ async def get_recommendation(
 ):
     """推薦衣搭 - 支援個人偏好 & 指定單品鎖定"""
     try:
-        wardrobe = wardrobe_service.get_wardrobe(user_id)
+        # 衣櫥索引快取於 WardrobeService，寫入時增量更新，不必每次重建分桶
+        wardrobe_index = await supabase_client.run(wardrobe_service.get_wardrobe_index, user_id)
+        wardrobe = wardrobe_index.items()
         if not wardrobe:
             return {"success": False, "message": "衣櫥是空的"}
         
-        weather = weather_service.get_weather(city)
+        weather = await weather_service.get_weather(city)
         if not weather:
             return {"success": False, "message": "無法獲取天氣"}
         
         # ✅ 新增：取得使用者個人資料
-        user_profile = user_service.get_profile(user_id)
+        user_profile = await supabase_client.run(user_service.get_profile, user_id)
         
         # ✅ 優先級 3：解析指定單品
         locked_item_ids = []
@@ -270,16 +373,19 @@ async def get_recommendation(
             except:
                 locked_item_ids = []
         
-        recommendation = ai_service.generate_outfit_recommendation(
+        # 等待 Gemini 配額時只 await；Gemini 呼叫與推薦計算為同步阻塞，由 AIService 放到 thread 執行
+        recommendation = await ai_service.generate_outfit_recommendation_async(
             wardrobe, weather, style or "不限", occasion,
             user_profile=user_profile,  # ✅ 傳入個人資料
-            locked_items=locked_item_ids  # ✅ 傳入指定單品
+            locked_items=locked_item_ids,  # ✅ 傳入指定單品
+            wardrobe_index=wardrobe_index
         )
         if not recommendation:
             return {"success": False, "message": "推薦生成失敗"}
         
         # ✅ 新增：儲存歷史紀錄
-        user_service.save_history(
+        await supabase_client.run(
+            user_service.save_history,
             user_id=user_id,
             city=city,
             occasion=occasion,
@@ -316,7 +422,7 @@ async def update_clothing_item(
             "style": style,
             "warmth": warmth
         }
-        success = wardrobe_service.update_item(user_id, item_id, data)
+        success = await supabase_client.run(wardrobe_service.update_item, user_id, item_id, data)
         return {"success": success}
     except Exception as e:
         print(f"[ERROR] 更新衣物: {str(e)}")
@@ -328,7 +434,7 @@ async def update_clothing_item(
 async def get_profile(user_id: str):
     """取得個人資料"""
     try:
-        profile = user_service.get_profile(user_id)
+        profile = await supabase_client.run(user_service.get_profile, user_id)
         if profile:
             return {"success": True, "message": "查詢成功", "profile": profile}
         return {"success": False, "message": "查詢失敗", "profile": None}
@@ -366,7 +472,7 @@ async def update_profile(
         if custom_style_desc:
             profile_data['custom_style_desc'] = custom_style_desc
         
-        success, msg = user_service.update_profile(user_id, profile_data)
+        success, msg = await supabase_client.run(user_service.update_profile, user_id, profile_data)
         return {"success": success, "message": msg}
     except Exception as e:
         print(f"[ERROR] 更新個人資料: {str(e)}")
@@ -376,7 +482,7 @@ async def update_profile(
 async def get_history(user_id: str, limit: int = 20):
     """取得推薦歷史紀錄"""
     try:
-        history = user_service.get_history(user_id, limit)
+        history = await supabase_client.run(user_service.get_history, user_id, limit)
         return {"success": True, "message": "查詢成功", "history": history}
     except Exception as e:
         print(f"[ERROR] 獲取歷史紀錄: {str(e)}")
@@ -386,7 +492,7 @@ async def get_history(user_id: str, limit: int = 20):
 async def delete_history(user_id: str = Form(...), history_id: int = Form(...)):
     """刪除歷史紀錄"""
     try:
-        success, msg = user_service.delete_history(user_id, history_id)
+        success, msg = await supabase_client.run(user_service.delete_history, user_id, history_id)
         return {"success": success, "message": msg}
     except Exception as e:
         print(f"[ERROR] 刪除歷史紀錄: {str(e)}")
@@ -1,3 +1,20 @@
-from .inference import FashionPredictor
-from .model import FashionMultiTaskModel
+"""
+Model A 服飾辨識套件
+FashionPredictor / FashionMultiTaskModel 會在第一次存取時才載入 (避免 import 時就載入 torch)
+"""
 from .config import IMG_SIZE, NUM_CATEGORIES, NUM_ATTRIBUTES
+
+_LAZY_ATTRS = {
+    'FashionPredictor': '.inference',
+    'FashionMultiTaskModel': '.model',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        import importlib
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,212 @@
+"""
+Model A 推論後端
+在 CPU 主機上可選擇不同的執行方式: eager / TorchScript (frozen) / 動態 INT8 量化 / ONNX Runtime
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+try:
+    from . import config
+except ImportError:
+    import config
+
+# 支援的後端名稱
+BACKENDS = ('eager', 'torchscript', 'int8', 'onnx')
+
+# 後端輸出: (category_logits, attribute_logits, embedding)
+BackendOutput = Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+
+
+class InferenceWrapper(nn.Module):
+    """把 FashionMultiTaskModel 的 dict 輸出改成 tuple，方便 trace / ONNX 匯出"""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> BackendOutput:
+        output = self.model(x, return_embedding=True)
+        return output['category_logits'], output['attribute_logits'], output['embedding']
+
+
+def _example_input(batch_size: int = 1) -> torch.Tensor:
+    return torch.randn(batch_size, 3, config.IMG_SIZE, config.IMG_SIZE)
+
+
+# ==================== 匯出檔與 checkpoint 對應 ====================
+
+def checkpoint_fingerprint(checkpoint_path) -> Optional[Dict]:
+    """checkpoint 的識別資訊 (修改時間 + 大小)，沒有 checkpoint 時為 None"""
+    if checkpoint_path is None or not Path(checkpoint_path).exists():
+        return None
+    stat = Path(checkpoint_path).stat()
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _fingerprint_path(path: Path) -> Path:
+    """匯出檔旁記錄來源 checkpoint 的 sidecar 檔"""
+    return Path(str(path) + '.source.json')
+
+
+def _write_fingerprint(path: Path, fingerprint: Optional[Dict]):
+    with open(_fingerprint_path(path), 'w', encoding='utf-8') as f:
+        json.dump({'checkpoint': fingerprint}, f)
+
+
+def export_is_current(path: Path, fingerprint: Optional[Dict]) -> bool:
+    """匯出檔存在且來自同一個 checkpoint (重新訓練後的舊匯出檔視為過期)"""
+    if path is None or not Path(path).exists():
+        return False
+    try:
+        with open(_fingerprint_path(path), encoding='utf-8') as f:
+            return json.load(f).get('checkpoint') == fingerprint
+    except (OSError, ValueError):
+        return False
+
+
+class EagerBackend:
+    """原本的 fp32 PyTorch 執行方式"""
+
+    name = 'eager'
+
+    def __init__(self, model: nn.Module, device: torch.device):
+        self.device = device
+        self.module = InferenceWrapper(model).eval()
+
+    def __call__(self, x: torch.Tensor) -> BackendOutput:
+        with torch.inference_mode():
+            return self.module(x.to(self.device))
+
+
+class TorchScriptBackend(EagerBackend):
+    """TorchScript trace + freeze (有同一 checkpoint 的匯出檔則直接載入)"""
+
+    name = 'torchscript'
+
+    def __init__(self, model: nn.Module, device: torch.device, path: Path = None,
+                 fingerprint: Optional[Dict] = None):
+        self.device = device
+        if export_is_current(path, fingerprint):
+            self.module = torch.jit.load(str(path), map_location=device)
+            print(f"✅ 載入 TorchScript 模型: {path}")
+        elif path is not None and Path(path).exists():
+            print(f"⚠️  TorchScript 匯出檔與目前 checkpoint 不符，重新匯出: {path}")
+            self.module = export_torchscript(model, device, path, fingerprint)
+        else:
+            self.module = export_torchscript(model, device)
+
+
+class Int8Backend(EagerBackend):
+    """動態 INT8 量化 (Linear 層權重量化，僅支援 CPU)"""
+
+    name = 'int8'
+
+    def __init__(self, model: nn.Module, device: torch.device):
+        self.device = torch.device('cpu')
+        wrapper = InferenceWrapper(model).to(self.device).eval()
+        self.module = torch.ao.quantization.quantize_dynamic(wrapper, {nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend:
+    """ONNX Runtime CPU 推論 (需要安裝 onnxruntime)"""
+
+    name = 'onnx'
+
+    def __init__(self, model: nn.Module, device: torch.device, path: Path = None,
+                 fingerprint: Optional[Dict] = None):
+        import onnxruntime as ort
+
+        path = Path(path or config.ONNX_MODEL_PATH)
+        if not export_is_current(path, fingerprint):
+            if path.exists():
+                print(f"⚠️  ONNX 匯出檔與目前 checkpoint 不符，重新匯出: {path}")
+            export_onnx(model, path, fingerprint)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.device = torch.device('cpu')
+        print(f"✅ 載入 ONNX 模型: {path}")
+
+    def __call__(self, x: torch.Tensor) -> BackendOutput:
+        outputs = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})
+        return tuple(torch.from_numpy(o) for o in outputs)
+
+
+def export_torchscript(model: nn.Module, device: torch.device, path: Path = None,
+                       fingerprint: Optional[Dict] = None):
+    """
+    Trace 並 freeze 模型，指定 path 時同時存檔
+
+    Args:
+        fingerprint: 來源 checkpoint 的識別資訊 (見 checkpoint_fingerprint)，存在匯出檔旁供載入時比對
+    """
+    wrapper = InferenceWrapper(model).to(device).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, _example_input(2).to(device))
+        frozen = torch.jit.freeze(traced)
+    if path is not None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(f"{path}.tmp{os.getpid()}")
+        frozen.save(str(tmp_path))
+        os.replace(tmp_path, path)
+        _write_fingerprint(path, fingerprint)
+        print(f"💾 TorchScript 模型已匯出: {path}")
+    return frozen
+
+
+def export_onnx(model: nn.Module, path: Path, fingerprint: Optional[Dict] = None):
+    """
+    匯出 ONNX (batch 維度為動態)
+
+    Args:
+        fingerprint: 來源 checkpoint 的識別資訊 (見 checkpoint_fingerprint)，存在匯出檔旁供載入時比對
+    """
+    wrapper = InferenceWrapper(model).to('cpu').eval()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(f"{path}.tmp{os.getpid()}")
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, _example_input(2), str(tmp_path),
+            input_names=['image'],
+            output_names=['category_logits', 'attribute_logits', 'embedding'],
+            dynamic_axes={name: {0: 'batch'} for name in ('image', 'category_logits', 'attribute_logits', 'embedding')},
+            opset_version=18
+        )
+    os.replace(tmp_path, path)
+    _write_fingerprint(path, fingerprint)
+    print(f"💾 ONNX 模型已匯出: {path}")
+
+
+def create_backend(model: nn.Module, name: str, device: torch.device, fingerprint: Optional[Dict] = None):
+    """
+    建立推論後端，失敗時 (例如未安裝 onnxruntime) 退回 eager
+
+    Args:
+        model: 已載入權重並設為 eval 的 FashionMultiTaskModel
+        name: 'eager' / 'torchscript' / 'int8' / 'onnx'
+        device: 推論裝置
+        fingerprint: model 權重來源 checkpoint 的識別資訊；匯出檔不是來自此 checkpoint 時重新匯出
+    """
+    if name not in BACKENDS:
+        print(f"⚠️  不支援的推論後端: {name}，改用 eager")
+        name = 'eager'
+
+    try:
+        if name == 'torchscript':
+            return TorchScriptBackend(model, device, config.TORCHSCRIPT_MODEL_PATH, fingerprint)
+        if name == 'int8':
+            return Int8Backend(model, device)
+        if name == 'onnx':
+            return OnnxBackend(model, device, config.ONNX_MODEL_PATH, fingerprint)
+    except Exception as e:
+        print(f"⚠️  建立 {name} 推論後端失敗 ({e})，改用 eager")
+
+    return EagerBackend(model, device)
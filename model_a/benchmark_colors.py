@@ -0,0 +1,92 @@
+"""
+顏色模組效能測試
+比較原本 cv2.kmeans 主色調提取 / 逐一計算距離的命名方式 與 新版直方圖量化 / 查表命名
+
+執行: python -m model_a.benchmark_colors [圖片路徑 ...]
+"""
+
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+try:
+    from . import colors as color_utils
+except ImportError:
+    import colors as color_utils
+
+
+def legacy_color_name(rgb) -> str:
+    """原本 ModelAAdapter._get_color_name 的作法: 對調色盤逐一計算 RGB 歐氏距離"""
+    r, g, b = rgb
+    min_dist = float('inf')
+    closest_name = "其他"
+    for name, (cr, cg, cb) in color_utils.COLOR_PALETTE.items():
+        dist = ((r - cr)**2 + (g - cg)**2 + (b - cb)**2) ** 0.5
+        if dist < min_dist:
+            min_dist = dist
+            closest_name = name
+    return closest_name
+
+
+def make_synthetic_image(seed: int, size: int = 800) -> np.ndarray:
+    """產生模擬衣物照片: 淺色背景 + 主色塊 + 雜訊"""
+    rng = np.random.default_rng(seed)
+    image = np.full((size, size, 3), 245, dtype=np.float64)
+    main = rng.integers(0, 256, 3)
+    accent = rng.integers(0, 256, 3)
+    image[size // 6: size * 5 // 6, size // 4: size * 3 // 4] = main
+    image[size // 3: size // 2, size // 3: size * 2 // 3] = accent
+    image += rng.normal(0, 12, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def time_it(func, inputs, repeat: int = 3) -> float:
+    """回傳每次呼叫的平均毫秒數 (取多輪中最快的一輪)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in inputs:
+            func(x)
+        best = min(best, (time.perf_counter() - start) / len(inputs))
+    return best * 1000
+
+
+# ==================== 主程式 ====================
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        images = [np.asarray(Image.open(path).convert('RGB')) for path in sys.argv[1:]]
+        print(f"🖼️  使用 {len(images)} 張指定圖片")
+    else:
+        images = [make_synthetic_image(seed) for seed in range(20)]
+        print(f"🖼️  使用 {len(images)} 張合成圖片 (800x800)")
+
+    print("\n【主色調提取】")
+    legacy_ms = time_it(color_utils.extract_dominant_colors_kmeans, images)
+    fast_ms = time_it(color_utils.extract_dominant_colors, images)
+    print(f"  cv2.kmeans (10 attempts): {legacy_ms:8.2f} ms / 張")
+    print(f"  直方圖量化 + 加權 K-Means: {fast_ms:8.2f} ms / 張  (加速 {legacy_ms / fast_ms:.1f}x)")
+
+    # 結果比較: 新版每個主色與舊版最接近主色的 RGB 距離
+    diffs = []
+    for image in images:
+        legacy = np.array([c['rgb'] for c in color_utils.extract_dominant_colors_kmeans(image)])
+        fast = np.array([c['rgb'] for c in color_utils.extract_dominant_colors(image)])
+        if len(legacy) and len(fast):
+            dist = np.linalg.norm(fast[:, None, :] - legacy[None, :, :], axis=-1)
+            diffs.extend(dist.min(axis=1).tolist())
+    if diffs:
+        print(f"  主色與舊版最接近主色的平均 RGB 距離: {np.mean(diffs):.1f}")
+
+    print("\n【顏色命名】")
+    rng = np.random.default_rng(0)
+    samples = [tuple(int(v) for v in c) for c in rng.integers(0, 256, (20000, 3))]
+    color_utils.get_color_name(samples[0])  # 先建好查表
+    legacy_us = time_it(legacy_color_name, samples) * 1000
+    lut_us = time_it(color_utils.get_color_name, samples) * 1000
+    print(f"  逐一計算距離 (RGB):  {legacy_us:8.2f} µs / 次")
+    print(f"  Lab 查表:            {lut_us:8.2f} µs / 次  (加速 {legacy_us / lut_us:.1f}x)")
+
+    start = time.perf_counter()
+    color_utils._build_color_lut()
+    print(f"  建表耗時: {(time.perf_counter() - start) * 1000:.1f} ms (每個行程只需一次)")
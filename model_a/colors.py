@@ -0,0 +1,241 @@
+"""
+顏色處理模組
+快速主色調提取 (直方圖量化 + 有限次數的加權 K-Means) 與 CIELAB 顏色名稱查表
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple
+
+# ==================== 主色調設定 ====================
+# 取樣邊長 (與原本 resize 150x150 相同的取樣密度)
+SAMPLE_SIZE = 150
+
+# 直方圖量化位元數: 每個通道保留 4 bits -> 16^3 = 4096 個 bin
+QUANT_BITS = 4
+
+# 在 bin 上做加權 K-Means 的最大迭代次數
+MAX_ITERATIONS = 10
+
+# ==================== 顏色名稱設定 ====================
+# 基本顏色中心點 (RGB)
+COLOR_PALETTE = {
+    "黑色": (0, 0, 0),
+    "白色": (255, 255, 255),
+    "灰色": (128, 128, 128),
+    "紅色": (255, 0, 0),
+    "橘色": (255, 165, 0),
+    "黃色": (255, 255, 0),
+    "綠色": (0, 128, 0),
+    "藍色": (0, 0, 255),
+    "紫色": (128, 0, 128),
+    "粉紅": (255, 192, 203),
+    "棕色": (165, 42, 42),
+    "米色": (245, 245, 220),
+    "卡其": (240, 230, 140),
+    "深藍": (0, 0, 139),
+}
+
+# 查表精度: 每個通道 5 bits -> 32^3 = 32768 格
+LUT_BITS = 5
+
+_PALETTE_NAMES = list(COLOR_PALETTE.keys())
+_color_lut = None
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    sRGB (0-255) 轉 CIELAB (D65)
+
+    Args:
+        rgb: [..., 3] 陣列
+
+    Returns:
+        [..., 3] 的 L*a*b* 陣列
+    """
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+
+    m = np.array([
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ])
+    xyz = c @ m.T / np.array([0.95047, 1.0, 1.08883])
+
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    L = 116 * f[..., 1] - 16
+    a = 500 * (f[..., 0] - f[..., 1])
+    b = 200 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+def _build_color_lut() -> np.ndarray:
+    """預先計算每個量化 RGB 格子在 Lab 空間中最近的調色盤顏色"""
+    levels = 1 << LUT_BITS
+    step = 256 // levels
+    centers = np.arange(levels) * step + step // 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    grid_lab = rgb_to_lab(grid)
+    palette_lab = rgb_to_lab(np.array(list(COLOR_PALETTE.values())))
+    dist = ((grid_lab[:, None, :] - palette_lab[None, :, :]) ** 2).sum(axis=-1)
+    return dist.argmin(axis=1).astype(np.uint8).reshape(levels, levels, levels)
+
+
+def get_color_name(rgb) -> str:
+    """
+    RGB 轉中文顏色名稱 (查表，O(1))
+
+    Args:
+        rgb: (r, g, b) 0-255
+    """
+    global _color_lut
+    if _color_lut is None:
+        _color_lut = _build_color_lut()
+
+    shift = 8 - LUT_BITS
+    r, g, b = (int(v) >> shift for v in rgb)
+    return _PALETTE_NAMES[_color_lut[r, g, b]]
+
+
+def hex_to_rgb(hex_code: str) -> Tuple[int, int, int]:
+    h = hex_code.lstrip('#')
+    return tuple(int(h[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def extract_dominant_colors(image: np.ndarray, n_colors: int = 3) -> List[Dict]:
+    """
+    提取主色調 (直方圖量化 + 加權 K-Means)
+
+    先把像素量化到 4096 個 bin，再只對非空的 bin (以像素數為權重) 做固定次數的 K-Means，
+    計算量與圖片大小無關，且結果可重現 (不使用隨機初始化)。
+
+    Args:
+        image: RGB ndarray [H, W, 3]
+        n_colors: 提取顏色數量
+
+    Returns:
+        list: [{rgb, hex, percentage}, ...]
+    """
+    # 等距取樣 (取代 resize)
+    h, w = image.shape[:2]
+    sample = image[::max(1, h // SAMPLE_SIZE), ::max(1, w // SAMPLE_SIZE), :3].reshape(-1, 3)
+    if sample.size == 0:
+        return []
+
+    # 直方圖量化
+    shift = 8 - QUANT_BITS
+    q = sample.astype(np.int32) >> shift
+    bins = (q[:, 0] << (2 * QUANT_BITS)) | (q[:, 1] << QUANT_BITS) | q[:, 2]
+    n_bins = 1 << (3 * QUANT_BITS)
+
+    counts = np.bincount(bins, minlength=n_bins)
+    sums = np.stack([np.bincount(bins, weights=sample[:, c], minlength=n_bins) for c in range(3)], axis=1)
+
+    occupied = counts > 0
+    weights = counts[occupied].astype(np.float64)
+    points = sums[occupied] / weights[:, None]  # 每個 bin 內的平均顏色
+
+    k = min(n_colors, len(points))
+    centers = _init_centers(points, weights, k)
+
+    # 加權 K-Means (有限次數)
+    labels = None
+    for _ in range(MAX_ITERATIONS):
+        dist = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+        new_labels = dist.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        cluster_weights = np.bincount(labels, weights=weights, minlength=k)
+        for c in range(3):
+            moved = np.bincount(labels, weights=weights * points[:, c], minlength=k)
+            nonempty = cluster_weights > 0
+            centers[nonempty, c] = moved[nonempty] / cluster_weights[nonempty]
+
+    cluster_weights = np.bincount(labels, weights=weights, minlength=k)
+    percentages = cluster_weights / weights.sum()
+    colors = np.clip(centers, 0, 255).astype(int)  # 與原本 cv2 版本相同，直接截斷小數
+    return format_dominant_colors(colors, percentages, n_colors)
+
+
+def _init_centers(points: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    """決定性的 K-Means++ 初始化: 先取最大的 bin，之後取「權重 x 距離平方」最大的 bin"""
+    centers = [points[weights.argmax()]]
+    min_dist = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        idx = (weights * min_dist).argmax()
+        centers.append(points[idx])
+        min_dist = np.minimum(min_dist, ((points - points[idx]) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float64)
+
+
+def format_dominant_colors(colors: np.ndarray, percentages: np.ndarray, n_colors: int) -> List[Dict]:
+    """
+    依比例排序並過濾背景色
+
+    Args:
+        colors: [K, 3] RGB (int)
+        percentages: [K] 每個顏色佔比
+        n_colors: 最多回傳幾個
+    """
+    # 按比例排序
+    sorted_indices = np.argsort(percentages)[::-1]
+
+    dominant_colors = []
+    for idx in sorted_indices:
+        rgb = colors[idx].tolist()
+        hex_color = '#{:02x}{:02x}{:02x}'.format(*rgb)
+
+        # 簡單的背景過濾: 如果顏色過於接近純白 (sum > 700) 或純黑 (sum < 30) 且佔比 > 30%
+        # 視為背景剔除 (除非只剩這個顏色)
+        color_sum = sum(rgb)
+        if (color_sum > 700 or color_sum < 30) and percentages[idx] > 0.3:
+            if len(sorted_indices) > 1 and len(dominant_colors) == 0:
+                continue  # 跳過背景色
+
+        dominant_colors.append({
+            'rgb': rgb,
+            'hex': hex_color,
+            'percentage': float(percentages[idx])
+        })
+
+        if len(dominant_colors) >= n_colors:
+            break
+
+    # 萬一全部都被過濾光了(極端情況)，退回到原始的第一名
+    if not dominant_colors and len(sorted_indices) > 0:
+        idx = sorted_indices[0]
+        rgb = colors[idx].tolist()
+        return [{
+            'rgb': rgb,
+            'hex': '#{:02x}{:02x}{:02x}'.format(*rgb),
+            'percentage': float(percentages[idx])
+        }]
+
+    return dominant_colors
+
+
+def extract_dominant_colors_kmeans(image: np.ndarray, n_colors: int = 3) -> List[Dict]:
+    """
+    原本的 OpenCV K-Means 主色調提取 (150x150, 10 次隨機初始化)
+    保留作為效能比較基準
+    """
+    import cv2
+
+    # 調整大小以加速
+    image = cv2.resize(image, (150, 150))
+
+    # 重塑為像素列表 (float32)
+    pixels = image.reshape(-1, 3).astype(np.float32)
+
+    # 使用 OpenCV 的 K-Means
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    flags = cv2.KMEANS_RANDOM_CENTERS
+    _, labels, centers = cv2.kmeans(pixels, n_colors, None, criteria, 10, flags)
+
+    # 計算每個顏色的比例
+    counts = np.bincount(labels.flatten(), minlength=n_colors)
+    percentages = counts / len(labels)
+
+    return format_dominant_colors(centers.astype(int), percentages, n_colors)
@@ -18,9 +18,12 @@ CHECKPOINT_DIR = OUTPUT_DIR / "checkpoints"
 LOG_DIR = OUTPUT_DIR / "logs"
 RESULT_DIR = OUTPUT_DIR / "results"
 
-# 創建輸出目錄
-for dir_path in [OUTPUT_DIR, CHECKPOINT_DIR, LOG_DIR, RESULT_DIR]:
-    dir_path.mkdir(parents=True, exist_ok=True)
+
+def ensure_output_dirs():
+    """創建輸出目錄 (由需要寫檔的腳本呼叫，import 時不做任何檔案系統操作)"""
+    for dir_path in [OUTPUT_DIR, CHECKPOINT_DIR, LOG_DIR, RESULT_DIR, EXPORT_DIR]:
+        dir_path.mkdir(parents=True, exist_ok=True)
+
 
 # ==================== 資料集設定 ====================
 # 類別數量 (50 個服飾類別)
@@ -160,6 +163,22 @@ ATTRIBUTE_THRESHOLD = 0.5
 # 是否使用 TTA (Test Time Augmentation)
 USE_TTA = False
 
+# 批次推論時單次 forward 的最大圖片數 (避免一次塞太多張吃光記憶體)
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("MODEL_A_MAX_BATCH_SIZE", "8"))
+
+# 推論後端: 'eager' (fp32 PyTorch) / 'torchscript' / 'int8' (動態量化) / 'onnx' (需 onnxruntime)
+INFERENCE_BACKEND = os.getenv("MODEL_A_BACKEND", "eager")
+
+# 匯出模型路徑 (由 python -m model_a.export 產生，更換 checkpoint 後需重新匯出)
+EXPORT_DIR = OUTPUT_DIR / "export"
+TORCHSCRIPT_MODEL_PATH = EXPORT_DIR / "model_a.torchscript.pt"
+ONNX_MODEL_PATH = EXPORT_DIR / "model_a.onnx"
+
+# 後端一致性檢查容許誤差 (與 eager 比較)
+PARITY_PROB_ATOL = 0.05          # 類別 / 屬性機率的最大絕對誤差
+PARITY_MIN_TOP1_AGREEMENT = 0.98  # 類別 Top-1 一致比例下限
+PARITY_MIN_ATTR_AGREEMENT = 0.98  # 屬性預測 (閾值後) 一致比例下限
+
 # ==================== 顏色提取設定 ====================
 # 使用 K-Means 提取主色調
 NUM_DOMINANT_COLORS = 3
@@ -174,10 +193,14 @@ STYLE_MAPPING = {
     'vintage': ['floral', 'pleated'],
 }
 
-print(f"✅ 配置載入完成")
-print(f"📂 資料目錄: {DATA_DIR}")
-print(f"📂 輸出目錄: {OUTPUT_DIR}")
-print(f"🎯 類別數量: {NUM_CATEGORIES}")
-print(f"🎯 屬性數量: {NUM_ATTRIBUTES}")
-print(f"🖼️  圖片尺寸: {IMG_SIZE}x{IMG_SIZE}")
-print(f"🔧 Backbone: {BACKBONE}")
+
+
+def print_config():
+    """印出主要設定 (供訓練 / 推論腳本使用)"""
+    print(f"✅ 配置載入完成")
+    print(f"📂 資料目錄: {DATA_DIR}")
+    print(f"📂 輸出目錄: {OUTPUT_DIR}")
+    print(f"🎯 類別數量: {NUM_CATEGORIES}")
+    print(f"🎯 屬性數量: {NUM_ATTRIBUTES}")
+    print(f"🖼️  圖片尺寸: {IMG_SIZE}x{IMG_SIZE}")
+    print(f"🔧 Backbone: {BACKBONE}")
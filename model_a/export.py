@@ -0,0 +1,138 @@
+"""
+Model A 匯出與後端一致性檢查
+
+匯出 TorchScript / ONNX 模型，並與 eager 模型比較類別 Top-1 與屬性預測是否一致
+
+用法:
+    python -m model_a.export                         # 匯出 torchscript + onnx 並檢查一致性
+    python -m model_a.export --format onnx           # 只匯出 onnx
+    python -m model_a.export --check-only            # 不匯出，只檢查所有後端
+
+固定圖片輸入的一致性測試見 tests/test_model_a_backends.py
+"""
+
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+import torch
+
+try:
+    from . import config
+    from .backends import BACKENDS, EagerBackend, create_backend, export_onnx, export_torchscript
+    from .inference import FashionPredictor
+except ImportError:
+    import config
+    from backends import BACKENDS, EagerBackend, create_backend, export_onnx, export_torchscript
+    from inference import FashionPredictor
+
+
+def _predict(backend, x: torch.Tensor) -> Dict[str, torch.Tensor]:
+    with torch.no_grad():
+        category_logits, attribute_logits, _ = backend(x)
+        return {
+            'category_probs': torch.softmax(category_logits.float().cpu(), dim=1),
+            'attribute_probs': torch.sigmoid(attribute_logits.float().cpu()),
+        }
+
+
+def check_parity(model: torch.nn.Module, backend, num_samples: int = 64, batch_size: int = 8, seed: int = 0,
+                 inputs: Optional[torch.Tensor] = None) -> Dict:
+    """
+    比較指定後端與 eager 模型的輸出
+
+    Args:
+        model: 已載入權重的 FashionMultiTaskModel
+        backend: 要檢查的推論後端
+        num_samples: 隨機輸入張數 (有 inputs 時忽略)
+        batch_size: 每批張數
+        inputs: 已前處理的圖片 [N, 3, H, W]；None 則使用隨機雜訊
+
+    Returns:
+        dict: {top1_agreement, attr_agreement, max_prob_diff, passed}
+    """
+    reference = EagerBackend(model, torch.device('cpu'))
+    generator = torch.Generator().manual_seed(seed)
+    if inputs is not None:
+        num_samples = len(inputs)
+
+    top1_match = attr_match = attr_total = 0
+    max_prob_diff = 0.0
+    for start in range(0, num_samples, batch_size):
+        n = min(batch_size, num_samples - start)
+        if inputs is not None:
+            x = inputs[start:start + n]
+        else:
+            x = torch.randn(n, 3, config.IMG_SIZE, config.IMG_SIZE, generator=generator)
+
+        ref = _predict(reference, x)
+        out = _predict(backend, x)
+
+        top1_match += int((ref['category_probs'].argmax(1) == out['category_probs'].argmax(1)).sum())
+        ref_attr = ref['attribute_probs'] > config.ATTRIBUTE_THRESHOLD
+        out_attr = out['attribute_probs'] > config.ATTRIBUTE_THRESHOLD
+        attr_match += int((ref_attr == out_attr).sum())
+        attr_total += ref_attr.numel()
+
+        max_prob_diff = max(
+            max_prob_diff,
+            float((ref['category_probs'] - out['category_probs']).abs().max()),
+            float((ref['attribute_probs'] - out['attribute_probs']).abs().max())
+        )
+
+    top1_agreement = top1_match / num_samples
+    attr_agreement = attr_match / attr_total
+    return {
+        'top1_agreement': top1_agreement,
+        'attr_agreement': attr_agreement,
+        'max_prob_diff': max_prob_diff,
+        'passed': (
+            top1_agreement >= config.PARITY_MIN_TOP1_AGREEMENT
+            and attr_agreement >= config.PARITY_MIN_ATTR_AGREEMENT
+            and max_prob_diff <= config.PARITY_PROB_ATOL
+        )
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Model A 匯出與後端一致性檢查")
+    parser.add_argument('--checkpoint', default=None, help="檢查點路徑 (預設 best.pth)")
+    parser.add_argument('--format', nargs='+', choices=['torchscript', 'onnx'], default=['torchscript', 'onnx'])
+    parser.add_argument('--check-only', action='store_true', help="不匯出，只做一致性檢查")
+    parser.add_argument('--samples', type=int, default=64, help="一致性檢查的隨機輸入張數")
+    args = parser.parse_args(argv)
+
+    # 一律在 CPU 上匯出與比較 (正式環境為 CPU 主機)
+    predictor = FashionPredictor(args.checkpoint, backend='eager')
+    model = predictor.model.to('cpu').eval()
+    cpu = torch.device('cpu')
+    fingerprint = predictor.checkpoint_fingerprint
+
+    if not args.check_only:
+        if 'torchscript' in args.format:
+            export_torchscript(model, cpu, config.TORCHSCRIPT_MODEL_PATH, fingerprint)
+        if 'onnx' in args.format:
+            export_onnx(model, config.ONNX_MODEL_PATH, fingerprint)
+
+    print("\n【後端一致性檢查】(與 eager 比較)")
+    all_passed = True
+    for name in BACKENDS:
+        if name == 'eager':
+            continue
+        backend = create_backend(model, name, cpu, fingerprint)
+        if backend.name != name:
+            print(f"  ⏭️  {name:12s} 無法建立，略過")
+            continue
+
+        result = check_parity(model, backend, num_samples=args.samples)
+        mark = '✅' if result['passed'] else '❌'
+        print(f"  {mark} {name:12s} Top-1 一致 {result['top1_agreement']*100:6.2f}% | "
+              f"屬性一致 {result['attr_agreement']*100:6.2f}% | 最大機率誤差 {result['max_prob_diff']:.4f}")
+        all_passed = all_passed and result['passed']
+
+    return 0 if all_passed else 1
+
+
+# ==================== 主程式 ====================
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,34 +8,45 @@ import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
 from pathlib import Path
-from typing import Dict, List
-import cv2
+from typing import Dict, List, Union
+import io
 
 try:
     from . import config
+    from . import colors as color_utils
+    from .backends import checkpoint_fingerprint, create_backend
     from .model import FashionMultiTaskModel
 except ImportError:
     import config
+    import colors as color_utils
+    from backends import checkpoint_fingerprint, create_backend
     from model import FashionMultiTaskModel
 
+# 推論可接受的圖片輸入: 路徑 / bytes / PIL Image / RGB ndarray
+ImageSource = Union[str, Path, bytes, Image.Image, np.ndarray]
+
 
 class FashionPredictor:
     """服飾預測器"""
     
-    def __init__(self, checkpoint_path: str = None):
+    def __init__(self, checkpoint_path: str = None, backend: str = None):
         """
         Args:
             checkpoint_path: 模型檢查點路徑 (None 則使用 best.pth)
+            backend: 推論後端 (None 則使用 config.INFERENCE_BACKEND)
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
-        # 載入模型
-        self.model = FashionMultiTaskModel().to(self.device)
-        
         if checkpoint_path is None:
             checkpoint_path = config.CHECKPOINT_DIR / 'best.pth'
+        has_checkpoint = Path(checkpoint_path).exists()
+        
+        # 載入模型 (有 checkpoint 時權重會被覆蓋，不需下載 ImageNet 預訓練權重)
+        self.model = FashionMultiTaskModel(
+            pretrained=not has_checkpoint, allow_random_fallback=True
+        ).to(self.device)
         
-        if Path(checkpoint_path).exists():
+        if has_checkpoint:
             checkpoint = torch.load(checkpoint_path, map_location=self.device, weights_only=False)
             self.model.load_state_dict(checkpoint['model_state_dict'])
             print(f"✅ 載入模型: {checkpoint_path}")
@@ -45,6 +56,13 @@ class FashionPredictor:
         
         self.model.eval()
         
+        # 推論後端 (eager / torchscript / int8 / onnx)
+        self.checkpoint_fingerprint = checkpoint_fingerprint(checkpoint_path) if has_checkpoint else None
+        self.backend = create_backend(
+            self.model, backend or config.INFERENCE_BACKEND, self.device, self.checkpoint_fingerprint
+        )
+        print(f"🔧 推論後端: {self.backend.name}")
+        
         # 圖片轉換
         self.transform = transforms.Compose([
             transforms.Resize((config.IMG_SIZE, config.IMG_SIZE)),
@@ -52,30 +70,132 @@ class FashionPredictor:
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
         ])
     
-    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+    @staticmethod
+    def load_image(source: ImageSource) -> Image.Image:
+        """
+        將各種輸入解碼成 RGB PIL Image (整個推論流程只解碼這一次)
+        
+        Args:
+            source: 圖片路徑 / 圖片 bytes / PIL Image / RGB ndarray [H, W, 3]
+        """
+        if isinstance(source, Image.Image):
+            return source if source.mode == 'RGB' else source.convert('RGB')
+        if isinstance(source, np.ndarray):
+            return Image.fromarray(source.astype(np.uint8, copy=False)).convert('RGB')
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return Image.open(io.BytesIO(source)).convert('RGB')
+        return Image.open(source).convert('RGB')
+    
+    def predict(self, image: ImageSource, top_k: int = 3) -> Dict:
         """
         預測單張圖片
         
         Args:
-            image_path: 圖片路徑
+            image: 圖片路徑 / 圖片 bytes / PIL Image / RGB ndarray
             top_k: 返回 Top-K 類別
         
         Returns:
             dict: 預測結果
         """
-        # 載入圖片
-        image = Image.open(image_path).convert('RGB')
-        original_size = image.size
+        return self.predict_batch([image], top_k=top_k)[0]
+    
+    def predict_batch(self, images: List[ImageSource], top_k: int = 3, max_batch_size: int = None) -> List[Dict]:
+        """
+        批次預測多張圖片 (堆疊成 [N,3,H,W] 一次 forward)
         
-        # 轉換
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        Args:
+            images: 圖片列表 (路徑 / bytes / PIL Image / RGB ndarray 皆可)
+            top_k: 返回 Top-K 類別
+            max_batch_size: 單次 forward 最多幾張 (None 則使用 config.INFERENCE_MAX_BATCH_SIZE)
         
-        # 預測
-        with torch.no_grad():
-            pred = self.model.predict(image_tensor, threshold=config.ATTRIBUTE_THRESHOLD)
+        Returns:
+            list: 與輸入順序相同的預測結果
+        """
+        if max_batch_size is None:
+            max_batch_size = config.INFERENCE_MAX_BATCH_SIZE
+        max_batch_size = max(1, int(max_batch_size))
         
+        results = []
+        for start in range(0, len(images), max_batch_size):
+            chunk = images[start:start + max_batch_size]
+            
+            # 解碼一次，之後 transform 與顏色提取共用同一份像素
+            decoded = [self.load_image(source) for source in chunk]
+            
+            # 轉換並堆疊
+            batch_tensor = torch.stack([self.transform(image) for image in decoded])
+            
+            # 預測
+            pred = self.run_model(batch_tensor)
+            
+            category_probs = pred['category_probs'].cpu().numpy()
+            attribute_probs = pred['attribute_probs'].cpu().numpy()
+            attribute_pred = pred['attribute_pred'].cpu().numpy()
+            embeddings = pred['embedding'].cpu().numpy()
+            
+            for i, (source, image) in enumerate(zip(chunk, decoded)):
+                image_path = source if isinstance(source, (str, Path)) else None
+                results.append(self._build_result(
+                    image_path, image, category_probs[i], attribute_probs[i],
+                    attribute_pred[i], embeddings[i], top_k
+                ))
+        
+        return results
+
+    def embed_batch(self, images: List[ImageSource], max_batch_size: int = None) -> np.ndarray:
+        """
+        批次計算 embedding (只做 forward，不提取顏色與標籤)
+
+        Args:
+            images: 圖片列表 (路徑 / bytes / PIL Image / RGB ndarray 皆可)
+            max_batch_size: 單次 forward 最多幾張 (None 則使用 config.INFERENCE_MAX_BATCH_SIZE)
+
+        Returns:
+            np.ndarray: [N, D] float32，與輸入順序相同
+        """
+        if max_batch_size is None:
+            max_batch_size = config.INFERENCE_MAX_BATCH_SIZE
+        max_batch_size = max(1, int(max_batch_size))
+
+        chunks = []
+        for start in range(0, len(images), max_batch_size):
+            chunk = images[start:start + max_batch_size]
+            batch_tensor = torch.stack([self.transform(self.load_image(source)) for source in chunk])
+            chunks.append(self.run_model(batch_tensor)['embedding'].cpu().numpy().astype(np.float32))
+
+        return np.concatenate(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+
+    def warmup(self, batch_size: int = 1):
+        """以假資料跑一次 forward (與顏色查表)，讓第一次真正推論不必負擔初始化成本"""
+        dummy = torch.zeros(batch_size, 3, config.IMG_SIZE, config.IMG_SIZE)
+        self.run_model(dummy)
+        color_utils.get_color_name((0, 0, 0))
+    
+    def run_model(self, batch_tensor: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """
+        透過目前的推論後端執行 forward (輸出格式同 FashionMultiTaskModel.predict)
+        
+        Args:
+            batch_tensor: [B, 3, H, W]
+        """
+        with torch.no_grad():
+            category_logits, attribute_logits, embedding = self.backend(batch_tensor)
+            
+            category_probs = torch.softmax(category_logits, dim=1)
+            attribute_probs = torch.sigmoid(attribute_logits)
+            
+            return {
+                'category_probs': category_probs,
+                'category_pred': torch.argmax(category_probs, dim=1),
+                'attribute_probs': attribute_probs,
+                'attribute_pred': (attribute_probs > config.ATTRIBUTE_THRESHOLD).float(),
+                'embedding': embedding
+            }
+    
+    def _build_result(self, image_path, image: Image.Image, category_probs, attribute_probs,
+                      attribute_pred, embedding, top_k: int) -> Dict:
+        """將單張圖片的模型輸出整理成預測結果"""
         # 類別預測
-        category_probs = pred['category_probs'][0].cpu().numpy()
         top_k_indices = np.argsort(category_probs)[-top_k:][::-1]
         
         top_k_categories = []
@@ -87,9 +207,6 @@ class FashionPredictor:
             })
         
         # 屬性預測
-        attribute_probs = pred['attribute_probs'][0].cpu().numpy()
-        attribute_pred = pred['attribute_pred'][0].cpu().numpy()
-        
         active_attributes = []
         for i, is_active in enumerate(attribute_pred):
             if is_active:
@@ -99,18 +216,15 @@ class FashionPredictor:
                     'index': int(i)
                 })
         
-        # Embedding
-        embedding = pred['embedding'][0].cpu().numpy()
-        
-        # 提取主色調
-        dominant_colors = self.extract_dominant_colors(image_path)
+        # 提取主色調 (直接使用已解碼的像素，不再重新讀檔)
+        dominant_colors = self.extract_dominant_colors(np.asarray(image))
         
         # 推斷風格標籤
         style_tags = self.infer_style_tags(active_attributes)
         
         result = {
-            'image_path': str(image_path),
-            'image_size': original_size,
+            'image_path': str(image_path) if image_path is not None else None,
+            'image_size': image.size,
             'category': {
                 'top_1': top_k_categories[0],
                 'top_k': top_k_categories
@@ -124,82 +238,26 @@ class FashionPredictor:
         
         return result
     
-    def extract_dominant_colors(self, image_path: str, n_colors: int = 3) -> List[Dict]:
+    def extract_dominant_colors(self, image: ImageSource, n_colors: int = 3) -> List[Dict]:
         """
-        提取主色調 (使用 K-Means)
+        提取主色調 (使用直方圖量化 + 加權 K-Means，見 colors.py)
         
         Args:
-            image_path: 圖片路徑
+            image: RGB ndarray [H, W, 3] (建議，免重新解碼) 或圖片路徑 / bytes / PIL Image
             n_colors: 提取顏色數量
         
         Returns:
             list: [{rgb, hex, percentage}, ...]
         """
-        # 讀取圖片 (支援中文路徑)
-        # cv2.imread 不支援中文路徑, 改用 imdecode
-        img_array = np.fromfile(str(image_path), dtype=np.uint8)
-        image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            print(f"❌ 無法讀取圖片: {image_path}")
-            return []
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 調整大小以加速
-        image = cv2.resize(image, (150, 150))
-        
-        # 重塑為像素列表 (float32)
-        pixels = image.reshape(-1, 3).astype(np.float32)
-        
-        # 使用 OpenCV 的 K-Means
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-        flags = cv2.KMEANS_RANDOM_CENTERS
-        _, labels, centers = cv2.kmeans(pixels, n_colors, None, criteria, 10, flags)
-        
-        # 獲取顏色 (轉回 uint8)
-        colors = centers.astype(int)
-        labels = labels.flatten()
-        
-        # 計算每個顏色的比例
-        # labels 是 [0, 1, 2, 0, ...]
-        counts = np.bincount(labels)
-        percentages = counts / len(labels)
-        
-        # 按比例排序
-        sorted_indices = np.argsort(percentages)[::-1]
-        
-        dominant_colors = []
-        for idx in sorted_indices:
-            rgb = colors[idx].tolist()
-            hex_color = '#{:02x}{:02x}{:02x}'.format(*rgb)
-            
-            # 簡單的背景過濾: 如果顏色過於接近純白 (sum > 700) 或純黑 (sum < 30) 且佔比 > 30%
-            # 視為背景剔除 (除非只剩這個顏色)
-            color_sum = sum(rgb)
-            if (color_sum > 700 or color_sum < 30) and percentages[idx] > 0.3:
-                if len(sorted_indices) > 1 and len(dominant_colors) == 0:
-                    continue  # 跳過背景色
-            
-            dominant_colors.append({
-                'rgb': rgb,
-                'hex': hex_color,
-                'percentage': float(percentages[idx])
-            })
-            
-            if len(dominant_colors) >= n_colors:
-                break
-        
-        # 萬一全部都被過濾光了(極端情況)，退回到原始的第一名
-        if not dominant_colors and len(sorted_indices) > 0:
-            idx = sorted_indices[0]
-            rgb = colors[idx].tolist()
-            return [{
-                'rgb': rgb,
-                'hex': '#{:02x}{:02x}{:02x}'.format(*rgb),
-                'percentage': float(percentages[idx])
-            }]
-        
-        return dominant_colors
+        if not isinstance(image, np.ndarray):
+            try:
+                image = np.asarray(self.load_image(image))
+            except Exception as e:
+                print(f"❌ 無法讀取圖片: {e}")
+                return []
+        
+        # 直方圖量化 + 加權 K-Means (取代每次 10 組隨機初始化的 cv2.kmeans)
+        return color_utils.extract_dominant_colors(image, n_colors)
     
     def infer_style_tags(self, active_attributes: List[Dict]) -> List[str]:
         """
@@ -260,6 +318,9 @@ class FashionPredictor:
 if __name__ == '__main__':
     import sys
     
+    config.print_config()
+    config.ensure_output_dirs()
+    
     # 創建預測器
     predictor = FashionPredictor()
     
@@ -7,6 +7,7 @@ import torch
 import torch.nn as nn
 import torchvision.models as models
 from typing import Dict, Tuple
+from urllib.error import URLError
 try:
     from . import config
 except ImportError:
@@ -22,7 +23,8 @@ class FashionMultiTaskModel(nn.Module):
         num_attributes: int = config.NUM_ATTRIBUTES,
         embedding_dim: int = config.EMBEDDING_DIM,
         backbone: str = config.BACKBONE,
-        pretrained: bool = True
+        pretrained: bool = True,
+        allow_random_fallback: bool = False
     ):
         """
         Args:
@@ -31,6 +33,8 @@ class FashionMultiTaskModel(nn.Module):
             embedding_dim: Embedding 維度 (512)
             backbone: 預訓練模型名稱
             pretrained: 是否使用預訓練權重
+            allow_random_fallback: 預訓練權重下載失敗 (網路 / 檔案錯誤) 時改用隨機初始化；
+                只適合推論 (權重會被 checkpoint 覆蓋)，訓練時應維持 False 讓錯誤直接拋出
         """
         super().__init__()
         
@@ -39,7 +43,7 @@ class FashionMultiTaskModel(nn.Module):
         self.embedding_dim = embedding_dim
         
         # ==================== Backbone ====================
-        self.backbone, self.feature_dim = self._build_backbone(backbone, pretrained)
+        self.backbone, self.feature_dim = self._build_backbone(backbone, pretrained, allow_random_fallback)
         
         # ==================== Embedding Layer ====================
         self.embedding_layer = nn.Sequential(
@@ -74,26 +78,45 @@ class FashionMultiTaskModel(nn.Module):
         print(f"  - Categories: {num_categories}")
         print(f"  - Attributes: {num_attributes}")
     
-    def _build_backbone(self, backbone: str, pretrained: bool) -> Tuple[nn.Module, int]:
-        """構建 Backbone 網路"""
+    def _build_backbone(self, backbone: str, pretrained: bool,
+                        allow_random_fallback: bool = False) -> Tuple[nn.Module, int]:
+        """
+        構建 Backbone 網路
+        
+        pretrained=False 時不下載 ImageNet 權重 (推論時權重會被 checkpoint 覆蓋，不需要下載)；
+        allow_random_fallback=True 時，下載失敗 (例如離線環境) 退回隨機初始化，否則拋出錯誤
+        """
+        builders = {
+            'resnet50': models.resnet50,
+            'efficientnet_b0': models.efficientnet_b0,
+            'mobilenet_v3_large': models.mobilenet_v3_large,
+        }
+        if backbone not in builders:
+            raise ValueError(f"不支援的 backbone: {backbone}")
+        
+        build = builders[backbone]
+        if pretrained:
+            try:
+                model = build(weights='DEFAULT')
+            except (URLError, OSError) as e:
+                if not allow_random_fallback:
+                    raise
+                print(f"⚠️  無法下載 {backbone} 預訓練權重 ({e})，改用隨機初始化")
+                model = build(weights=None)
+        else:
+            model = build(weights=None)
         
         if backbone == 'resnet50':
-            model = models.resnet50(pretrained=pretrained)
             feature_dim = model.fc.in_features
             model.fc = nn.Identity()  # 移除最後的全連接層
             
         elif backbone == 'efficientnet_b0':
-            model = models.efficientnet_b0(pretrained=pretrained)
             feature_dim = model.classifier[1].in_features
             model.classifier = nn.Identity()
             
         elif backbone == 'mobilenet_v3_large':
-            model = models.mobilenet_v3_large(pretrained=pretrained)
             feature_dim = model.classifier[0].in_features
             model.classifier = nn.Identity()
-            
-        else:
-            raise ValueError(f"不支援的 backbone: {backbone}")
         
         return model, feature_dim
     
@@ -261,6 +284,7 @@ class FocalLoss(nn.Module):
 
 # ==================== 測試程式碼 ====================
 if __name__ == '__main__':
+    config.print_config()
     print("🧪 測試 Fashion Multi-Task Model")
     
     # 創建模型
@@ -0,0 +1,97 @@
+"""
+熔斷器狀態轉換測試 (closed → open → half_open → closed / open)
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from api import circuit_breaker
+from api.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "time", clock)
+    return clock
+
+
+def tripped_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("t1", failure_threshold=2, cooldown_seconds=60)
+    breaker.record_failure("429")
+    breaker.record_failure("429")
+    return breaker
+
+
+def test_trips_after_threshold(clock):
+    breaker = CircuitBreaker("t1", failure_threshold=2, cooldown_seconds=60)
+    breaker.record_failure("429")
+    assert breaker.get_state()["state"] == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure("429")
+    state = breaker.get_state()
+    assert state["state"] == CircuitBreaker.OPEN
+    assert state["trip_count"] == 1
+    assert state["retry_in_seconds"] == 60
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("t1", failure_threshold=2, cooldown_seconds=60)
+    breaker.record_failure("429")
+    breaker.record_success()
+    breaker.record_failure("429")
+    assert breaker.get_state()["state"] == CircuitBreaker.CLOSED
+
+
+def test_rejects_during_cooldown(clock):
+    breaker = tripped_breaker()
+    clock.now += 59
+    assert not breaker.allow_request()
+    assert not breaker.allow_request()
+    state = breaker.get_state()
+    assert state["state"] == CircuitBreaker.OPEN
+    assert state["rejected_count"] == 2
+    assert state["retry_in_seconds"] == 1
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = tripped_breaker()
+    clock.now += 60
+    assert breaker.allow_request()
+    assert breaker.get_state()["state"] == CircuitBreaker.HALF_OPEN
+    # 試探尚未結束前，其他請求一律拒絕
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.get_state()["state"] == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = tripped_breaker()
+    clock.now += 60
+    assert breaker.allow_request()
+
+    breaker.record_failure("500")
+    state = breaker.get_state()
+    assert state["state"] == CircuitBreaker.OPEN
+    assert state["trip_count"] == 2
+    # 冷卻從試探失敗的時間重新計算
+    assert state["retry_in_seconds"] == 60
+    clock.now += 59
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
@@ -0,0 +1,116 @@
+"""
+Model A 推論後端 (TorchScript / INT8 / ONNX) 與 eager 的一致性測試
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+import torch.nn.functional as F
+import torchvision.transforms as transforms
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_a import config
+from model_a.backends import Int8Backend, OnnxBackend, TorchScriptBackend
+from model_a.export import check_parity
+from model_a.model import FashionMultiTaskModel
+
+COLORS = [(20, 20, 20), (235, 235, 235), (200, 30, 40), (30, 60, 180), (40, 140, 60), (230, 200, 60)]
+
+
+def make_images():
+    """固定的類圖片輸入: 衣物輪廓、條紋與漸層"""
+    size = config.IMG_SIZE
+    images = []
+    for i, color in enumerate(COLORS):
+        background = COLORS[(i + 3) % len(COLORS)]
+
+        image = Image.new("RGB", (size, size), background)
+        draw = ImageDraw.Draw(image)
+        # 上衣輪廓
+        draw.polygon([(60, 40), (164, 40), (200, 90), (170, 100), (170, 200), (54, 200), (54, 100), (24, 90)], fill=color)
+        images.append(image)
+
+        stripes = Image.new("RGB", (size, size), background)
+        draw = ImageDraw.Draw(stripes)
+        for x in range(0, size, 8 + 4 * i):
+            draw.rectangle([x, 0, x + 3 + i, size], fill=color)
+        images.append(stripes)
+
+        gradient = Image.linear_gradient("L").resize((size, size)).rotate(30 * i)
+        images.append(Image.composite(Image.new("RGB", (size, size), color),
+                                      Image.new("RGB", (size, size), background), gradient))
+
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+    return torch.stack([transform(image) for image in images])
+
+
+def fit_heads(model, images, steps=150):
+    """
+    讓分類頭對每張輸入給出明確的類別與屬性 (如同訓練好的 checkpoint)
+    隨機初始化的模型輸出接近平手，Top-1 會因量化誤差而翻轉，無法反映後端本身的誤差
+    """
+    generator = torch.Generator().manual_seed(0)
+    categories = torch.randperm(config.NUM_CATEGORIES, generator=generator)[:len(images)]
+    attributes = (torch.rand(len(images), config.NUM_ATTRIBUTES, generator=generator) > 0.5).float()
+
+    with torch.no_grad():
+        features = model.backbone(images)
+    heads = [model.embedding_layer, model.category_head, model.attribute_head]
+    optimizer = torch.optim.Adam([p for head in heads for p in head.parameters()], lr=1e-3)
+    for _ in range(steps):
+        embedding = model.embedding_layer(features)
+        loss = F.cross_entropy(model.category_head(embedding), categories) \
+            + F.binary_cross_entropy_with_logits(model.attribute_head(embedding), attributes)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    for p in model.parameters():
+        p.requires_grad_(False)
+
+
+@pytest.fixture(scope="module")
+def images():
+    return make_images()
+
+
+@pytest.fixture(scope="module")
+def model(images):
+    torch.manual_seed(0)
+    model = FashionMultiTaskModel(backbone="mobilenet_v3_large", pretrained=False).eval()
+    fit_heads(model, images)
+    return model
+
+
+def build_torchscript(model, tmp_path):
+    return TorchScriptBackend(model, torch.device("cpu"))
+
+
+def build_int8(model, tmp_path):
+    return Int8Backend(model, torch.device("cpu"))
+
+
+def build_onnx(model, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    return OnnxBackend(model, torch.device("cpu"), tmp_path / "model_a.onnx")
+
+
+@pytest.mark.parametrize("build_backend", [build_torchscript, build_int8, build_onnx],
+                         ids=["torchscript", "int8", "onnx"])
+def test_backend_matches_eager(model, images, tmp_path, build_backend):
+    backend = build_backend(model, tmp_path)
+    result = check_parity(model, backend, batch_size=4, inputs=images)
+
+    assert result["top1_agreement"] >= config.PARITY_MIN_TOP1_AGREEMENT
+    assert result["attr_agreement"] >= config.PARITY_MIN_ATTR_AGREEMENT
+    assert result["max_prob_diff"] <= config.PARITY_PROB_ATOL
+    assert result["passed"]
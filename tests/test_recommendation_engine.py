@@ -0,0 +1,172 @@
+"""
+推薦引擎窮舉搜尋與逐一評分 (_score_outfit) 的一致性測試
+"""
+import hashlib
+import itertools
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from database.embedding_store import EmbeddingStore
+from database.models import ClothingItem, WeatherData
+from api.recommendation_engine import RecommendationEngine, SEARCH_EXHAUSTIVE, SEARCH_RANDOM
+
+CATEGORIES = ["上衣", "下身", "外套", "鞋子"]
+COLORS = ["黑色", "白色", "紅色", "藍色", "綠色"]
+
+
+def make_wardrobe(rng: random.Random, wardrobe_id: int, size: int = 28):
+    items = []
+    for i in range(size):
+        item_id = wardrobe_id * 1000 + i
+        items.append(ClothingItem(
+            id=item_id, user_id="u", name=rng.choice(["item", "street tee", "item"]),
+            category=CATEGORIES[i % 4], color=rng.choice(COLORS), warmth=rng.randint(1, 9),
+            image_hash=hashlib.sha256(str(item_id).encode()).hexdigest()
+        ))
+    return items
+
+
+def make_weather(temp):
+    return WeatherData(city="臺北市", temp=temp, feels_like=temp, desc="晴", update_time="")
+
+
+def brute_force_best(engine, wardrobe, weather, target_style, used_items):
+    """逐一評分所有 (上衣, 下身, 鞋子) 組合，回傳最高分"""
+    temp = weather.temp
+
+    def allowed(item):
+        if temp > 28 and item.warmth > 6:
+            return False
+        if temp < 15 and item.warmth < 3:
+            return False
+        return True
+
+    by_category = {c: [i for i in wardrobe if i.category == c and allowed(i)] for c in CATEGORIES}
+    need_outer = temp < 22
+    best = None
+    for t, b in itertools.product(by_category["上衣"], by_category["下身"]):
+        if t.warmth > 6 and b.warmth < 4:
+            continue
+        if b.warmth > 7 and t.warmth < 3:
+            continue
+        outer = engine._find_best_match(t, by_category["外套"]) if need_outer else None
+        for s in by_category["鞋子"] or [None]:
+            items = [t, b] + ([s] if s else []) + ([outer] if outer else [])
+            outfit = {"items": items, "score": 0}
+            engine._score_outfit(outfit, weather, target_style, used_items)
+            best = outfit["score"] if best is None else max(best, outfit["score"])
+    return best
+
+
+def outfit_ids(outfits):
+    return [[item["id"] for item in outfit["items"]] for outfit in outfits]
+
+
+@pytest.mark.parametrize("temp", [12, 20, 30])
+def test_recommend_matches_brute_force(temp):
+    """窮舉搜尋的第 1 名 = 逐一評分所有組合的最高分，且每套分數與 _score_outfit 一致"""
+    rng = random.Random(temp)
+    engine = RecommendationEngine(seed=0)
+    weather = make_weather(temp)
+    for wardrobe_id in range(30):
+        wardrobe = make_wardrobe(rng, wardrobe_id)
+        by_id = {item.id: item for item in wardrobe}
+        used = [item.id for item in wardrobe if rng.random() < 0.2]
+        target_style = rng.choice([None, "street"])
+
+        outfits = engine.recommend(wardrobe, weather, "休閒", target_style=target_style, used_items=used, top_k=3)
+        scores = [outfit["score"] for outfit in outfits]
+        assert scores[0] == brute_force_best(engine, wardrobe, weather, target_style, used)
+        assert scores == sorted(scores, reverse=True)
+        for outfit in outfits:
+            rescored = {"items": [by_id[i["id"]] for i in outfit["items"]], "score": 0}
+            engine._score_outfit(rescored, weather, target_style, used)
+            assert outfit["score"] == rescored["score"]
+
+
+@pytest.mark.parametrize("search_mode", [SEARCH_EXHAUSTIVE, SEARCH_RANDOM])
+def test_same_seed_gives_same_outfits(search_mode):
+    """指定相同 seed 的兩個引擎，推薦結果 (含同分時挑中的單品) 完全相同"""
+    rng = random.Random(42)
+    weather = make_weather(18)
+    first = RecommendationEngine(search_mode=search_mode, seed=7)
+    second = RecommendationEngine(search_mode=search_mode, seed=7)
+    for wardrobe_id in range(10):
+        wardrobe = make_wardrobe(rng, wardrobe_id)
+        a = first.recommend(wardrobe, weather, "休閒", target_style="street", top_k=3)
+        b = second.recommend(wardrobe, weather, "休閒", target_style="street", top_k=3)
+        assert a
+        assert outfit_ids(a) == outfit_ids(b)
+        assert [o["score"] for o in a] == [o["score"] for o in b]
+
+
+def check_recommend_k(engine, wardrobe, weather, target_style, k=3):
+    """recommend_k 每一套的分數 = 該套的 _score_outfit = 累積已使用單品下的窮舉最高分"""
+    outfits = engine.recommend_k(wardrobe, weather, "休閒", target_style=target_style, k=k)
+    by_id = {item.id: item for item in wardrobe}
+    used = []
+    for outfit in outfits:
+        items = [by_id[i["id"]] for i in outfit["items"]]
+        rescored = {"items": items, "score": 0}
+        engine._score_outfit(rescored, weather, target_style, used)
+        assert outfit["score"] == rescored["score"]
+        assert outfit["score"] == brute_force_best(engine, wardrobe, weather, target_style, used)
+        used.extend(item.id for item in items)
+    return outfits
+
+
+@pytest.fixture
+def embedding_store(tmp_path):
+    return EmbeddingStore(str(tmp_path / "embeddings"), dim=16)
+
+
+@pytest.mark.parametrize("temp", [12, 20, 30])
+def test_recommend_k_matches_brute_force(temp):
+    rng = random.Random(temp)
+    engine = RecommendationEngine(seed=0)
+    weather = make_weather(temp)
+    for wardrobe_id in range(30):
+        check_recommend_k(engine, make_wardrobe(rng, wardrobe_id), weather, rng.choice([None, "street"]))
+
+
+@pytest.mark.parametrize("temp", [12, 20, 30])
+def test_recommend_k_matches_brute_force_with_embeddings(embedding_store, temp):
+    rng = random.Random(temp)
+    vector_rng = np.random.default_rng(temp)
+    engine = RecommendationEngine(seed=0, embedding_store=embedding_store, embedding_weight=10)
+    weather = make_weather(temp)
+    for wardrobe_id in range(60):
+        wardrobe = make_wardrobe(rng, wardrobe_id)
+        # 部分單品沒有向量；Model A 的 embedding 經過 ReLU，皆為非負值
+        embedding_store.put_many({
+            item.image_hash: np.abs(vector_rng.standard_normal(16))
+            for item in wardrobe if rng.random() < 0.8
+        })
+        check_recommend_k(engine, wardrobe, weather, rng.choice([None, "street"]))
+
+
+def test_random_search_uses_pair_bonus_matrix(embedding_store):
+    """隨機模式查表得到的相容度加分，與逐套查詢 embedding 的 _score_outfit 一致"""
+    rng = random.Random(5)
+    vector_rng = np.random.default_rng(5)
+    engine = RecommendationEngine(search_mode=SEARCH_RANDOM, seed=3, embedding_store=embedding_store, embedding_weight=10)
+    weather = make_weather(20)
+    for wardrobe_id in range(20):
+        wardrobe = make_wardrobe(rng, wardrobe_id)
+        by_id = {item.id: item for item in wardrobe}
+        embedding_store.put_many({
+            item.image_hash: np.abs(vector_rng.standard_normal(16))
+            for item in wardrobe if rng.random() < 0.8
+        })
+        outfits = engine.recommend(wardrobe, weather, "休閒", target_style="street", top_k=3)
+        assert outfits
+        for outfit in outfits:
+            rescored = {"items": [by_id[i["id"]] for i in outfit["items"]], "score": 0}
+            engine._score_outfit(rescored, weather, "street")
+            assert outfit["score"] == rescored["score"]